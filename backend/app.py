@@ -119,6 +119,22 @@ db = mongo_client.hide_anything_qr if mongo_client else None
 redis_client = None
 print("[INFO] Redis client disabled (using in-memory storage for rate limiting)")
 
+# Start the pre-generated RSA keypair pool used by registration
+from utils.keypool import init_keypair_pool
+init_keypair_pool(db)
+
+# Cache of rendered QR images, optionally persisted to disk or GridFS
+from utils.qr_cache import init_qr_cache
+init_qr_cache(db)
+
+# Background rendering of share QR images (served by content-addressed URL)
+from utils.qr_prerender import init_qr_prerenderer
+init_qr_prerenderer()
+
+# Decrypted private keys of logged-in sessions, expiring with the access token
+from utils.session_keys import init_session_key_store
+init_session_key_store(ttl=app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds())
+
 # Import models
 from models.user import User
 from models.friend import Friend
@@ -135,6 +151,27 @@ app.Notification = Notification
 app.Activity = Activity
 app.socketio = socketio
 
+# Background migration of legacy base64 GridFS blobs to binary envelopes
+if db is not None and os.environ.get('ENVELOPE_MIGRATION', '0') == '1':
+    def migrate_envelopes():
+        try:
+            content_model = Content(db)
+            grace = float(os.environ.get('ENVELOPE_MIGRATION_GRACE', 300))
+            converted = content_model.migrate_legacy_blobs(
+                batch_size=int(os.environ.get('ENVELOPE_MIGRATION_BATCH', 50)),
+                pause=float(os.environ.get('ENVELOPE_MIGRATION_PAUSE', 0.2)),
+                grace=grace
+            )
+            print(f"[INFO] Envelope migration finished: {converted} files converted")
+            if converted:
+                # Downloads already reading the old files get time to finish
+                socketio.sleep(grace)
+                deleted = content_model.purge_superseded_blobs(grace)
+                print(f"[INFO] Envelope migration removed {deleted} superseded files")
+        except Exception as e:
+            print(f"[ERROR] Envelope migration failed: {e}")
+    socketio.start_background_task(migrate_envelopes)
+
 # Import and register blueprints
 from routes.auth import auth_bp
 from routes.content import content_bp
@@ -206,6 +243,23 @@ def serve_static(path):
 def health_check():
     return jsonify({'status': 'healthy', 'service': 'Hide Anything with QR'})
 
+# Metrics endpoint (in-process counters, gauges and histograms)
+# Only served when METRICS_TOKEN is set; scrapers send it as a bearer token
+@app.route('/api/metrics', methods=['GET'])
+@limiter.limit(RATE_LIMITS['api'])
+def metrics_snapshot():
+    import hmac
+    from flask import request
+    from utils import metrics
+    token = os.environ.get('METRICS_TOKEN')
+    if not token:
+        return jsonify({'error': 'Not found'}), 404
+    auth_header = request.headers.get('Authorization', '')
+    supplied = auth_header[7:] if auth_header.startswith('Bearer ') else ''
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(metrics.snapshot())
+
 # SocketIO events
 @socketio.on('connect')
 def handle_connect():
@@ -0,0 +1,8 @@
+"""
+Performance benchmarks.
+
+Each bench_*.py module is runnable from the backend directory, e.g.
+    python -m benchmarks.bench_encryption --quick
+and writes machine-readable JSON results that can be compared against a
+stored baseline (see benchmarks.common).
+"""
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Encryption benchmark across every ENCRYPTION_LEVELS entry.
+
+Measures per level:
+    - keypair generation latency (RSA or X25519, depending on key_wrap)
+    - AES key wrap / unwrap latency
+    - encrypt / decrypt throughput of the level's bulk cipher per payload size
+    - base64 overhead of the text format vs. the binary envelope
+    - peak memory of an encrypt + decrypt round trip, relative to payload size
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_encryption                 # compare with baseline
+    python -m benchmarks.bench_encryption --save-baseline # record a new baseline
+    python -m benchmarks.bench_encryption --quick --output results.json
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.encryption import EncryptionManager, ENCRYPTION_LEVELS, KEY_WRAP_X25519
+from benchmarks.common import (
+    BenchmarkResults, MB, format_size, parse_size, time_call, peak_memory, main_parser, finish
+)
+
+DEFAULT_SIZES = '1KB,64KB,1MB,10MB,50MB'
+QUICK_SIZES = '1KB,64KB,1MB'
+
+
+def _generate_keypair(config):
+    if config.get('key_wrap') == KEY_WRAP_X25519:
+        return EncryptionManager.generate_ec_keypair()
+    return EncryptionManager.generate_keypair(config['rsa_key_size'])
+
+
+def bench_level(results, level, config, sizes, keygen_repeat, repeat):
+    key_wrap = config.get('key_wrap')
+    cipher_suite, key_size = EncryptionManager.negotiate_cipher_suite(None, config)
+    print(f"\n{config['name']} [{level}] key_wrap={key_wrap} cipher={cipher_suite}")
+
+    keygen = time_call(lambda: _generate_keypair(config), repeat=keygen_repeat, warmup=0)
+    results.record(f'{level}.keygen', keygen * 1000, 'ms')
+
+    private_key, public_key = _generate_keypair(config)
+    aes_key = EncryptionManager.generate_aes_key(key_size)
+    wrapped = EncryptionManager.wrap_aes_key(aes_key, public_key, key_wrap)
+    results.record(f'{level}.wrap', time_call(
+        lambda: EncryptionManager.wrap_aes_key(aes_key, public_key, key_wrap), repeat=repeat) * 1000, 'ms')
+    results.record(f'{level}.unwrap', time_call(
+        lambda: EncryptionManager.unwrap_aes_key(wrapped, private_key, key_wrap), repeat=repeat) * 1000, 'ms')
+    results.record(f'{level}.wrapped_key_size', len(wrapped), 'bytes')
+
+    for size in sizes:
+        label = format_size(size)
+        data = os.urandom(size)
+        # Fewer repetitions for large payloads keep the full run under a few minutes
+        size_repeat = max(1, min(repeat, (64 * MB) // max(size, 1)))
+
+        envelope = EncryptionManager.encrypt_data(data, aes_key, binary=True, cipher_suite=cipher_suite)
+        encrypt = time_call(lambda: EncryptionManager.encrypt_data(
+            data, aes_key, binary=True, cipher_suite=cipher_suite), repeat=size_repeat)
+        decrypt = time_call(lambda: EncryptionManager.decrypt_data(
+            envelope, aes_key, return_bytes=True), repeat=size_repeat)
+        results.record(f'{level}.encrypt_throughput.{label}', size / MB / encrypt, 'MB/s', better='higher')
+        results.record(f'{level}.decrypt_throughput.{label}', size / MB / decrypt, 'MB/s', better='higher')
+
+        text = EncryptionManager.encrypt_data(data, aes_key, cipher_suite=cipher_suite)
+        results.record(f'{level}.base64_overhead.{label}', (len(text) - len(envelope)) / size * 100, '%')
+        del text
+
+        def round_trip():
+            ciphertext = EncryptionManager.encrypt_data(data, aes_key, binary=True, cipher_suite=cipher_suite)
+            return EncryptionManager.decrypt_data(ciphertext, aes_key, return_bytes=True)
+        _, peak = peak_memory(round_trip)
+        results.record(f'{level}.peak_memory.{label}', peak / size, 'x payload')
+
+
+def main(argv=None):
+    parser = main_parser('Benchmark encryption levels', 'encryption')
+    parser.add_argument('--levels', help='Comma-separated levels (default: all)')
+    parser.add_argument('--sizes', help=f'Comma-separated payload sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions per timing (median is reported)')
+    parser.add_argument('--quick', action='store_true', help=f'Small sizes and fewer repetitions ({QUICK_SIZES})')
+    args = parser.parse_args(argv)
+
+    levels = args.levels.split(',') if args.levels else list(ENCRYPTION_LEVELS)
+    sizes = [parse_size(s) for s in (args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)).split(',')]
+    repeat = 3 if args.quick else args.repeat
+    keygen_repeat = 1 if args.quick else 3
+
+    results = BenchmarkResults('encryption')
+    for level in levels:
+        if level not in ENCRYPTION_LEVELS:
+            parser.error(f'Unknown encryption level: {level}')
+        bench_level(results, level, ENCRYPTION_LEVELS[level], sizes, keygen_repeat, repeat)
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
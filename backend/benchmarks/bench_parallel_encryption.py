@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Parallel segmented encryption benchmark.
+
+Encrypts one large payload with the sequential segmented stream and with
+encrypt_data_parallel on crypto pools of 1..N worker processes, checks that
+every output is byte-identical, and reports throughput and speedup per
+worker count.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_parallel_encryption --size 50MB
+    python -m benchmarks.bench_parallel_encryption --workers 1,2,4,8 --save-baseline
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.encryption import EncryptionManager, DEFAULT_SEGMENT_SIZE
+from utils.crypto_executor import CryptoExecutor
+from benchmarks.common import BenchmarkResults, MB, format_size, parse_size, time_call, main_parser, finish
+
+
+def main(argv=None):
+    parser = main_parser('Benchmark parallel segmented encryption', 'parallel_encryption')
+    parser.add_argument('--size', default='50MB', help='Payload size (default 50MB)')
+    parser.add_argument('--workers', help='Comma-separated worker counts (default: 1..cpu_count)')
+    parser.add_argument('--segment-size', default=format_size(DEFAULT_SEGMENT_SIZE), help='Segment size')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per timing (median is reported)')
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    segment_size = parse_size(args.segment_size)
+    cpu_count = os.cpu_count() or 1
+    worker_counts = [int(n) for n in args.workers.split(',')] if args.workers else list(range(1, cpu_count + 1))
+
+    data = os.urandom(size)
+    aes_key = EncryptionManager.generate_aes_key(32)
+    nonce_prefix = os.urandom(8)
+    label = format_size(size)
+    results = BenchmarkResults('parallel_encryption')
+    print(f"\nPayload {label}, segment {format_size(segment_size)}, {cpu_count} CPU(s)")
+
+    def sequential():
+        return b''.join(EncryptionManager.encrypt_data_stream(
+            data, aes_key, segment_size=segment_size, nonce_prefix=nonce_prefix))
+    expected = sequential()
+    baseline = time_call(sequential, repeat=args.repeat)
+    results.record(f'sequential.throughput.{label}', size / MB / baseline, 'MB/s', better='higher')
+
+    for workers in worker_counts:
+        executor = CryptoExecutor(size=workers)
+        try:
+            def parallel():
+                return EncryptionManager.encrypt_data_parallel(
+                    data, aes_key, segment_size=segment_size, nonce_prefix=nonce_prefix, executor=executor)
+            if parallel() != expected:
+                print(f"[ERROR] Parallel output with {workers} worker(s) differs from the sequential stream")
+                return 1
+            elapsed = time_call(parallel, repeat=args.repeat)
+        finally:
+            executor.shutdown()
+        results.record(f'parallel.throughput.{label}.{workers}_workers', size / MB / elapsed, 'MB/s', better='higher')
+        # Speedup is reported for reference only; it depends on the host's core count
+        print(f"  {'speedup':<55} {baseline / elapsed:>14.2f} x ({workers} worker(s))")
+
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+QR generation sweep over realistic share payloads.
+
+Builds the payload a share QR code carries for every encryption level
+(wrapped keys from real RSA / X25519 keys), with and without a password
+hash in the metadata, in secure mode (encoded share URL, as the share
+routes embed it) and plain mode (the same dict as JSON), plus the
+reference-token payload. Each payload is planned with the default QR
+policy and rendered without the image cache; recorded per case:
+    - payload length in characters
+    - QR version and module count (41 / 0 = does not fit any QR)
+    - render latency (matrix build + PNG encode)
+    - PNG size
+
+The live share and regenerate routes record the same values in the
+qr.*.share / qr.*.regenerate histograms at /api/metrics.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_qr_generation
+    python -m benchmarks.bench_qr_generation --levels standard,maximum --size 600
+    python -m benchmarks.bench_qr_generation --save-baseline
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.encryption import ENCRYPTION_LEVELS
+from utils.qr_generator import QRGenerator
+from utils.qr_policy import QRCapacityError
+from benchmarks.bench_qr_payload import _share_payload, OVERSIZED_VERSION
+from benchmarks.common import BenchmarkResults, time_call, main_parser, finish
+
+PASSWORD = 'correct horse'
+MODES = (('secure', True), ('plain', False))
+
+
+def cases(levels):
+    """Yield (name, data, secure) for every level x password x mode, then the token payload"""
+    for level in levels:
+        for password_name, password in (('no_password', None), ('password', PASSWORD)):
+            payload = _share_payload(level, password=password)
+            for mode, secure in MODES:
+                yield f'{level}.{password_name}.{mode}', payload, secure
+    yield 'token', QRGenerator.encode_reference_token(QRGenerator.new_token_ref()), False
+
+
+def main(argv=None):
+    parser = main_parser('Sweep QR generation over share payloads', 'qr_generation')
+    parser.add_argument('--levels', help='Comma-separated encryption levels (default: all)')
+    parser.add_argument('--size', type=int, default=None, help='Requested PNG size in pixels (default: 10-pixel modules)')
+    parser.add_argument('--repeat', type=int, default=10, help='Repetitions per timing (median is reported)')
+    args = parser.parse_args(argv)
+
+    levels = args.levels.split(',') if args.levels else list(ENCRYPTION_LEVELS)
+    unknown = [level for level in levels if level not in ENCRYPTION_LEVELS]
+    if unknown:
+        parser.error(f'unknown encryption level(s): {", ".join(unknown)}')
+
+    results = BenchmarkResults('qr_generation')
+    for name, data, secure in cases(levels):
+        print(f"\n{name}")
+        results.record(f'{name}.chars', len(QRGenerator._payload(data, secure)), 'chars')
+        try:
+            plan = QRGenerator.plan_qr(data, args.size, secure)
+        except QRCapacityError:
+            results.record(f'{name}.qr_version', OVERSIZED_VERSION, 'version')
+            results.record(f'{name}.modules', 0, 'modules')
+            continue
+        results.record(f'{name}.qr_version', plan['info']['version'], 'version')
+        results.record(f'{name}.modules', plan['info']['modules'], 'modules')
+        results.record(f'{name}.render', time_call(
+            lambda: QRGenerator.render_plan(plan, use_cache=False), repeat=args.repeat) * 1e3, 'ms')
+        results.record(f'{name}.png_bytes', len(QRGenerator.render_plan(plan, use_cache=False)), 'bytes')
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+QR payload encoding comparison: base64 JSON URL vs. binary (msgpack + base45).
+
+Builds the payloads the share routes actually embed (wrapped keys from real
+RSA / X25519 keys, ObjectIds, metadata, password hashes) and records per
+encoding:
+    - payload length in characters
+    - QR version needed at error-correction level H (41 = does not fit any QR)
+    - rendered PNG size
+    - encode / decode latency
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_qr_payload
+    python -m benchmarks.bench_qr_payload --save-baseline
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import qrcode
+from bson import ObjectId
+from werkzeug.security import generate_password_hash
+from utils.encryption import EncryptionManager, ENCRYPTION_LEVELS, KEY_WRAP_X25519
+from utils.qr_generator import QRGenerator, QR_ENCODING_BASE64, QR_ENCODING_BINARY
+from utils import qr_payload
+from benchmarks.common import BenchmarkResults, time_call, main_parser, finish
+
+
+def _share_payload(level, content_type='text', password=None):
+    config = ENCRYPTION_LEVELS[level]
+    cipher_suite, key_size = EncryptionManager.negotiate_cipher_suite(None, config)
+    aes_key = EncryptionManager.generate_aes_key(key_size)
+    if config.get('key_wrap') == KEY_WRAP_X25519:
+        _, public_key = EncryptionManager.generate_ec_keypair()
+    else:
+        _, public_key = EncryptionManager.generate_keypair(config['rsa_key_size'])
+    metadata = {
+        'type': content_type,
+        'is_public': False,
+        'encryption_level': level,
+        'encryption_name': config['name'],
+        'cipher_suite': cipher_suite,
+        'key_wrap': config.get('key_wrap', 'rsa-oaep')
+    }
+    if content_type == 'file':
+        metadata.update({'filename': 'quarterly-report.pdf', 'content_type': 'application/pdf', 'size': 2483012})
+    else:
+        metadata['length'] = 512
+    if password:
+        metadata['password_hash'] = generate_password_hash(password)
+    return {
+        'content_id': str(ObjectId()),
+        'encrypted_key': EncryptionManager.wrap_aes_key(aes_key, public_key, config.get('key_wrap')),
+        'sender_id': str(ObjectId()),
+        'metadata': metadata
+    }
+
+
+def _friend_payload():
+    _, public_key = EncryptionManager.generate_keypair(2048)
+    return {
+        'type': 'hideanything_friend',
+        'user_id': str(ObjectId()),
+        'public_key': public_key,
+        'username': 'alice_wonder',
+        'version': '1.0'
+    }
+
+
+def payloads():
+    return {
+        'text_standard': _share_payload('standard'),
+        'text_modern': _share_payload('modern'),
+        'file_high_password': _share_payload('high', 'file', password='correct horse'),
+        'file_maximum': _share_payload('maximum', 'file'),
+        'friend': _friend_payload()
+    }
+
+
+OVERSIZED_VERSION = 41
+
+
+def qr_version(text):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H)
+    qr.add_data(text)
+    try:
+        qr.make(fit=True)
+    except ValueError:
+        return OVERSIZED_VERSION
+    return qr.version
+
+
+def main(argv=None):
+    parser = main_parser('Compare QR payload encodings', 'qr_payload')
+    parser.add_argument('--repeat', type=int, default=50, help='Repetitions per timing (median is reported)')
+    args = parser.parse_args(argv)
+    if not qr_payload.available():
+        parser.error('msgpack is not installed')
+
+    results = BenchmarkResults('qr_payload')
+    for name, payload in payloads().items():
+        print(f"\n{name}")
+        lengths = {}
+        for encoding in (QR_ENCODING_BASE64, QR_ENCODING_BINARY):
+            text = QRGenerator.encode_secure_data(payload, encoding)
+            assert QRGenerator.decode_secure_data(text) == payload
+            lengths[encoding] = len(text)
+            results.record(f'{name}.{encoding}.chars', len(text), 'chars')
+            version = qr_version(text)
+            results.record(f'{name}.{encoding}.qr_version', version, 'version')
+            if version != OVERSIZED_VERSION:
+                results.record(f'{name}.{encoding}.png_bytes',
+                               len(QRGenerator.generate_qr_png(
+                                   text, secure=False, use_cache=False, target='print', error_correction='H')), 'bytes')
+            results.record(f'{name}.{encoding}.encode', time_call(
+                lambda: QRGenerator.encode_secure_data(payload, encoding), repeat=args.repeat) * 1e6, 'us')
+            results.record(f'{name}.{encoding}.decode', time_call(
+                lambda: QRGenerator.decode_secure_data(text), repeat=args.repeat) * 1e6, 'us')
+        results.record(f'{name}.chars_saved', (1 - lengths[QR_ENCODING_BINARY] / lengths[QR_ENCODING_BASE64]) * 100,
+                       '%', better='higher')
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
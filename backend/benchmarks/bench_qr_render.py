@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+QR PNG rendering: qrcode's PIL image factory vs. the NumPy raster renderer.
+
+For several QR versions and image sizes, builds the QR matrix once and
+rasterizes it with both renderers, checks that the decoded pixels are
+identical and records per case:
+    - matrix build latency (qr.make, shared by both renderers)
+    - rasterize + PNG encode latency of each renderer
+    - end-to-end latency (build + rasterize) of each renderer
+    - speedup of the NumPy renderer (rasterize only, and end to end)
+    - PNG size of each renderer
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_qr_render
+    python -m benchmarks.bench_qr_render --versions 10,40 --sizes 400,2048
+    python -m benchmarks.bench_qr_render --save-baseline
+"""
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+from utils.qr_generator import QRGenerator
+from utils import qr_policy, qr_raster
+from benchmarks.common import BenchmarkResults, time_call, main_parser, finish
+
+DEFAULT_VERSIONS = '5,15,25,40'
+DEFAULT_SIZES = '400,1200'
+PAYLOAD = 'QRS://T/ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+RENDERERS = (qr_raster.RENDERER_PIL, qr_raster.RENDERER_NUMPY)
+
+
+def plan_for_version(version, size):
+    """A render plan forced to the given QR version (the payload fits version 1, the rest is padding)"""
+    plan = QRGenerator.plan_qr(PAYLOAD, size, secure=False, target='print', error_correction='L')
+    modules = qr_policy.module_count(version)
+    plan['info'] = dict(plan['info'], version=version, modules=modules)
+    plan['box_size'] = QRGenerator._box_size(size, modules)
+    return plan
+
+
+def main(argv=None):
+    parser = main_parser('Compare PIL and NumPy QR PNG rendering', 'qr_render')
+    parser.add_argument('--versions', help=f'Comma-separated QR versions (default {DEFAULT_VERSIONS})')
+    parser.add_argument('--sizes', help=f'Comma-separated image sizes in pixels (default {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, default=20, help='Repetitions per timing (median is reported)')
+    args = parser.parse_args(argv)
+    if not qr_raster.available():
+        parser.error('numpy is not installed')
+
+    versions = [int(v) for v in (args.versions or DEFAULT_VERSIONS).split(',')]
+    sizes = [int(s) for s in (args.sizes or DEFAULT_SIZES).split(',')]
+    results = BenchmarkResults('qr_render')
+    for version in versions:
+        for size in sizes:
+            name = f'v{version}.{size}px'
+            plan = plan_for_version(version, size)
+            qr = QRGenerator._make_qr(plan)
+            images = {renderer: QRGenerator._rasterize_png(qr, plan['box_size'], renderer) for renderer in RENDERERS}
+            pil_pixels, numpy_pixels = (np.array(Image.open(io.BytesIO(images[r]))) for r in RENDERERS)
+            assert np.array_equal(pil_pixels, numpy_pixels), f'{name}: renderers disagree'
+
+            print(f"\n{name} ({pil_pixels.shape[1]}x{pil_pixels.shape[0]}, box {plan['box_size']})")
+            build = time_call(lambda: QRGenerator._make_qr(plan), repeat=args.repeat)
+            results.record(f'{name}.build', build * 1e3, 'ms')
+            raster = {}
+            for renderer in RENDERERS:
+                raster[renderer] = time_call(
+                    lambda: QRGenerator._rasterize_png(qr, plan['box_size'], renderer), repeat=args.repeat)
+                results.record(f'{name}.{renderer}.rasterize', raster[renderer] * 1e3, 'ms')
+                results.record(f'{name}.{renderer}.total', (build + raster[renderer]) * 1e3, 'ms')
+                results.record(f'{name}.{renderer}.png_bytes', len(images[renderer]), 'bytes')
+            pil, fast = raster[qr_raster.RENDERER_PIL], raster[qr_raster.RENDERER_NUMPY]
+            results.record(f'{name}.rasterize_speedup', pil / fast, 'x', better='higher')
+            results.record(f'{name}.total_speedup', (build + pil) / (build + fast), 'x', better='higher')
+    return finish(results, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Shared helpers for the benchmark scripts: timing, result recording and
+baseline comparison.
+
+Results are a flat mapping of metric name -> {'value', 'unit', 'better'},
+where 'better' is 'lower' (latencies, memory) or 'higher' (throughput).
+A run regresses when any metric is worse than the baseline by more than
+the tolerance (relative).
+"""
+import os
+import json
+import time
+import platform
+import argparse
+import statistics
+import tracemalloc
+from datetime import datetime, timezone
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+DEFAULT_TOLERANCE = 0.25
+
+KB = 1024
+MB = 1024 * 1024
+
+
+def format_size(size):
+    if size >= MB and size % MB == 0:
+        return f'{size // MB}MB'
+    if size >= KB and size % KB == 0:
+        return f'{size // KB}KB'
+    return f'{size}B'
+
+
+def parse_size(text):
+    """Parse '1KB', '64KB', '50MB' or a plain byte count"""
+    text = text.strip().upper()
+    for suffix, factor in (('MB', MB), ('KB', KB), ('B', 1)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+
+def time_call(fn, repeat=5, warmup=1):
+    """Run fn repeatedly and return the median wall time in seconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def peak_memory(fn):
+    """Run fn once and return (result, peak Python-heap bytes allocated during the call)"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+class BenchmarkResults:
+    def __init__(self, name):
+        self.name = name
+        self.metrics = {}
+
+    def record(self, metric, value, unit, better='lower'):
+        self.metrics[metric] = {'value': round(value, 6), 'unit': unit, 'better': better}
+        print(f"  {metric:<55} {value:>14.3f} {unit}")
+
+    def to_dict(self):
+        return {
+            'benchmark': self.name,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'environment': environment_info(),
+            'metrics': self.metrics
+        }
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+
+def environment_info():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+    try:
+        import cryptography
+        info['cryptography'] = cryptography.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def compare_to_baseline(metrics, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Compare metrics with a baseline results dict
+
+    Returns:
+        List of (metric, baseline_value, value, change) for regressed metrics,
+        where change is the relative slowdown (positive = worse)
+    """
+    regressions = []
+    for metric, base in baseline.get('metrics', {}).items():
+        current = metrics.get(metric)
+        if current is None or not base['value']:
+            continue
+        if base['better'] == 'higher':
+            change = (base['value'] - current['value']) / base['value']
+        else:
+            change = (current['value'] - base['value']) / base['value']
+        if change > tolerance:
+            regressions.append((metric, base['value'], current['value'], change))
+    return regressions
+
+
+def add_common_arguments(parser, name):
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', default=os.path.join(BASELINE_DIR, f'{name}.json'),
+                        help='Baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store this run as the new baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed relative regression before failing (default 0.25)')
+
+
+def finish(results, args):
+    """Write results, then save or check the baseline. Returns the process exit code."""
+    if args.output:
+        results.save(args.output)
+        print(f"[INFO] Results written to {args.output}")
+
+    if args.save_baseline:
+        results.save(args.baseline)
+        print(f"[INFO] Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"[INFO] No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results.metrics, baseline, args.tolerance)
+    if not regressions:
+        print(f"[SUCCESS] No regressions against baseline ({len(baseline.get('metrics', {}))} metrics)")
+        return 0
+    print(f"[ERROR] {len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}:")
+    for metric, base, current, change in regressions:
+        print(f"  {metric}: {base:.3f} -> {current:.3f} ({change:+.0%})")
+    return 1
+
+
+def main_parser(description, name):
+    parser = argparse.ArgumentParser(description=description)
+    add_common_arguments(parser, name)
+    return parser
@@ -1,7 +1,10 @@
 import gridfs
+import time
+import hashlib
 from datetime import datetime, timezone
 from bson import ObjectId
 from pymongo import IndexModel, ASCENDING, DESCENDING
+from utils.encryption import EncryptionManager
 
 class Content:
     _indexes_created = False
@@ -9,6 +12,8 @@ class Content:
     def __init__(self, db):
         self.collection = db.shared_content
         self.fs = gridfs.GridFS(db)
+        self.bucket = gridfs.GridFSBucket(db)
+        self.files = db.fs.files
         if not Content._indexes_created:
             self.create_indexes()
             Content._indexes_created = True
@@ -20,13 +25,21 @@ class Content:
                 IndexModel([('receiver_id', ASCENDING)]),
                 IndexModel([('created_at', DESCENDING)]),
                 IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+                IndexModel([('group_id', ASCENDING)], sparse=True),
+                IndexModel([('qr_token', ASCENDING)], unique=True, sparse=True),
             ]
             self.collection.create_indexes(indexes)
         except Exception as e:
             print(f"[WARNING] Failed to create Content indexes: {e}")
     
     def share_content(self, sender_id, receiver_id, encrypted_data, metadata, 
-                     encrypted_key, expires_in=None):
+                     encrypted_key, expires_in=None, qr_token=None, file_id=None):
+        """Store shared content
+        
+        Args:
+            file_id: GridFS file already written with put_file_stream(); files
+                then reference it and encrypted_data is ignored
+        """
         content = {
             'sender_id': ObjectId(sender_id),
             'receiver_id': ObjectId(receiver_id),
@@ -44,22 +57,33 @@ class Content:
             from datetime import timedelta
             content['expires_at'] = datetime.now(timezone.utc) + timedelta(seconds=int(expires_in))
         
+        # Reference carried by token-mode QR codes instead of the key and metadata
+        if qr_token:
+            content['qr_token'] = qr_token
+        
+        if file_id is not None:
+            content['file_id'] = file_id
+            content['encrypted_data'] = str(file_id)
         # If it's a file, store in GridFS
-        if metadata.get('type') == 'file':
-            # Ensure encrypted_data is bytes for GridFS
+        elif metadata.get('type') == 'file':
+            # Binary envelopes are written as-is; legacy base64 text is stored as UTF-8
             if isinstance(encrypted_data, str):
                 encrypted_data_bytes = encrypted_data.encode('utf-8')
             else:
                 encrypted_data_bytes = encrypted_data
+            
+            file_metadata = {
+                'sender_id': str(sender_id),
+                'receiver_id': str(receiver_id) if receiver_id else None
+            }
+            if EncryptionManager.is_envelope(encrypted_data_bytes):
+                file_metadata['envelope'] = encrypted_data_bytes[4]
                 
             file_id = self.fs.put(
                 encrypted_data_bytes,
                 filename=metadata['filename'],
                 content_type=metadata['content_type'],
-                metadata={
-                    'sender_id': str(sender_id),
-                    'receiver_id': str(receiver_id) if receiver_id else None
-                }
+                metadata=file_metadata
             )
             content['file_id'] = file_id
             content['encrypted_data'] = str(file_id)  # Store file ID instead of data
@@ -67,6 +91,115 @@ class Content:
         result = self.collection.insert_one(content)
         return str(result.inserted_id), content
     
+    def put_file_stream(self, chunks, filename, content_type, metadata=None):
+        """Write ciphertext chunks to a new GridFS file as they arrive
+        
+        The length, SHA-256 and envelope version of the stored bytes are
+        computed on the way through and saved in the file's metadata. Only
+        the ciphertext is hashed: a digest of the plaintext would let anyone
+        with database access confirm a guess of the content.
+        
+        Args:
+            chunks: Iterable of ciphertext byte chunks (e.g. encrypt_data_stream)
+            metadata: Additional GridFS file metadata (sender_id, receiver_id)
+        
+        Returns:
+            Tuple of (file_id, stored length, SHA-256 hex digest)
+        """
+        metadata = dict(metadata or {})
+        digest = hashlib.sha256()
+        length = 0
+        grid_in = self.bucket.open_upload_stream(filename, metadata=metadata)
+        try:
+            for chunk in chunks:
+                if not length and EncryptionManager.is_envelope(chunk):
+                    metadata['envelope'] = chunk[4]
+                digest.update(chunk)
+                grid_in.write(chunk)
+                length += len(chunk)
+            metadata['sha256'] = digest.hexdigest()
+            # Both land in the files document when the stream is closed
+            grid_in.metadata = metadata
+            grid_in.contentType = content_type
+            grid_in.close()
+        except Exception:
+            grid_in.abort()
+            raise
+        return grid_in._id, length, metadata['sha256']
+    
+    def share_content_multi(self, sender_id, wrapped_keys, encrypted_data, metadata, expires_in=None,
+                            recipient_metadata=None, qr_tokens=None, blob_id=None, group_id=None):
+        """Share one ciphertext with several receivers
+        
+        The ciphertext is stored once in GridFS and every receiver gets a
+        lightweight content document holding only its own wrapped AES key and
+        a reference to the shared blob. Files reference it through file_id
+        (so downloads keep working), text through payload_id.
+        
+        Args:
+            wrapped_keys: Dict of receiver_id -> AES key wrapped for that receiver
+            recipient_metadata: Optional dict of receiver_id -> metadata fields
+                specific to that receiver (e.g. key_wrap)
+            qr_tokens: Optional dict of receiver_id -> qr_token reference
+            blob_id: GridFS file already written with put_file_stream();
+                encrypted_data is then ignored
+            group_id: ObjectId of the group (e.g. already in the blob's metadata)
+        
+        Returns:
+            Tuple of (group_id, {receiver_id: content_id})
+        """
+        group_id = group_id or ObjectId()
+        is_file = metadata.get('type') == 'file'
+        if blob_id is None:
+            if isinstance(encrypted_data, str):
+                encrypted_data = encrypted_data.encode('utf-8')
+            file_metadata = {
+                'sender_id': str(sender_id),
+                'group_id': str(group_id),
+                'recipient_count': len(wrapped_keys)
+            }
+            if EncryptionManager.is_envelope(encrypted_data):
+                file_metadata['envelope'] = encrypted_data[4]
+            blob_id = self.fs.put(
+                encrypted_data,
+                filename=metadata.get('filename') if is_file else f'{group_id}.txt',
+                content_type=metadata.get('content_type') if is_file else 'application/octet-stream',
+                metadata=file_metadata
+            )
+        
+        now = datetime.now(timezone.utc)
+        expires_at = None
+        if expires_in:
+            from datetime import timedelta
+            expires_at = now + timedelta(seconds=int(expires_in))
+        
+        documents = []
+        for receiver_id, encrypted_key in wrapped_keys.items():
+            document = {
+                'sender_id': ObjectId(sender_id),
+                'receiver_id': ObjectId(receiver_id),
+                'group_id': group_id,
+                'file_id' if is_file else 'payload_id': blob_id,
+                'encrypted_data': str(blob_id),
+                'encrypted_key': encrypted_key,
+                'metadata': dict(metadata, **(recipient_metadata or {}).get(receiver_id, {})),
+                'viewed': False,
+                'view_count': 0,
+                'is_active': True,
+                'created_at': now,
+                'expires_at': expires_at
+            }
+            if qr_tokens and qr_tokens.get(receiver_id):
+                document['qr_token'] = qr_tokens[receiver_id]
+            documents.append(document)
+        
+        result = self.collection.insert_many(documents)
+        content_ids = {
+            receiver_id: str(inserted_id)
+            for receiver_id, inserted_id in zip(wrapped_keys, result.inserted_ids)
+        }
+        return str(group_id), content_ids
+    
     def get_content_for_user(self, user_id, content_type=None):
         query = {'receiver_id': ObjectId(user_id)}
         if content_type:
@@ -107,10 +240,118 @@ class Content:
         except:
             return None
     
+    def read_payload(self, content):
+        """Return the stored ciphertext of a content document
+        
+        Returns bytes for GridFS blobs (binary envelope or legacy base64 text)
+        and the inline base64 string otherwise; None if the blob is missing.
+        """
+        blob_id = content.get('file_id') or content.get('payload_id')
+        if blob_id:
+            grid_file = self.get_file(blob_id)
+            return grid_file.read() if grid_file else None
+        return content.get('encrypted_data')
+    
+    def migrate_legacy_blobs(self, batch_size=50, pause=0.2, limit=None, grace=300):
+        """Convert base64-text GridFS blobs to binary envelopes
+        
+        Each blob is rewritten as a new GridFS file and the content documents
+        that reference it (file_id or payload_id) are repointed. The old file
+        is only marked as superseded: downloads that opened it before the
+        repoint keep reading it, and purge_superseded_blobs deletes it once
+        grace seconds have passed and nothing references it any more. The
+        ciphertext itself is unchanged, so no keys are needed.
+        
+        Args:
+            batch_size: Files fetched per query
+            pause: Seconds to sleep between files (throttle)
+            limit: Maximum number of files to convert (None for all)
+            grace: Seconds superseded files are kept (for purging those an
+                interrupted run left behind)
+        
+        Returns:
+            Number of files converted
+        """
+        # Left over from an interrupted run
+        self.purge_superseded_blobs(grace)
+        converted = 0
+        query = {'metadata.envelope': {'$exists': False}, 'metadata.superseded_by': {'$exists': False}}
+        while limit is None or converted < limit:
+            batch = list(self.files.find(query).limit(batch_size))
+            if not batch:
+                break
+            for file_doc in batch:
+                if limit is not None and converted >= limit:
+                    break
+                old_id = file_doc['_id']
+                try:
+                    envelope = EncryptionManager.to_binary_envelope(self.fs.get(old_id).read())
+                except Exception as e:
+                    # Not legacy ciphertext; mark it so it is not retried
+                    print(f"[WARNING] Skipping GridFS file {old_id} during envelope migration: {e}")
+                    self.files.update_one({'_id': old_id}, {'$set': {'metadata.envelope': 0}})
+                    continue
+                
+                metadata = dict(file_doc.get('metadata') or {}, envelope=envelope[4])
+                new_id = self.fs.put(
+                    envelope,
+                    filename=file_doc.get('filename'),
+                    content_type=file_doc.get('contentType'),
+                    metadata=metadata
+                )
+                for field in ('file_id', 'payload_id'):
+                    self.collection.update_many(
+                        {field: old_id},
+                        {'$set': {field: new_id, 'encrypted_data': str(new_id)}}
+                    )
+                self.files.update_one({'_id': old_id}, {'$set': {
+                    'metadata.superseded_by': new_id,
+                    'metadata.superseded_at': datetime.now(timezone.utc)
+                }})
+                converted += 1
+                time.sleep(pause)
+        return converted
+    
+    def purge_superseded_blobs(self, grace=300):
+        """Delete migrated GridFS files superseded more than grace seconds ago
+        
+        A file is kept while any content document still references it (the
+        same check as delete_content).
+        
+        Returns:
+            Number of files deleted
+        """
+        from datetime import timedelta
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+        deleted = 0
+        for file_doc in self.files.find({'metadata.superseded_at': {'$lte': cutoff}}, {'_id': 1}):
+            blob_id = file_doc['_id']
+            if any(self.collection.find_one({field: blob_id}, {'_id': 1}) for field in ('file_id', 'payload_id')):
+                print(f"[WARNING] Superseded GridFS file {blob_id} is still referenced, keeping it")
+                continue
+            try:
+                self.fs.delete(blob_id)
+                deleted += 1
+            except Exception as e:
+                print(f"[WARNING] Failed to delete superseded GridFS file {blob_id}: {e}")
+        return deleted
+    
+    def iter_shared_by_user(self, user_id, active_only=False, content_type=None):
+        """Lazily iterate the content documents shared by a user, newest first
+        
+        The encrypted payload is not loaded, so large exports stream through
+        a cursor instead of holding every document in memory.
+        """
+        query = {'sender_id': ObjectId(user_id)}
+        if active_only:
+            query['is_active'] = {'$ne': False}
+        if content_type:
+            query['metadata.type'] = content_type
+        return self.collection.find(query, {'encrypted_data': 0}).sort('created_at', -1)
+    
     def get_shared_by_user(self, user_id):
         """Get all content shared by a user"""
-        query = {'sender_id': ObjectId(user_id)}
-        contents = self.collection.find(query).sort('created_at', -1)
+        contents = self.iter_shared_by_user(user_id)
         
         result = []
         for content in contents:
@@ -153,6 +394,21 @@ class Content:
             print(f"Error getting content by ID: {e}")
             return None
     
+    def get_by_ids(self, content_ids, sender_id=None):
+        """Get several contents with one query, optionally only those shared by sender_id
+        
+        Returns:
+            Dict of content ID string -> content document (missing IDs are absent)
+        """
+        query = {'_id': {'$in': [ObjectId(content_id) for content_id in content_ids]}}
+        if sender_id:
+            query['sender_id'] = ObjectId(sender_id)
+        return {str(content['_id']): content for content in self.collection.find(query)}
+    
+    def get_by_qr_token(self, qr_token):
+        """Get content by the reference carried in a token-mode QR code"""
+        return self.collection.find_one({'qr_token': qr_token})
+    
     def delete_content(self, content_id):
         """Delete content permanently"""
         try:
@@ -162,15 +418,17 @@ class Content:
             if not content:
                 return False
             
-            # If it has a file in GridFS, delete it
-            if 'file_id' in content:
-                try:
-                    self.fs.delete(content['file_id'])
-                except Exception as e:
-                    print(f"Error deleting file from GridFS: {e}")
-            
             # Delete the content document
             result = self.collection.delete_one({'_id': ObjectId(content_id)})
+            
+            # If it has a blob in GridFS that no other receiver still references, delete it
+            for field in ('file_id', 'payload_id'):
+                blob_id = content.get(field)
+                if blob_id and not self.collection.find_one({field: blob_id}, {'_id': 1}):
+                    try:
+                        self.fs.delete(blob_id)
+                    except Exception as e:
+                        print(f"Error deleting file from GridFS: {e}")
             return result.deleted_count > 0
             
         except Exception as e:
@@ -1,8 +1,10 @@
 from datetime import datetime, timezone
 import bcrypt
-from bson import ObjectId
+from bson import ObjectId, Binary
 from pymongo import IndexModel, ASCENDING
-from utils.encryption import generate_keypair, encrypt_private_key
+from utils.encryption import EncryptionManager, encrypt_private_key, decrypt_private_key, generate_ec_keypair
+from utils.keypool import acquire_keypair
+from utils.crypto_executor import run_crypto
 
 class User:
     _indexes_created = False  # Class variable to track if indexes are created
@@ -41,17 +43,23 @@ class User:
             raise ValueError('Username already taken')
         
         # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        password_hash = run_crypto(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
         
-        # Generate encryption keys
-        private_key, public_key = generate_keypair()
-        encrypted_private_key = encrypt_private_key(private_key, password)
+        # Take encryption keys from the pre-generated pool
+        private_key, public_key = acquire_keypair()
+        encrypted_private_key = run_crypto(encrypt_private_key, private_key, password)
+        ec_private_key, ec_public_key = generate_ec_keypair()
+        encrypted_ec_private_key = run_crypto(encrypt_private_key, ec_private_key, password)
         
         user = {
             'username': username,
             'password_hash': password_hash,
             'public_key': public_key,
+            'public_key_der': Binary(EncryptionManager.public_key_to_der(public_key)),
+            'public_key_fingerprint': EncryptionManager.public_key_fingerprint(public_key),
             'private_key_encrypted': encrypted_private_key,
+            'ec_public_key': ec_public_key,
+            'ec_private_key_encrypted': encrypted_ec_private_key,
             'friends': [],
             'friend_requests': [],
             'profile_pic_url': None,
@@ -95,15 +103,59 @@ class User:
         if not user:
             return None
         
-        if bcrypt.checkpw(password.encode('utf-8'), user['password_hash']):
-            # Update last login
-            self.collection.update_one(
-                {'_id': user['_id']},
-                {'$set': {'last_login': datetime.now(timezone.utc)}}
-            )
+        if run_crypto(bcrypt.checkpw, password.encode('utf-8'), user['password_hash']):
+            # Update last login (and backfill the DER public key for older accounts)
+            updates = {'last_login': datetime.now(timezone.utc)}
+            if 'public_key_der' not in user and user.get('public_key'):
+                updates['public_key_der'] = Binary(EncryptionManager.public_key_to_der(user['public_key']))
+                updates['public_key_fingerprint'] = EncryptionManager.public_key_fingerprint(user['public_key'])
+            update = {'$set': updates}
+            # Decrypted private keys now live in the session key store; drop
+            # plaintext copies written to the document by older logins
+            legacy_keys = {field: '' for field in ('private_key', 'ec_private_key') if field in user}
+            if legacy_keys:
+                update['$unset'] = legacy_keys
+            self.collection.update_one({'_id': user['_id']}, update)
             return user
         return None
     
+    def ensure_ec_keypair(self, user, password):
+        """Lazily create the X25519 keypair for accounts registered before EC key wrapping
+        
+        Returns:
+            The encrypted EC private key
+        """
+        if user.get('ec_private_key_encrypted'):
+            return user['ec_private_key_encrypted']
+        ec_private_key, ec_public_key = generate_ec_keypair()
+        encrypted_ec_private_key = run_crypto(encrypt_private_key, ec_private_key, password)
+        self.collection.update_one(
+            {'_id': user['_id']},
+            {'$set': {'ec_public_key': ec_public_key, 'ec_private_key_encrypted': encrypted_ec_private_key}}
+        )
+        user['ec_public_key'] = ec_public_key
+        user['ec_private_key_encrypted'] = encrypted_ec_private_key
+        return encrypted_ec_private_key
+    
+    def reencrypt_private_keys(self, user, current_password, new_password):
+        """Re-encrypt the user's RSA and X25519 private keys for a new password
+        
+        Login only gets the private keys by decrypting these blobs with the
+        password, so they must change together with the password hash.
+        
+        Returns:
+            Dict of fields to $set alongside the new password hash
+        
+        Raises:
+            Exception: If a key cannot be decrypted with current_password
+        """
+        updates = {}
+        for field in ('private_key_encrypted', 'ec_private_key_encrypted'):
+            if user.get(field):
+                private_key = run_crypto(decrypt_private_key, user[field], current_password)
+                updates[field] = run_crypto(encrypt_private_key, private_key, new_password)
+        return updates
+    
     def get_by_id(self, user_id):
         try:
             return self.collection.find_one({'_id': ObjectId(user_id), 'is_active': True})
@@ -142,7 +194,8 @@ class User:
         
         return list(self.collection.find(
             filter_query,
-            {'password_hash': 0, 'private_key_encrypted': 0}
+            {'password_hash': 0, 'private_key_encrypted': 0, 'public_key_der': 0,
+             'private_key': 0, 'ec_private_key_encrypted': 0, 'ec_private_key': 0}
         ).limit(20))
     
     def update_settings(self, user_id, settings):
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, get_jti
 from datetime import timedelta
 import re
 from .helpers import get_user_model
+from utils.session_keys import SessionKeys, get_session_key_store, session_id_from_claims
 from config.security import (
     validate_username,
     validate_email_address,
@@ -107,23 +108,27 @@ def login():
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Decrypt the user's private key with their password
+        session_keys = None
         try:
             from utils.encryption import decrypt_private_key
+            from utils.crypto_executor import run_crypto
             encrypted_private_key = user.get('private_key_encrypted')
             if encrypted_private_key:
-                decrypted_private_key = decrypt_private_key(encrypted_private_key, password)
-                # Store decrypted private key in the user document (in memory, not persisted)
-                # Update user document to include decrypted private key for this session
-                user_model.collection.update_one(
-                    {'_id': user['_id']},
-                    {'$set': {'private_key': decrypted_private_key}}
-                )
+                decrypted_private_key = run_crypto(decrypt_private_key, encrypted_private_key, password)
+                # EC (X25519) keys are created on first login for older accounts
+                encrypted_ec_private_key = user_model.ensure_ec_keypair(user, password)
+                decrypted_ec_private_key = run_crypto(decrypt_private_key, encrypted_ec_private_key, password)
+                # Keep the keys in memory for this session only
+                session_keys = SessionKeys.from_serialized(user['_id'], decrypted_private_key, decrypted_ec_private_key)
         except Exception as e:
             print(f"Warning: Could not decrypt private key: {e}")
         
-        # Generate tokens
+        # Generate tokens; the login access token's jti identifies the session
         access_token = create_access_token(identity=str(user['_id']))
-        refresh_token = create_refresh_token(identity=str(user['_id']))
+        session_id = get_jti(access_token)
+        refresh_token = create_refresh_token(identity=str(user['_id']), additional_claims={'skid': session_id})
+        if session_keys:
+            get_session_key_store().put(session_id, session_keys)
         
         return jsonify({
             'message': 'Login successful',
@@ -146,7 +151,9 @@ def login():
 @jwt_required(refresh=True)
 def refresh():
     current_user = get_jwt_identity()
-    new_access_token = create_access_token(identity=current_user)
+    session_id = session_id_from_claims(get_jwt())
+    new_access_token = create_access_token(identity=current_user, additional_claims={'skid': session_id})
+    get_session_key_store().touch(session_id)
     return jsonify({'access_token': new_access_token}), 200
 
 @auth_bp.route('/me', methods=['GET'])
@@ -179,6 +186,7 @@ def get_current_user():
 @jwt_required()
 def logout():
     # In a real app, you'd add the token to a blacklist
+    get_session_key_store().drop(session_id_from_claims(get_jwt()))
     return jsonify({'message': 'Logout successful'}), 200
 
 @auth_bp.route('/update-settings', methods=['PUT'])
@@ -1,11 +1,14 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from bson import ObjectId
 import base64
-from io import BytesIO
 import sys
+from utils.crypto_executor import run_crypto, get_crypto_executor
+from utils.session_keys import get_session_key_store, session_id_from_claims
+from utils.qr_policy import QRCapacityError, validate_options as validate_qr_options
 from routes.helpers import get_user_model, get_db, get_socketio, get_content_model, get_encryption_manager, get_qr_generator, get_activity_model, get_notification_model
 from config.security import (
+    ALLOWED_EXTENSIONS,
     validate_file_upload,
     validate_text_content,
     validate_object_id,
@@ -16,6 +19,93 @@ from config.security import (
 
 content_bp = Blueprint('content', __name__)
 
+def _compression_requested(value):
+    """Compression is on unless the request opts out (compress=false)"""
+    return value is None or str(value).lower() not in ('0', 'false', 'no', 'off')
+
+def _qr_mode(value):
+    """QR payload mode requested by the client, or the configured default"""
+    from utils.qr_generator import QR_MODE_TOKEN, QR_MODES, default_qr_mode, token_mode_available
+    if value == QR_MODE_TOKEN and not token_mode_available():
+        return default_qr_mode()
+    return value if value in QR_MODES else default_qr_mode()
+
+def _qr_policy_options(source, default_target=None):
+    """QR target, error correction and version cap requested by the client"""
+    return {
+        'target': source.get('qr_target') or default_target,
+        'error_correction': source.get('qr_ec'),
+        'max_version': source.get('qr_max_version')
+    }
+
+def _content_qr_data(content_id, encrypted_key, sender_id, metadata, qr_token=None):
+    """QR payload of a share: a signed reference in token mode, else the embedded share data"""
+    if qr_token:
+        return get_qr_generator().encode_reference_token(qr_token)
+    return {
+        'content_id': content_id,
+        'encrypted_key': encrypted_key,
+        'sender_id': sender_id,
+        'metadata': metadata
+    }
+
+def _share_qr(content_id, qr_data, qr_options, source):
+    """Plan a share's QR image and queue it for background rendering
+    
+    Returns:
+        Dict merged into the share response: qr (version and error
+        correction), qr_url (stable image URL) and, only when the client asks
+        for it with qr_inline=true, qr_code (the base64 PNG, rendered inline)
+    
+    Raises:
+        QRCapacityError: If the payload does not fit within the version cap
+    """
+    from flask import url_for
+    from utils.qr_prerender import get_qr_prerenderer
+    qr_generator = get_qr_generator()
+    plan = qr_generator.plan_qr(qr_data, source='share', **qr_options)
+    get_qr_prerenderer().schedule(plan)
+    # The options are part of the URL so the image can be re-rendered if it was never stored
+    url_options = {name: value for name, value in (
+        ('qr_target', qr_options.get('target')),
+        ('qr_ec', qr_options.get('error_correction')),
+        ('qr_max_version', qr_options.get('max_version'))
+    ) if value}
+    fields = {
+        'qr': plan['info'],
+        'qr_url': url_for('content.get_content_qr_by_key', content_id=content_id, key=plan['key'], **url_options)
+    }
+    if str(source.get('qr_inline', '')).lower() in ('1', 'true', 'yes', 'on'):
+        fields['qr_code'] = base64.b64encode(qr_generator.render_plan(plan)).decode()
+    return fields
+
+def _iter_upload(stream, totals):
+    """Read an uploaded file one encryption segment at a time, adding up its size in totals['size']"""
+    from utils.encryption import DEFAULT_SEGMENT_SIZE
+    while True:
+        chunk = stream.read(DEFAULT_SEGMENT_SIZE)
+        if not chunk:
+            return
+        totals['size'] += len(chunk)
+        yield chunk
+
+def _upload_file_type(filename):
+    """ALLOWED_EXTENSIONS category of an uploaded file's extension ('document' if unknown)"""
+    ext = filename.rsplit('.', 1)[-1].lower()
+    return next((file_type for file_type, extensions in ALLOWED_EXTENSIONS.items() if ext in extensions), 'document')
+
+def _receiver_wrap_key(receiver, enc_config):
+    """Pick the key-wrapping scheme and public key for a receiver
+    
+    Returns:
+        Tuple of (key_wrap, public_key, fingerprint). X25519 levels fall back to
+        RSA-OAEP for receivers that have not logged in since EC keys were added.
+    """
+    from utils.encryption import KEY_WRAP_RSA, KEY_WRAP_X25519
+    if enc_config.get('key_wrap') == KEY_WRAP_X25519 and receiver.get('ec_public_key'):
+        return KEY_WRAP_X25519, receiver['ec_public_key'], None
+    return KEY_WRAP_RSA, receiver.get('public_key_der') or receiver['public_key'], receiver.get('public_key_fingerprint')
+
 # Test endpoint to verify blueprint registration
 @content_bp.route('/test-email-route', methods=['GET'])
 def test_email_route():
@@ -37,12 +127,20 @@ def share_text():
         receiver_id = data.get('receiver_id')
         expires_in = data.get('expires_in')  # in seconds
         encryption_level = data.get('encryption_level', 'standard')  # basic, standard, high, maximum
+        cipher_suite = data.get('cipher_suite')  # Optional bulk cipher preference
+        compress = _compression_requested(data.get('compress'))  # Compress before encrypting
+        qr_mode = _qr_mode(data.get('qr_mode'))  # token (signed reference) or embedded
+        qr_options = _qr_policy_options(data)  # screen/print/email target, EC level, version cap
         password = data.get('password')  # Optional password protection
         max_views = data.get('max_views')  # Optional view limit
         
         if not text:
             return jsonify({'error': 'Text content required'}), 400
         
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        
         # Validate text content
         valid, msg = validate_text_content(text)
         if not valid:
@@ -59,6 +157,7 @@ def share_text():
         from utils.encryption import get_encryption_levels
         enc_levels = get_encryption_levels()
         enc_config = enc_levels.get(encryption_level, enc_levels['standard'])
+        cipher_suite, key_size = encryption.negotiate_cipher_suite(cipher_suite, enc_config)
         
         # Get receiver's public key
         user_model = get_user_model()
@@ -68,18 +167,21 @@ def share_text():
             return jsonify({'error': 'Receiver not found'}), 404
         
         # Generate AES key based on encryption level
-        aes_key = encryption.generate_aes_key(enc_config['aes_key_size'])
+        aes_key = encryption.generate_aes_key(key_size)
         
-        # Encrypt the text
-        encrypted_text = encryption.encrypt_data(text, aes_key)
+        # Compress (when worthwhile), then encrypt the text
+        payload, codec = encryption.compress_payload(text, compress)
+        encrypted_text = encryption.encrypt_data(payload, aes_key, cipher_suite=cipher_suite)
         
         # Encrypt AES key with receiver's public key (or encode for public sharing)
         if receiver:
-            encrypted_aes_key = encryption.encrypt_aes_key(aes_key, receiver['public_key'])
+            key_wrap, public_key, fingerprint = _receiver_wrap_key(receiver, enc_config)
+            encrypted_aes_key = encryption.wrap_aes_key(aes_key, public_key, key_wrap, fingerprint)
         else:
             # For public sharing, base64 encode the AES key
             import base64
             encrypted_aes_key = base64.b64encode(aes_key).decode()
+            key_wrap = None
         
         # Store content
         content_model = get_content_model()
@@ -88,34 +190,34 @@ def share_text():
             'length': len(text),
             'is_public': not bool(receiver_id),
             'encryption_level': encryption_level,
-            'encryption_name': enc_config['name']
+            'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite
         }
+        if key_wrap:
+            metadata['key_wrap'] = key_wrap
+        if codec:
+            metadata['compression'] = codec
         
         # Add password hash if provided
         if password:
             from werkzeug.security import generate_password_hash
-            metadata['password_hash'] = generate_password_hash(password)
+            metadata['password_hash'] = run_crypto(generate_password_hash, password)
         
         # Add max views if provided
         if max_views:
             metadata['max_views'] = int(max_views)
             metadata['views'] = 0
         
+        qr_generator = get_qr_generator()
+        qr_token = qr_generator.new_token_ref() if qr_mode == 'token' else None
         content_id, content = content_model.share_content(
             user_id, receiver_id, encrypted_text, metadata, 
-            encrypted_aes_key, expires_in
+            encrypted_aes_key, expires_in, qr_token=qr_token
         )
         
-        # Generate QR code
-        qr_data = {
-            'content_id': content_id,
-            'encrypted_key': encrypted_aes_key,
-            'sender_id': user_id,
-            'metadata': metadata
-        }
-        
-        qr_generator = get_qr_generator()
-        qr_code = qr_generator.generate_qr_code(qr_data)
+        # Plan the QR code; the image is rendered in the background
+        qr_data = _content_qr_data(content_id, encrypted_aes_key, user_id, metadata, qr_token)
+        qr_fields = _share_qr(content_id, qr_data, qr_options, data)
         
         # Send notification to receiver if not public
         if receiver_id:
@@ -158,12 +260,16 @@ def share_text():
         
         return jsonify({
             'content_id': content_id,
-            'qr_code': qr_code,
             'encryption_level': encryption_level,
             'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite,
+            'qr_mode': qr_mode,
+            **qr_fields,
             'message': 'Content shared successfully'
         }), 201
         
+    except QRCapacityError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -230,15 +336,15 @@ def send_qr_email():
         
         print("Step 5: Generating QR code...")
         # Generate QR code
-        qr_data = {
-            'content_id': content_id,
-            'encrypted_key': content.get('encrypted_aes_key'),
-            'sender_id': user_id,
-            'metadata': metadata
-        }
+        qr_data = _content_qr_data(content_id, content.get('encrypted_aes_key'), user_id, metadata,
+                                   content.get('qr_token'))
         
         qr_generator = get_qr_generator()
-        qr_code = qr_generator.generate_qr_code(qr_data)
+        qr_options = _qr_policy_options(data, default_target='email')
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        qr_code = qr_generator.generate_qr_code(qr_data, **qr_options)
         print("   QR code generated successfully!")
         
         print("Step 6: Checking Resend API credentials...")
@@ -352,59 +458,90 @@ def share_file():
         receiver_id = request.form.get('receiver_id')
         expires_in = request.form.get('expires_in')
         encryption_level = request.form.get('encryption_level', 'standard')
+        cipher_suite = request.form.get('cipher_suite')
+        compress = _compression_requested(request.form.get('compress'))
+        qr_mode = _qr_mode(request.form.get('qr_mode'))
+        qr_options = _qr_policy_options(request.form)
         password = request.form.get('password')  # Optional password protection
         max_views = request.form.get('max_views')  # Optional view limit
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        
         print(f"Sharing file: {file.filename}, type: {file.content_type}, encryption: {encryption_level}")
         
         # Get encryption configuration
         encryption = get_encryption_manager()
-        from utils.encryption import get_encryption_levels
+        from utils.encryption import get_encryption_levels, CIPHER_AES_GCM
         enc_levels = get_encryption_levels()
         enc_config = enc_levels.get(encryption_level, enc_levels['standard'])
-        
-        # Read file
-        file_data = file.read()
-        print(f"File data read: {len(file_data)} bytes")
+        cipher_suite, key_size = encryption.negotiate_cipher_suite(cipher_suite, enc_config)
         
         # Get receiver
         user_model = get_user_model()
         receiver = user_model.get_by_id(receiver_id) if receiver_id else None
         
         # Generate AES key based on encryption level
-        aes_key = encryption.generate_aes_key(enc_config['aes_key_size'])
+        aes_key = encryption.generate_aes_key(key_size)
         
-        # Encrypt file data
-        encrypted_data = encryption.encrypt_data(file_data, aes_key)
-        print(f"File encrypted: {len(encrypted_data)} bytes")
+        content_model = get_content_model()
+        file_id = None
+        if cipher_suite == CIPHER_AES_GCM:
+            # Stream the upload: read, compress, encrypt (segmented AES-GCM, in
+            # windows spread over the crypto pool) and write to GridFS, never
+            # holding the whole file
+            upload = {'size': 0}
+            payload, codec = encryption.compress_payload_stream(_iter_upload(file.stream, upload), compress)
+            file_id, stored, _ = content_model.put_file_stream(
+                encryption.encrypt_data_stream(payload, aes_key, executor=get_crypto_executor()),
+                file.filename, file.content_type,
+                {'sender_id': str(user_id), 'receiver_id': str(receiver_id) if receiver_id else None}
+            )
+            file_size = upload['size']
+            encrypted_data = None
+            print(f"File streamed: {file_size} bytes read, {stored} bytes stored")
+        else:
+            # ChaCha20-Poly1305 envelopes are single-shot, so the file is encrypted in memory
+            file_data = file.read()
+            file_size = len(file_data)
+            payload, codec = encryption.compress_payload(file_data, compress)
+            encrypted_data = encryption.encrypt_data(payload, aes_key, binary=True, cipher_suite=cipher_suite)
+            print(f"File encrypted: {len(encrypted_data)} bytes")
         
         # Encrypt AES key
         if receiver:
-            encrypted_aes_key = encryption.encrypt_aes_key(aes_key, receiver['public_key'])
+            key_wrap, public_key, fingerprint = _receiver_wrap_key(receiver, enc_config)
+            encrypted_aes_key = encryption.wrap_aes_key(aes_key, public_key, key_wrap, fingerprint)
         else:
             # For public sharing, base64 encode the AES key
             import base64
             encrypted_aes_key = base64.b64encode(aes_key).decode()
+            key_wrap = None
         
         # Store content
-        content_model = get_content_model()
         metadata = {
             'type': 'file',
             'filename': file.filename,
             'content_type': file.content_type,
-            'size': len(file_data),
+            'size': file_size,
             'is_public': not bool(receiver_id),
             'encryption_level': encryption_level,
-            'encryption_name': enc_config['name']
+            'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite
         }
+        if key_wrap:
+            metadata['key_wrap'] = key_wrap
+        if codec:
+            metadata['compression'] = codec
         
         # Add password hash if provided
         if password:
             from werkzeug.security import generate_password_hash
-            metadata['password_hash'] = generate_password_hash(password)
+            metadata['password_hash'] = run_crypto(generate_password_hash, password)
         
         # Add max views if provided
         if max_views:
@@ -412,30 +549,27 @@ def share_file():
             metadata['views'] = 0
         
         print(f"Storing content with metadata: {metadata}")
+        qr_generator = get_qr_generator()
+        qr_token = qr_generator.new_token_ref() if qr_mode == 'token' else None
         try:
             content_id, content = content_model.share_content(
                 user_id, receiver_id, encrypted_data, metadata,
-                encrypted_aes_key, int(expires_in) if expires_in else None
+                encrypted_aes_key, int(expires_in) if expires_in else None,
+                qr_token=qr_token, file_id=file_id
             )
             print(f"Content stored with ID: {content_id}")
         except Exception as storage_error:
             print(f"ERROR storing content: {storage_error}")
+            if file_id is not None:
+                content_model.fs.delete(file_id)
             import traceback
             traceback.print_exc()
             raise
         
         # Generate QR
-        qr_data = {
-            'content_id': content_id,
-            'encrypted_key': encrypted_aes_key,
-            'sender_id': user_id,
-            'metadata': metadata
-        }
+        qr_data = _content_qr_data(content_id, encrypted_aes_key, user_id, metadata, qr_token)
         
-        print("Generating QR code...")
-        qr_generator = get_qr_generator()
-        qr_code = qr_generator.generate_qr_code(qr_data)
-        print("QR code generated successfully")
+        qr_fields = _share_qr(content_id, qr_data, qr_options, request.form)
         
         # Notify receiver
         if receiver_id:
@@ -478,15 +612,269 @@ def share_file():
         
         return jsonify({
             'content_id': content_id,
-            'qr_code': qr_code,
             'encryption_level': encryption_level,
             'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite,
+            'qr_mode': qr_mode,
+            **qr_fields,
             'message': 'File shared successfully'
         }), 201
         
+    except QRCapacityError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+MAX_MULTI_RECIPIENTS = 50
+
+def _parse_receiver_ids(raw):
+    """Accept a JSON list, a list of form values or a comma-separated string"""
+    if isinstance(raw, str):
+        raw = [raw]
+    receiver_ids = []
+    for value in raw or []:
+        if isinstance(value, str) and value.strip().startswith('['):
+            import json
+            value = json.loads(value)
+        if isinstance(value, str):
+            value = value.split(',')
+        receiver_ids.extend(str(v).strip() for v in value if str(v).strip())
+    # Preserve order, drop duplicates
+    return list(dict.fromkeys(receiver_ids))
+
+@content_bp.route('/share/multi', methods=['POST'])
+@jwt_required()
+def share_multi():
+    """Share one payload with several receivers in a single request
+    
+    The payload is encrypted once and stored once; each receiver only adds
+    an RSA-wrapped copy of the AES key. Accepts JSON (text) or multipart
+    form data (file) with a receiver_ids list.
+    """
+    try:
+        user_id = get_jwt_identity()
+        
+        if request.files.get('file'):
+            form = request.form
+            file = request.files['file']
+            valid, msg = validate_file_upload(file, _upload_file_type(file.filename))
+            if not valid:
+                return jsonify({'error': msg}), 400
+            receiver_ids = _parse_receiver_ids(form.getlist('receiver_ids'))
+            payload = None  # read (or streamed) once the receivers are checked
+            content_type = 'file'
+        else:
+            form = request.get_json() or {}
+            text = form.get('text')
+            if not text:
+                return jsonify({'error': 'Text or file content required'}), 400
+            valid, msg = validate_text_content(text)
+            if not valid:
+                return jsonify({'error': msg}), 400
+            receiver_ids = _parse_receiver_ids(form.get('receiver_ids'))
+            payload = text
+            content_type = 'text'
+        
+        expires_in = form.get('expires_in')
+        encryption_level = form.get('encryption_level', 'standard')
+        cipher_suite = form.get('cipher_suite')
+        compress = _compression_requested(form.get('compress'))
+        qr_mode = _qr_mode(form.get('qr_mode'))
+        qr_options = _qr_policy_options(form)
+        password = form.get('password')
+        max_views = form.get('max_views')
+        
+        if not receiver_ids:
+            return jsonify({'error': 'At least one receiver is required'}), 400
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        if len(receiver_ids) > MAX_MULTI_RECIPIENTS:
+            return jsonify({'error': f'Too many receivers (max {MAX_MULTI_RECIPIENTS})'}), 400
+        for receiver_id in receiver_ids:
+            valid, msg = validate_object_id(receiver_id)
+            if not valid:
+                return jsonify({'error': f'Invalid receiver: {msg}'}), 400
+        
+        # Fetch all receivers in one query
+        user_model = get_user_model()
+        receivers = {
+            str(user['_id']): user
+            for user in user_model.collection.find({
+                '_id': {'$in': [ObjectId(rid) for rid in receiver_ids]},
+                'is_active': True
+            })
+        }
+        missing = [rid for rid in receiver_ids if rid not in receivers]
+        if missing:
+            return jsonify({'error': 'Receiver not found', 'receiver_ids': missing}), 404
+        
+        # Encrypt once, wrap the AES key per receiver
+        encryption = get_encryption_manager()
+        from utils.encryption import get_encryption_levels, CIPHER_AES_GCM
+        enc_levels = get_encryption_levels()
+        enc_config = enc_levels.get(encryption_level, enc_levels['standard'])
+        cipher_suite, key_size = encryption.negotiate_cipher_suite(cipher_suite, enc_config)
+        
+        recipient_keys = {rid: _receiver_wrap_key(receivers[rid], enc_config) for rid in receiver_ids}
+        recipients = [
+            (rid, public_key, fingerprint, key_wrap)
+            for rid, (key_wrap, public_key, fingerprint) in recipient_keys.items()
+        ]
+        content_model = get_content_model()
+        group_id = ObjectId()
+        blob_id = None
+        if content_type == 'file' and cipher_suite == CIPHER_AES_GCM:
+            # Stream the upload into the shared GridFS blob, as share_file does
+            aes_key = encryption.generate_aes_key(key_size)
+            upload = {'size': 0}
+            stream, codec = encryption.compress_payload_stream(_iter_upload(file.stream, upload), compress)
+            blob_id, _, _ = content_model.put_file_stream(
+                encryption.encrypt_data_stream(stream, aes_key, executor=get_crypto_executor()),
+                file.filename, file.content_type,
+                {'sender_id': str(user_id), 'group_id': str(group_id), 'recipient_count': len(receiver_ids)}
+            )
+            encrypted_data = None
+            wrapped_keys = encryption.wrap_for_recipients(aes_key, recipients)
+            payload_size = upload['size']
+        else:
+            # Text, or a file under single-shot ChaCha20-Poly1305 envelopes
+            if content_type == 'file':
+                payload = file.read()
+            compressed_payload, codec = encryption.compress_payload(payload, compress)
+            encrypted_data, wrapped_keys = encryption.encrypt_for_recipients(
+                compressed_payload,
+                recipients,
+                aes_key_size=key_size,
+                binary=True,
+                cipher_suite=cipher_suite
+            )
+            payload_size = len(payload)
+        
+        metadata = {
+            'type': content_type,
+            'is_public': False,
+            'encryption_level': encryption_level,
+            'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite,
+            'recipient_count': len(receiver_ids)
+        }
+        if codec:
+            metadata['compression'] = codec
+        if content_type == 'file':
+            metadata.update({
+                'filename': file.filename,
+                'content_type': file.content_type,
+                'size': payload_size
+            })
+        else:
+            metadata['length'] = payload_size
+        
+        if password:
+            from werkzeug.security import generate_password_hash
+            metadata['password_hash'] = run_crypto(generate_password_hash, password)
+        
+        if max_views:
+            metadata['max_views'] = int(max_views)
+            metadata['views'] = 0
+        
+        qr_generator = get_qr_generator()
+        qr_tokens = {rid: qr_generator.new_token_ref() for rid in receiver_ids} if qr_mode == 'token' else {}
+        try:
+            group_id, content_ids = content_model.share_content_multi(
+                user_id, wrapped_keys, encrypted_data, metadata,
+                int(expires_in) if expires_in else None,
+                recipient_metadata={rid: {'key_wrap': key_wrap} for rid, (key_wrap, _, _) in recipient_keys.items()},
+                qr_tokens=qr_tokens, blob_id=blob_id, group_id=group_id
+            )
+        except Exception:
+            if blob_id is not None:
+                content_model.fs.delete(blob_id)
+            raise
+        
+        # One QR per receiver (each carries that receiver's reference or wrapped key)
+        socketio = get_socketio()
+        notification_model = get_notification_model()
+        sender = user_model.get_by_id(user_id)
+        shares = []
+        for receiver_id in receiver_ids:
+            content_id = content_ids[receiver_id]
+            qr_fields = _share_qr(content_id, _content_qr_data(
+                content_id, wrapped_keys[receiver_id], user_id,
+                dict(metadata, key_wrap=recipient_keys[receiver_id][0]), qr_tokens.get(receiver_id)
+            ), qr_options, form)
+            
+            socketio.emit('new_content', {
+                'from': user_id,
+                'content_id': content_id
+            }, room=receiver_id)
+            
+            if receivers[receiver_id].get('settings', {}).get('notify_new_content', True):
+                notification_model.create_content_received_notification(
+                    receiver_id,
+                    user_id,
+                    sender['username'],
+                    content_id,
+                    content_type
+                )
+            
+            shares.append({
+                'receiver_id': receiver_id,
+                'receiver_name': receivers[receiver_id]['username'],
+                'content_id': content_id,
+                **qr_fields
+            })
+        
+        # Log activity
+        activity_model = get_activity_model()
+        activity_model.log_activity(
+            user_id,
+            'share_qr',
+            f"Shared encrypted {content_type} QR code with {len(receiver_ids)} friends",
+            {
+                'group_id': group_id,
+                'content_ids': list(content_ids.values()),
+                'content_type': content_type,
+                'encryption_level': encryption_level,
+                'receiver_ids': receiver_ids,
+                'is_public': False
+            },
+            visibility='friends'
+        )
+        
+        return jsonify({
+            'group_id': group_id,
+            'shares': shares,
+            'encryption_level': encryption_level,
+            'encryption_name': enc_config['name'],
+            'cipher_suite': cipher_suite,
+            'qr_mode': qr_mode,
+            'message': f'Content shared with {len(shares)} receivers'
+        }), 201
+        
+    except QRCapacityError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _unwrap_content_key(content, session_keys):
+    """Unwrap a content's AES key with the session's RSA or X25519 private key
+    
+    Runs on the crypto worker pool; workers keep the loaded RSA key cached by
+    its fingerprint, so only the first decode of a session parses it.
+    """
+    from utils.encryption import KEY_WRAP_X25519, unwrap_aes_key
+    key_wrap = content['metadata'].get('key_wrap', 'rsa-oaep')
+    user_private_key = fingerprint = None
+    if session_keys:
+        if key_wrap == KEY_WRAP_X25519:
+            user_private_key = session_keys.x25519
+        else:
+            user_private_key, fingerprint = session_keys.rsa, session_keys.rsa_fingerprint
+    if user_private_key is None:
+        raise Exception("Your private key not found. Please log out and log in again to decrypt content.")
+    return run_crypto(unwrap_aes_key, content['encrypted_key'], user_private_key, key_wrap, fingerprint)
+
 @content_bp.route('/decode', methods=['POST'])
 @jwt_required()
 def decode_content():
@@ -498,11 +886,88 @@ def decode_content():
         if not qr_data:
             return jsonify({'error': 'QR data required'}), 400
         
-        # Decode secure QR data if it's in encoded format
+        return _decode_qr_data(user_id, qr_data)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@content_bp.route('/decode/image', methods=['POST'])
+@jwt_required()
+def decode_content_image():
+    """Decode the QR code in an uploaded photo or screenshot, then decode its content
+    
+    Multipart form: image (the picture), index (optional, which of several
+    detected QR codes to decode; defaults to the first one carrying a share).
+    The response is the /decode response plus qr_codes (every detected code
+    with its position) and qr_index. Pass decode=false to only detect codes.
+    """
+    from utils import qr_reader
+    try:
+        user_id = get_jwt_identity()
+        if not qr_reader.available():
+            return jsonify({'error': 'Server-side QR decoding is not available'}), 503
+        
+        upload = request.files.get('image')
+        if upload is None:
+            return jsonify({'error': 'No image provided'}), 400
+        image_bytes = upload.read(qr_reader.max_upload_bytes() + 1)
+        if not image_bytes:
+            return jsonify({'error': 'Empty image'}), 400
+        if len(image_bytes) > qr_reader.max_upload_bytes():
+            return jsonify({'error': 'Image is too large'}), 413
+        
+        try:
+            codes = run_crypto(qr_reader.decode_image, image_bytes)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not codes:
+            return jsonify({'error': 'No QR code found in the image', 'qr_codes': []}), 422
+        
         qr_generator = get_qr_generator()
+        index = request.form.get('index')
+        if index is None:
+            index = next((i for i, code in enumerate(codes) if qr_generator.is_share_payload(code['data'])), None)
+            if index is None:
+                return jsonify({'error': 'No HideAnything QR code found in the image', 'qr_codes': codes}), 422
+        else:
+            try:
+                index = int(index)
+            except ValueError:
+                return jsonify({'error': 'Index must be a number'}), 400
+            if not 0 <= index < len(codes):
+                return jsonify({'error': f'Index must be between 0 and {len(codes) - 1}', 'qr_codes': codes}), 400
+        
+        if request.form.get('decode', 'true').lower() in ('0', 'false', 'no', 'off'):
+            return jsonify({'qr_codes': codes, 'qr_index': index}), 200
+        
+        response, status = _decode_qr_data(user_id, codes[index]['data'])
+        body = response.get_json()
+        body.update({'qr_codes': codes, 'qr_index': index})
+        return jsonify(body), status
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _decode_qr_data(user_id, qr_data):
+    """Resolve scanned QR data to its content, enforce access rules and decrypt it
+    
+    Returns:
+        Tuple of (JSON response, status code)
+    """
+    # Token-mode QR codes carry a signed reference resolved through the qr_token index
+    qr_generator = get_qr_generator()
+    content_model = get_content_model()
+    try:
+        qr_token = qr_generator.decode_reference_token(qr_data)
+    except ValueError:
+        return jsonify({'error': 'Invalid QR code'}), 400
+    
+    # Decode secure QR data if it's in encoded format
+    content_id = None
+    if not qr_token:
         try:
             # Try to decode if it's secure format (new or old scheme)
-            if isinstance(qr_data, str) and ('qrs://' in qr_data or 'hideanythingqr://' in qr_data or len(qr_data) > 50):
+            if isinstance(qr_data, str) and ('qrs://' in qr_data or 'QRS://B/' in qr_data or 'hideanythingqr://' in qr_data or len(qr_data) > 50):
                 decoded_data = qr_generator.decode_secure_data(qr_data)
                 if isinstance(decoded_data, dict) and 'content_id' in decoded_data:
                     content_id = decoded_data['content_id']
@@ -513,201 +978,237 @@ def decode_content():
         except:
             # If decoding fails, use as-is
             content_id = qr_data
-        
-        # Get content
-        content_model = get_content_model()
-        
-        # First try to find by content_id
-        from bson import ObjectId
+    
+    # Get content
+    from bson import ObjectId
+    if qr_token:
+        content = content_model.get_by_qr_token(qr_token)
+        content_id = str(content['_id']) if content else None
+    else:
         content = content_model.collection.find_one({'_id': ObjectId(content_id)})
+    
+    if not content:
+        return jsonify({'error': 'Content not found'}), 404
+    
+    # Check if content is active
+    if not content.get('is_active', True):
+        return jsonify({'error': 'This content has been deactivated by the sender'}), 403
+    
+    # Check expiry date
+    if content.get('expires_at'):
+        from datetime import datetime, timezone
+        expires_at = content['expires_at']
         
-        if not content:
-            return jsonify({'error': 'Content not found'}), 404
-        
-        # Check if content is active
-        if not content.get('is_active', True):
-            return jsonify({'error': 'This content has been deactivated by the sender'}), 403
-        
-        # Check expiry date
-        if content.get('expires_at'):
-            from datetime import datetime, timezone
-            expires_at = content['expires_at']
-            
-            # Ensure expires_at is timezone-aware
-            if expires_at.tzinfo is None:
-                expires_at = expires_at.replace(tzinfo=timezone.utc)
-            
-            if datetime.now(timezone.utc) > expires_at:
-                return jsonify({
-                    'error': 'Content has expired',
-                    'expired_at': expires_at.isoformat()
-                }), 410  # HTTP 410 Gone
-        
-        # Check view limit
-        metadata = content.get('metadata', {})
-        if metadata.get('max_views'):
-            current_views = metadata.get('views', 0)
-            max_views = metadata['max_views']
-            if current_views >= max_views:
-                return jsonify({
-                    'error': 'View limit reached',
-                    'max_views': max_views,
-                    'current_views': current_views
-                }), 403  # HTTP 403 Forbidden
-        
-        # Check password protection
-        if metadata.get('password_hash'):
-            provided_password = request.headers.get('X-Content-Password')
-            if not provided_password:
-                return jsonify({
-                    'error': 'Password required',
-                    'requires_password': True
-                }), 401  # HTTP 401 Unauthorized
-            
-            from werkzeug.security import check_password_hash
-            if not check_password_hash(metadata['password_hash'], provided_password):
-                return jsonify({
-                    'error': 'Invalid password',
-                    'requires_password': True
-                }), 401  # HTTP 401 Unauthorized
-        
-        # Check permissions
-        if str(content['receiver_id']) != user_id and not content['metadata'].get('is_public'):
-            return jsonify({'error': 'Not authorized to view this content'}), 403
-        
-        # Get user's private key for decryption
-        user_model = get_user_model()
-        user = user_model.get_by_id(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        # Ensure expires_at is timezone-aware
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
         
-        # Decrypt the content
-        encryption = get_encryption_manager()
-        decrypted_data = None
-        decryption_error = None
+        if datetime.now(timezone.utc) > expires_at:
+            return jsonify({
+                'error': 'Content has expired',
+                'expired_at': expires_at.isoformat()
+            }), 410  # HTTP 410 Gone
+    
+    # Check view limit
+    metadata = content.get('metadata', {})
+    if metadata.get('max_views'):
+        current_views = metadata.get('views', 0)
+        max_views = metadata['max_views']
+        if current_views >= max_views:
+            return jsonify({
+                'error': 'View limit reached',
+                'max_views': max_views,
+                'current_views': current_views
+            }), 403  # HTTP 403 Forbidden
+    
+    # Check password protection
+    if metadata.get('password_hash'):
+        provided_password = request.headers.get('X-Content-Password')
+        if not provided_password:
+            return jsonify({
+                'error': 'Password required',
+                'requires_password': True
+            }), 401  # HTTP 401 Unauthorized
         
-        try:
-            # Get AES key first
-            if content['metadata'].get('is_public'):
-                # For public content, the AES key is base64 encoded
+        from werkzeug.security import check_password_hash
+        if not run_crypto(check_password_hash, metadata['password_hash'], provided_password):
+            return jsonify({
+                'error': 'Invalid password',
+                'requires_password': True
+            }), 401  # HTTP 401 Unauthorized
+    
+    # Check permissions
+    if str(content['receiver_id']) != user_id and not content['metadata'].get('is_public'):
+        return jsonify({'error': 'Not authorized to view this content'}), 403
+    
+    user_model = get_user_model()
+    
+    # Get the private keys loaded at login for this session
+    session_keys = get_session_key_store().get(session_id_from_claims(get_jwt()), user_id)
+    
+    # Decrypt the content
+    encryption = get_encryption_manager()
+    decrypted_data = None
+    decryption_error = None
+    
+    try:
+        # Get AES key first
+        if content['metadata'].get('is_public'):
+            # For public content, the AES key is base64 encoded
+            import base64
+            aes_key = base64.b64decode(content['encrypted_key'])
+        else:
+            # For private content, decrypt AES key with RSA
+            # Check if current user is the receiver
+            receiver_id = content.get('receiver_id')
+            if not receiver_id:
+                # No specific receiver, use public decryption
                 import base64
                 aes_key = base64.b64decode(content['encrypted_key'])
-            else:
-                # For private content, decrypt AES key with RSA
-                # Check if current user is the receiver
-                receiver_id = content.get('receiver_id')
-                if not receiver_id:
-                    # No specific receiver, use public decryption
-                    import base64
-                    aes_key = base64.b64decode(content['encrypted_key'])
-                elif str(receiver_id) != user_id:
-                    # User is not the receiver, check if sender
-                    if str(content['sender_id']) == user_id:
-                        # Sender viewing their own content
-                        # Use sender's private key
-                        user_private_key = user.get('private_key')
-                        if not user_private_key:
-                            raise Exception("Your private key not found. Please log out and log in again to decrypt content.")
-                        aes_key = encryption.decrypt_aes_key(content['encrypted_key'], user_private_key)
-                    else:
-                        raise Exception("You are not authorized to decrypt this content. It was shared with someone else.")
-                else:
-                    # Current user is the receiver
-                    user_private_key = user.get('private_key')
-                    if not user_private_key:
-                        raise Exception("Your private key not found. Please log out and log in again to decrypt content.")
-                    aes_key = encryption.decrypt_aes_key(content['encrypted_key'], user_private_key)
-            
-            # Get encrypted data
-            if content['metadata'].get('type') == 'file' and 'file_id' in content:
-                # For files, retrieve from GridFS first
-                grid_file = content_model.get_file(content['file_id'])
-                if grid_file:
-                    encrypted_data_str = grid_file.read().decode('utf-8')
+            elif str(receiver_id) != user_id:
+                # User is not the receiver, check if sender
+                if str(content['sender_id']) == user_id:
+                    # Sender viewing their own content
+                    # Use sender's private key
+                    aes_key = _unwrap_content_key(content, session_keys)
                 else:
-                    raise Exception("File not found in GridFS")
+                    raise Exception("You are not authorized to decrypt this content. It was shared with someone else.")
             else:
-                # For text, use encrypted_data directly
-                encrypted_data_str = content['encrypted_data']
-            
-            # Decrypt the data with the AES key
-            is_file = content['metadata'].get('type') == 'file'
-            decrypted_data = encryption.decrypt_data(encrypted_data_str, aes_key, return_bytes=is_file)
-            
-            # For files, convert bytes to base64 for JSON response
-            if is_file and isinstance(decrypted_data, bytes):
-                import base64
-                decrypted_data = base64.b64encode(decrypted_data).decode('utf-8')
-            
-        except Exception as e:
-            print(f"[DECRYPTION ERROR] {e}")
-            import traceback
-            traceback.print_exc()
-            decrypted_data = None
-            decryption_error = str(e)
-        
-        # Mark as viewed
-        content_model.mark_as_viewed(content_id)
-        
-        # Notify sender that their content was viewed (if not public and not the sender viewing)
-        sender_id = str(content['sender_id'])
-        if sender_id != user_id and content.get('receiver_id'):
-            sender = user_model.get_by_id(sender_id)
-            if sender:
-                sender_settings = sender.get('settings', {})
-                if sender_settings.get('notify_activities', True):
-                    notification_model = get_notification_model()
-                    viewer = user_model.get_by_id(user_id)
-                    notification_model.create_content_viewed_notification(
-                        sender_id,
-                        user_id,
-                        viewer['username'],
-                        content_id
-                    )
-        
-        # Log scan activity
-        activity_model = get_activity_model()
-        sender = user_model.get_by_id(str(content['sender_id']))
-        sender_name = sender.get('username', 'Unknown') if sender else 'Unknown'
-        
-        content_type = content['metadata'].get('type', 'unknown')
-        activity_model.log_activity(
-            user_id,
-            'scan_qr',
-            f"Scanned QR code from {sender_name} ({content_type})",
-            {
-                'content_id': content_id,
-                'content_type': content_type,
-                'sender_id': str(content['sender_id']),
-                'sender_name': sender_name
-            },
-            visibility='private'
+                # Current user is the receiver
+                aes_key = _unwrap_content_key(content, session_keys)
+        
+        # Get encrypted data (GridFS blob for files, inline text otherwise)
+        encrypted_payload = content_model.read_payload(content)
+        if encrypted_payload is None:
+            raise Exception("File not found in GridFS")
+        
+        # Decrypt the data with the AES key
+        is_file = content['metadata'].get('type') == 'file'
+        decrypted_data = encryption.decrypt_data(
+            encrypted_payload, aes_key, return_bytes=is_file,
+            cipher_suite=content['metadata'].get('cipher_suite'),
+            compression=content['metadata'].get('compression')
         )
         
-        response_data = {
-            'content_id': str(content['_id']),
-            'sender_id': str(content['sender_id']),
-            'sender_name': sender_name,
-            'metadata': content['metadata'],
-            'created_at': content['created_at'].isoformat() if content.get('created_at') else None,
-            'decrypted_content': decrypted_data,
-            'is_encrypted': decrypted_data is None,
-            'decryption_error': decryption_error
-        }
-        
-        # If decryption failed, include encrypted data for debugging (only first 200 chars)
-        if decrypted_data is None:
-            response_data['encrypted_data'] = content.get('encrypted_data', '')[:200] if content.get('encrypted_data') else None
-        
-        # If it's a file, provide download link
-        if content['metadata'].get('type') == 'file' and 'file_id' in content:
-            response_data['download_url'] = f'/api/content/download/{content_id}'
-        
-        return jsonify(response_data), 200
+        # For files, convert bytes to base64 for JSON response
+        if is_file and isinstance(decrypted_data, bytes):
+            import base64
+            decrypted_data = base64.b64encode(decrypted_data).decode('utf-8')
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        print(f"[DECRYPTION ERROR] {e}")
+        import traceback
+        traceback.print_exc()
+        decrypted_data = None
+        decryption_error = str(e)
+    
+    # Mark as viewed
+    content_model.mark_as_viewed(content_id)
+    
+    # Notify sender that their content was viewed (if not public and not the sender viewing)
+    sender_id = str(content['sender_id'])
+    sender = user_model.get_by_id(sender_id)
+    if sender_id != user_id and content.get('receiver_id'):
+        if sender:
+            sender_settings = sender.get('settings', {})
+            if sender_settings.get('notify_activities', True):
+                notification_model = get_notification_model()
+                viewer = user_model.get_by_id(user_id)
+                notification_model.create_content_viewed_notification(
+                    sender_id,
+                    user_id,
+                    viewer['username'],
+                    content_id
+                )
+    
+    # Log scan activity
+    activity_model = get_activity_model()
+    sender_name = sender.get('username', 'Unknown') if sender else 'Unknown'
+    
+    content_type = content['metadata'].get('type', 'unknown')
+    activity_model.log_activity(
+        user_id,
+        'scan_qr',
+        f"Scanned QR code from {sender_name} ({content_type})",
+        {
+            'content_id': content_id,
+            'content_type': content_type,
+            'sender_id': str(content['sender_id']),
+            'sender_name': sender_name
+        },
+        visibility='private'
+    )
+    
+    response_data = {
+        'content_id': str(content['_id']),
+        'sender_id': str(content['sender_id']),
+        'sender_name': sender_name,
+        'metadata': content['metadata'],
+        'created_at': content['created_at'].isoformat() if content.get('created_at') else None,
+        'decrypted_content': decrypted_data,
+        'is_encrypted': decrypted_data is None,
+        'decryption_error': decryption_error
+    }
+    
+    # If decryption failed, include encrypted data for debugging (only first 200 chars)
+    if decrypted_data is None:
+        response_data['encrypted_data'] = content.get('encrypted_data', '')[:200] if content.get('encrypted_data') else None
+    
+    # If it's a file, provide download link
+    if content['metadata'].get('type') == 'file' and 'file_id' in content:
+        response_data['download_url'] = f'/api/content/download/{content_id}'
+    
+    return jsonify(response_data), 200
+
+def _file_etag(grid_file):
+    """Strong ETag of a GridFS file, from its id and upload date"""
+    return f"{grid_file._id}-{int(grid_file.upload_date.timestamp() * 1000)}"
+
+def _requested_range(grid_file, etag):
+    """Byte range asked for by a Range header, honouring If-Range
+
+    Returns:
+        (start, stop) tuple, None to send the whole file, or False when the
+        range cannot be satisfied
+    """
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    if_range = request.if_range
+    if if_range.etag is not None and if_range.etag != etag:
+        return None
+    if if_range.date is not None:
+        return None
+    return byte_range.range_for_length(grid_file.length) or False
+
+def _iter_grid_file(grid_file, start, stop):
+    """Yield bytes [start, stop) of a GridFS file one chunk at a time, then close it"""
+    try:
+        grid_file.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            data = grid_file.read(min(grid_file.chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        grid_file.close()
+
+def _not_modified_since(grid_file):
+    """If-Modified-Since check, only consulted without an If-None-Match header"""
+    if request.if_none_match or request.if_modified_since is None:
+        return False
+    return grid_file.upload_date.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=grid_file.upload_date.tzinfo)
+
+def _attachment_filename(filename):
+    """Content-Disposition filename parameter, RFC 5987 encoded if not ASCII"""
+    try:
+        filename.encode('ascii')
+        return {'filename': filename}
+    except UnicodeEncodeError:
+        from urllib.parse import quote
+        return {'filename*': f"UTF-8''{quote(filename, safe='')}"}
 
 @content_bp.route('/download/<content_id>', methods=['GET'])
 @jwt_required()
@@ -727,19 +1228,46 @@ def download_file(content_id):
         if str(content['receiver_id']) != user_id and not content['metadata'].get('is_public'):
             return jsonify({'error': 'Not authorized'}), 403
         
-        # Get file from GridFS
+        # Get file from GridFS (only its files document; chunks are read as they are sent)
         file_data = content_model.get_file(content['file_id'])
         if not file_data:
             return jsonify({'error': 'File data not found'}), 404
         
-        # For demo, return the encrypted file
-        # In real app, you would decrypt it first
-        return send_file(
-            BytesIO(file_data.read()),
-            mimetype=content['metadata']['content_type'],
-            as_attachment=True,
-            download_name=content['metadata']['filename']
-        )
+        # GridFS files never change, so If-None-Match answers 304 and a Range
+        # request seeks straight to the GridFS chunk holding its first byte.
+        # The body is a plain generator rather than the file object, so no
+        # wsgi.file_wrapper reads and discards the bytes before the range.
+        etag = _file_etag(file_data)
+        length = file_data.length
+        response_class = current_app.response_class
+        if request.if_none_match.contains(etag) or _not_modified_since(file_data):
+            file_data.close()
+            response = response_class(status=304)
+        else:
+            byte_range = _requested_range(file_data, etag)
+            if byte_range is False:
+                file_data.close()
+                response = response_class(status=416)
+                response.headers['Content-Range'] = f'bytes */{length}'
+            elif byte_range:
+                start, stop = byte_range
+                response = response_class(_iter_grid_file(file_data, start, stop), status=206,
+                                          mimetype=content['metadata']['content_type'], direct_passthrough=True)
+                response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+                response.content_length = stop - start
+            else:
+                response = response_class(_iter_grid_file(file_data, 0, length),
+                                          mimetype=content['metadata']['content_type'], direct_passthrough=True)
+                response.content_length = length
+            if response.status_code != 416:
+                response.headers.set('Content-Disposition', 'attachment',
+                                     **_attachment_filename(content['metadata']['filename']))
+        
+        response.accept_ranges = 'bytes'
+        response.cache_control.private = True
+        response.last_modified = file_data.upload_date
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -774,7 +1302,9 @@ def get_encryption_levels_route():
                 'name': config['name'],
                 'description': config['description'],
                 'aes_bits': config['aes_key_size'] * 8,
-                'rsa_bits': config['rsa_key_size']
+                'rsa_bits': config.get('rsa_key_size'),
+                'key_wrap': config.get('key_wrap', 'rsa-oaep'),
+                'cipher': config.get('cipher', 'aes-gcm')
             })
         
         return jsonify({'levels': formatted_levels}), 200
@@ -838,37 +1368,70 @@ def activate_content(content_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+QR_IMAGE_MIN_SIZE = 64
+QR_IMAGE_MAX_SIZE = 2048
+QR_IMAGE_MAX_AGE = 86400  # The image of a content never changes; the ETag covers payload and render options
+QR_IMAGE_MIMETYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+QR_BATCH_OUTPUTS = ('ndjson', 'zip')
+
+def _qr_image_size(source):
+    """PNG edge length requested by the client
+    
+    Returns:
+        Tuple of (size, error_message); size is None (default 10-pixel
+        modules) when the client asks for none
+    """
+    if source.get('size') is None:
+        return None, None
+    try:
+        size = int(source.get('size'))
+    except (TypeError, ValueError):
+        return None, 'Size must be a number'
+    if not QR_IMAGE_MIN_SIZE <= size <= QR_IMAGE_MAX_SIZE:
+        return None, f'Size must be between {QR_IMAGE_MIN_SIZE} and {QR_IMAGE_MAX_SIZE}'
+    return size, None
+
+def _sender_qr_data(content_id, user_id):
+    """QR payload of a content owned by user_id
+    
+    Returns:
+        Tuple of (content, qr_data, error_response); error_response is None on success
+    """
+    content = get_content_model().get_by_id(content_id)
+    if not content:
+        return None, None, (jsonify({'error': 'Content not found'}), 404)
+    if str(content['sender_id']) != user_id:
+        return None, None, (jsonify({'error': 'Unauthorized'}), 403)
+    qr_data = _content_qr_data(content_id, content['encrypted_key'], user_id,
+                               content.get('metadata', {}), content.get('qr_token'))
+    return content, qr_data, None
+
 @content_bp.route('/qr/<content_id>', methods=['GET'])
 @jwt_required()
 def get_content_qr(content_id):
     """Get QR code for a shared content"""
     try:
         user_id = get_jwt_identity()
-        content_model = get_content_model()
         
         # Get content - verify user is the sender
-        from bson import ObjectId
-        content = content_model.get_by_id(content_id)
+        content, qr_data, error = _sender_qr_data(content_id, user_id)
+        if error:
+            return error
         
-        if not content:
-            return jsonify({'error': 'Content not found'}), 404
-        
-        if str(content['sender_id']) != user_id:
-            return jsonify({'error': 'Unauthorized'}), 403
-        
-        # Regenerate QR code from stored data
-        qr_data = {
-            'content_id': content_id,
-            'encrypted_key': content['encrypted_key'],
-            'sender_id': user_id,
-            'metadata': content.get('metadata', {})
-        }
+        qr_options = _qr_policy_options(request.args)
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
         
         qr_generator = get_qr_generator()
-        qr_code = qr_generator.generate_qr_code(qr_data)
+        try:
+            qr_code, qr_info = qr_generator.generate_qr_code_with_info(qr_data, source='regenerate', **qr_options)
+        except QRCapacityError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
             'qr_code': qr_code,
+            'qr': qr_info,
             'content_id': content_id,
             'encryption_level': content.get('metadata', {}).get('encryption_level', 'standard'),
             'encryption_name': content.get('metadata', {}).get('encryption_name', 'Standard Encryption'),
@@ -878,6 +1441,288 @@ def get_content_qr(content_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@content_bp.route('/qr/<content_id>.<any(png, svg):image_format>', methods=['GET'])
+@jwt_required()
+def get_content_qr_image(content_id, image_format):
+    """Serve a content's QR code as a PNG or SVG image
+    
+    The ETag is the content-addressed key of the image, so a matching
+    If-None-Match is answered with 304 before anything is rendered.
+    Query parameters: size (PNG edge length in pixels), qr_target, qr_ec,
+    qr_max_version.
+    """
+    try:
+        user_id = get_jwt_identity()
+        
+        content, qr_data, error = _sender_qr_data(content_id, user_id)
+        if error:
+            return error
+        
+        size, msg = _qr_image_size(request.args)
+        if msg:
+            return jsonify({'error': msg}), 400
+        
+        qr_options = _qr_policy_options(request.args)
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        
+        qr_generator = get_qr_generator()
+        try:
+            plan = qr_generator.plan_qr(qr_data, size, image_format=image_format, source='regenerate',
+                                        **qr_options)
+        except QRCapacityError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        headers = {
+            # Private: the image is only served to its authenticated sender
+            'Cache-Control': f'private, max-age={QR_IMAGE_MAX_AGE}',
+            'Vary': 'Authorization',
+            'X-QR-Version': str(plan['info']['version']),
+            'X-QR-Modules': str(plan['info']['modules']),
+            'X-QR-Error-Correction': plan['info']['error_correction']
+        }
+        if request.if_none_match.contains(plan['key']):
+            response = current_app.response_class(status=304, headers=headers)
+        else:
+            response = current_app.response_class(
+                qr_generator.render_plan(plan), mimetype=QR_IMAGE_MIMETYPES[image_format], headers=headers
+            )
+        response.set_etag(plan['key'])
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# The image embeds key material (the raw AES key of a public share), so it
+# is only cached privately and briefly; revalidation re-checks the content
+QR_KEYED_MAX_AGE = 300
+
+@content_bp.route('/qr/<content_id>/<key>.png', methods=['GET'])
+def get_content_qr_by_key(content_id, key):
+    """Serve a share's pre-rendered QR image by its content-addressed key
+    
+    This is the qr_url returned by the share routes. The key is the SHA-256
+    of the QR payload and render options, so the URL is unguessable and its
+    bytes never change: it needs no Authorization header (it can be used in
+    <img src>). The payload carries key material, so the image is cached
+    privately for QR_KEYED_MAX_AGE seconds and then revalidated by ETag;
+    once the content is deleted the URL returns 404. A render still in
+    progress is waited for briefly; an image that was never stored is
+    rendered on demand from the content, after checking the key matches.
+    """
+    import re
+    from utils.qr_cache import get_qr_cache
+    from utils.qr_prerender import get_qr_prerenderer
+    try:
+        if not re.fullmatch(r'[0-9a-f]{64}', key):
+            return jsonify({'error': 'QR image not found'}), 404
+        valid, _ = validate_object_id(content_id)
+        content = get_content_model().get_by_id(content_id) if valid else None
+        if not content:
+            return jsonify({'error': 'QR image not found'}), 404
+        headers = {'Cache-Control': f'private, max-age={QR_KEYED_MAX_AGE}, must-revalidate'}
+        if request.if_none_match.contains(key):
+            response = current_app.response_class(status=304, headers=headers)
+            response.set_etag(key)
+            return response
+        
+        cache = get_qr_cache()
+        prerenderer = get_qr_prerenderer()
+        if prerenderer.is_pending(key):
+            prerenderer.wait(key)
+        image = cache.get(key)
+        
+        if image is None:
+            qr_data = _content_qr_data(content_id, content['encrypted_key'], str(content['sender_id']),
+                                       content.get('metadata', {}), content.get('qr_token'))
+            qr_options = _qr_policy_options(request.args)
+            valid, _ = validate_qr_options(**qr_options)
+            if not valid:
+                return jsonify({'error': 'QR image not found'}), 404
+            try:
+                plan = get_qr_generator().plan_qr(qr_data, source='regenerate', **qr_options)
+            except QRCapacityError:
+                return jsonify({'error': 'QR image not found'}), 404
+            if plan['key'] != key:
+                return jsonify({'error': 'QR image not found'}), 404
+            image = get_qr_generator().render_plan(plan)
+        
+        response = current_app.response_class(image, mimetype='image/png', headers=headers)
+        response.set_etag(key)
+        return response
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@content_bp.route('/qr/batch', methods=['POST'])
+@jwt_required()
+def get_content_qr_batch():
+    """Render the QR codes of many contents in one request
+    
+    The contents are loaded with a single query and rendered on the crypto
+    worker pool; results stream back in request order as they are ready.
+    JSON body: content_ids (list), output ('ndjson' or 'zip'), format ('png'
+    or 'svg'), size, qr_target, qr_ec, qr_max_version.
+    
+    NDJSON: one object per content with content_id, qr, etag and the base64
+    image, or content_id and error. ZIP: <content_id>.<format> per rendered
+    content, plus errors.json when some could not be rendered.
+    """
+    import os
+    import json
+    from utils.streaming import iter_zip
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        
+        content_ids = data.get('content_ids')
+        max_batch = int(os.environ.get('QR_BATCH_MAX', 500))
+        if not isinstance(content_ids, list) or not content_ids:
+            return jsonify({'error': 'content_ids must be a non-empty list'}), 400
+        if len(content_ids) > max_batch:
+            return jsonify({'error': f'At most {max_batch} contents per batch'}), 400
+        for content_id in content_ids:
+            valid, msg = validate_object_id(content_id)
+            if not valid:
+                return jsonify({'error': f'{msg}: {content_id}'}), 400
+        content_ids = list(dict.fromkeys(content_ids))
+        
+        output = data.get('output', 'ndjson')
+        image_format = data.get('format', 'png')
+        if output not in QR_BATCH_OUTPUTS:
+            return jsonify({'error': f"Output must be one of: {', '.join(QR_BATCH_OUTPUTS)}"}), 400
+        if image_format not in QR_IMAGE_MIMETYPES:
+            return jsonify({'error': f"Format must be one of: {', '.join(QR_IMAGE_MIMETYPES)}"}), 400
+        size, msg = _qr_image_size(data)
+        if msg:
+            return jsonify({'error': msg}), 400
+        qr_options = _qr_policy_options(data)
+        valid, msg = validate_qr_options(**qr_options)
+        if not valid:
+            return jsonify({'error': msg}), 400
+        
+        # One query; contents of other senders are reported as not found
+        contents = get_content_model().get_by_ids(content_ids, sender_id=user_id)
+        qr_generator = get_qr_generator()
+        plans = []
+        errors = {}
+        for content_id in content_ids:
+            content = contents.get(content_id)
+            if content is None:
+                errors[content_id] = 'Content not found'
+                continue
+            qr_data = _content_qr_data(content_id, content['encrypted_key'], user_id,
+                                       content.get('metadata', {}), content.get('qr_token'))
+            try:
+                plan = qr_generator.plan_qr(qr_data, size, image_format=image_format, **qr_options)
+            except QRCapacityError as e:
+                errors[content_id] = str(e)
+                continue
+            plan['content_id'] = content_id
+            plans.append(plan)
+        
+        rendered = qr_generator.render_plans(plans)
+        
+        if output == 'zip':
+            def members():
+                for plan, image in rendered:
+                    yield f"{plan['content_id']}.{image_format}", image
+                if errors:
+                    yield 'errors.json', json.dumps(errors, indent=2).encode()
+            
+            return current_app.response_class(
+                iter_zip(members(), compress=image_format == 'svg'),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="qr-codes.zip"'}
+            )
+        
+        def lines():
+            for content_id in content_ids:
+                if content_id in errors:
+                    yield json.dumps({'content_id': content_id, 'error': errors[content_id]}) + '\n'
+                    continue
+                plan, image = next(rendered)
+                yield json.dumps({
+                    'content_id': plan['content_id'],
+                    'qr': plan['info'],
+                    'etag': plan['key'],
+                    'format': image_format,
+                    'image': base64.b64encode(image).decode()
+                }) + '\n'
+        
+        return current_app.response_class(lines(), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _sheet_label(content):
+    """Short printed caption of a content on a QR sheet"""
+    metadata = content.get('metadata', {})
+    title = metadata.get('filename') or metadata.get('type', 'content').capitalize()
+    created = content.get('created_at')
+    date = f" - {created.strftime('%Y-%m-%d')}" if created else ''
+    return f"{title}{date} - {str(content['_id'])[-6:]}"
+
+@content_bp.route('/qr/sheet', methods=['GET'])
+@jwt_required()
+def get_content_qr_sheet():
+    """Printable sheets of the QR codes of the user's active contents
+    
+    Query parameters: format ('pdf', default, or 'png' for a ZIP of PNG
+    pages), page ('a4' or 'letter'), columns and rows (codes per page),
+    labels (true/false), dpi (PNG only, 72-300), type ('text' or 'file').
+    Pages are rendered on the crypto worker pool and streamed as they are
+    ready; the newest QR_SHEET_MAX_CODES contents are included.
+    """
+    import itertools
+    from utils import qr_sheet
+    try:
+        user_id = get_jwt_identity()
+        
+        sheet_format = request.args.get('format', 'pdf')
+        page = request.args.get('page', 'a4').lower()
+        if sheet_format not in ('pdf', 'png'):
+            return jsonify({'error': 'Format must be pdf or png'}), 400
+        if page not in qr_sheet.PAGE_SIZES:
+            return jsonify({'error': f"Page must be one of: {', '.join(qr_sheet.PAGE_SIZES)}"}), 400
+        try:
+            columns = int(request.args.get('columns', 3))
+            rows = int(request.args.get('rows', 4))
+            dpi = int(request.args.get('dpi', 150))
+        except ValueError:
+            return jsonify({'error': 'Columns, rows and dpi must be numbers'}), 400
+        if not (1 <= columns <= qr_sheet.MAX_GRID and 1 <= rows <= qr_sheet.MAX_GRID):
+            return jsonify({'error': f'Columns and rows must be between 1 and {qr_sheet.MAX_GRID}'}), 400
+        if not 72 <= dpi <= 300:
+            return jsonify({'error': 'DPI must be between 72 and 300'}), 400
+        labels = request.args.get('labels', 'true').lower() not in ('0', 'false', 'no', 'off')
+        
+        sheet = qr_sheet.layout(page, columns, rows, labels)
+        cursor = get_content_model().iter_shared_by_user(user_id, active_only=True,
+                                                         content_type=request.args.get('type'))
+        codes = (
+            (_content_qr_data(str(content['_id']), content['encrypted_key'], user_id,
+                              content.get('metadata', {}), content.get('qr_token')),
+             _sheet_label(content))
+            for content in itertools.islice(cursor, qr_sheet.max_codes())
+        )
+        
+        if sheet_format == 'png':
+            return current_app.response_class(
+                qr_sheet.iter_png_zip(codes, sheet, dpi),
+                mimetype='application/zip',
+                headers={'Content-Disposition': 'attachment; filename="qr-sheets.zip"'}
+            )
+        return current_app.response_class(
+            qr_sheet.iter_pdf(codes, sheet),
+            mimetype='application/pdf',
+            headers={'Content-Disposition': 'attachment; filename="qr-sheets.pdf"'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @content_bp.route('/delete/<content_id>', methods=['DELETE'])
 @jwt_required()
 def delete_content(content_id):
@@ -342,17 +342,26 @@ def change_password():
             return jsonify({'error': 'User not found'}), 404
         
         import bcrypt
-        if not bcrypt.checkpw(current_password.encode('utf-8'), user['password_hash']):
+        from utils.crypto_executor import run_crypto
+        if not run_crypto(bcrypt.checkpw, current_password.encode('utf-8'), user['password_hash']):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Hash new password
-        new_password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        new_password_hash = run_crypto(bcrypt.hashpw, new_password.encode('utf-8'), bcrypt.gensalt())
+        
+        # The private keys are encrypted with the password: re-encrypt them in
+        # the same update, or received content could never be decrypted again
+        try:
+            key_updates = user_model.reencrypt_private_keys(user, current_password, new_password)
+        except Exception as e:
+            print(f"[ERROR] Could not re-encrypt private keys of {user_id}: {e}")
+            return jsonify({'error': 'Could not re-encrypt private keys; password not changed'}), 500
         
         # Update password
         db = get_db()
         db.users.update_one(
             {'_id': ObjectId(user_id)},
-            {'$set': {'password_hash': new_password_hash}}
+            {'$set': {'password_hash': new_password_hash, **key_updates}}
         )
         
         return jsonify({'message': 'Password changed successfully'}), 200
@@ -380,10 +389,13 @@ def delete_account():
             return jsonify({'error': 'User not found'}), 404
         
         import bcrypt
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password_hash']):
+        from utils.crypto_executor import run_crypto
+        if not run_crypto(bcrypt.checkpw, password.encode('utf-8'), user['password_hash']):
             return jsonify({'error': 'Incorrect password'}), 401
         
         # Soft delete - mark as inactive
+        from utils.session_keys import get_session_key_store
+        get_session_key_store().drop_user(user_id)
         db = get_db()
         db.users.update_one(
             {'_id': ObjectId(user_id)},
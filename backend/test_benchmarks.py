@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Tests for the benchmark suite's result recording and baseline comparison"""
+import os
+import json
+import tempfile
+os.environ.setdefault('CRYPTO_EXECUTOR', 'sync')
+
+from benchmarks import bench_encryption
+from benchmarks.common import BenchmarkResults, compare_to_baseline, format_size, parse_size
+
+RUN_ARGS = ['--quick', '--levels', 'basic,modern', '--sizes', '1KB', '--repeat', '1']
+
+
+def test_sizes_parse_and_format():
+    assert parse_size('64KB') == 64 * 1024
+    assert parse_size(' 1.5mb ') == 1536 * 1024
+    assert parse_size('100') == 100
+    assert [format_size(size) for size in (1024, 10 * 1024 * 1024, 1000)] == ['1KB', '10MB', '1000B']
+
+
+def test_compare_to_baseline_flags_only_regressions():
+    results = BenchmarkResults('test')
+    results.record('latency', 1.3, 'ms')
+    results.record('throughput', 70, 'MB/s', better='higher')
+    results.record('new_metric', 5, 'ms')
+    baseline = {'metrics': {
+        'latency': {'value': 1.0, 'unit': 'ms', 'better': 'lower'},
+        'throughput': {'value': 100, 'unit': 'MB/s', 'better': 'higher'},
+        'removed_metric': {'value': 1.0, 'unit': 'ms', 'better': 'lower'}
+    }}
+    regressions = compare_to_baseline(results.metrics, baseline, tolerance=0.25)
+    assert [metric for metric, _, _, _ in regressions] == ['latency', 'throughput']
+    assert compare_to_baseline(results.metrics, baseline, tolerance=0.5) == []
+
+
+def test_encryption_benchmark_saves_and_checks_baseline():
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = os.path.join(directory, 'encryption.json')
+        output = os.path.join(directory, 'results.json')
+        # Without a baseline the run only reports
+        assert bench_encryption.main(RUN_ARGS + ['--baseline', baseline, '--output', output]) == 0
+        with open(output) as f:
+            metrics = json.load(f)['metrics']
+        for level in ('basic', 'modern'):
+            for metric in ('keygen', 'wrap', 'unwrap', 'encrypt_throughput.1KB', 'peak_memory.1KB'):
+                assert f'{level}.{metric}' in metrics
+
+        assert bench_encryption.main(RUN_ARGS + ['--baseline', baseline, '--save-baseline']) == 0
+        assert os.path.exists(baseline)
+
+        # A baseline no host can reach makes the run fail
+        with open(baseline) as f:
+            saved = json.load(f)
+        saved['metrics']['basic.encrypt_throughput.1KB']['value'] *= 1000
+        with open(baseline, 'w') as f:
+            json.dump(saved, f)
+        assert bench_encryption.main(RUN_ARGS + ['--baseline', baseline]) == 1
+
+
+if __name__ == '__main__':
+    test_sizes_parse_and_format()
+    test_compare_to_baseline_flags_only_regressions()
+    test_encryption_benchmark_saves_and_checks_baseline()
+    print("✅ Benchmark suite tests passed")
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Tests for the content blueprint against an in-memory MongoDB"""
+import io
+import os
+import mongomock
+import mongomock.gridfs
+from bson import ObjectId
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+os.environ.setdefault('CRYPTO_EXECUTOR', 'sync')
+mongomock.gridfs.enable_gridfs_integration()
+
+from models.content import Content
+from utils import crypto_executor, metrics
+from utils.crypto_executor import CryptoExecutor
+from routes.content import content_bp
+from utils.encryption import EncryptionManager
+
+FILE_BYTES = bytes(range(256)) * 1200  # several GridFS chunks
+
+
+def _app():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'j' * 32
+    JWTManager(app)
+    app.register_blueprint(content_bp, url_prefix='/api/content')
+    app.db = mongomock.MongoClient().db
+    app.socketio = _FakeSocketIO()
+    return app
+
+
+class _FakeSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def _user(app, username):
+    private_key, public_key = EncryptionManager.generate_keypair(2048)
+    user_id = app.db.users.insert_one({
+        'username': username, 'public_key': public_key, 'is_active': True, 'settings': {}
+    }).inserted_id
+    return str(user_id), private_key
+
+
+def _headers(app, user_id):
+    with app.app_context():
+        return {'Authorization': 'Bearer ' + create_access_token(identity=user_id)}
+
+
+def _stored_file(app, receiver_id):
+    content_model = Content(app.db)
+    file_id, _, _ = content_model.put_file_stream(
+        (FILE_BYTES[i:i + 65536] for i in range(0, len(FILE_BYTES), 65536)),
+        'report.bin', 'application/octet-stream', {}
+    )
+    return str(content_model.collection.insert_one({
+        'sender_id': ObjectId(), 'receiver_id': ObjectId(receiver_id), 'file_id': file_id,
+        'metadata': {'type': 'file', 'filename': 'report.bin', 'content_type': 'application/octet-stream'}
+    }).inserted_id)
+
+
+def _download(client, content_id, headers, **extra):
+    return client.get(f'/api/content/download/{content_id}', headers={**headers, **extra})
+
+
+def test_download_full_file():
+    app = _app()
+    user_id = str(ObjectId())
+    headers = _headers(app, user_id)
+    content_id = _stored_file(app, user_id)
+    response = _download(app.test_client(), content_id, headers)
+    assert response.status_code == 200
+    assert response.data == FILE_BYTES
+    assert response.content_length == len(FILE_BYTES)
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'attachment' in response.headers['Content-Disposition']
+    assert response.headers['ETag'] and 'private' in response.headers['Cache-Control']
+    assert _download(app.test_client(), content_id, _headers(app, str(ObjectId()))).status_code == 403
+
+
+def test_download_range_returns_partial_content():
+    app = _app()
+    user_id = str(ObjectId())
+    headers = _headers(app, user_id)
+    content_id = _stored_file(app, user_id)
+    client = app.test_client()
+    start, end = 300000, 300099  # inside the second GridFS chunk
+    response = _download(client, content_id, headers, Range=f'bytes={start}-{end}')
+    assert response.status_code == 206
+    assert response.data == FILE_BYTES[start:end + 1]
+    assert response.headers['Content-Range'] == f'bytes {start}-{end}/{len(FILE_BYTES)}'
+    assert response.content_length == end - start + 1
+
+    response = _download(client, content_id, headers, Range='bytes=-10')
+    assert response.status_code == 206 and response.data == FILE_BYTES[-10:]
+
+    # A stale If-Range falls back to the whole file
+    response = _download(client, content_id, headers, Range='bytes=0-9', **{'If-Range': '"stale"'})
+    assert response.status_code == 200 and response.data == FILE_BYTES
+
+
+def test_download_not_modified_and_unsatisfiable_range():
+    app = _app()
+    user_id = str(ObjectId())
+    headers = _headers(app, user_id)
+    content_id = _stored_file(app, user_id)
+    client = app.test_client()
+    etag = _download(client, content_id, headers).headers['ETag']
+
+    response = _download(client, content_id, headers, **{'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b''
+    assert response.headers['ETag'] == etag
+
+    response = _download(client, content_id, headers, Range=f'bytes={len(FILE_BYTES)}-')
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(FILE_BYTES)}'
+
+
+def _read_share(app, content_id, private_key):
+    content_model = Content(app.db)
+    content = content_model.collection.find_one({'_id': ObjectId(content_id)})
+    aes_key = EncryptionManager.unwrap_aes_key(content['encrypted_key'], private_key)
+    return EncryptionManager.decrypt_data(content_model.read_payload(content), aes_key, return_bytes=True,
+                                          compression=content['metadata'].get('compression'))
+
+
+def test_share_multi_streams_one_blob_for_all_receivers():
+    app = _app()
+    sender_id, _ = _user(app, 'sender')
+    receivers = [_user(app, f'receiver{i}') for i in range(2)]
+    client = app.test_client()
+    headers = _headers(app, sender_id)
+
+    def share(filename, data=FILE_BYTES):
+        return client.post('/api/content/share/multi', headers=headers, data={
+            'file': (io.BytesIO(data), filename),
+            'receiver_ids': ','.join(receiver_id for receiver_id, _ in receivers)
+        }, content_type='multipart/form-data')
+
+    # Uploads go through the same validation as other file uploads
+    assert share('payload.exe').status_code == 400
+    assert share('noextension').status_code == 400
+
+    response = share('report.pdf')
+    assert response.status_code == 201, response.json
+    shares = response.json['shares']
+    docs = list(app.db.shared_content.find({'group_id': ObjectId(response.json['group_id'])}))
+    # One document per receiver, each with its own wrapped key, all on one blob
+    assert len(docs) == 2 and len({doc['encrypted_key'] for doc in docs}) == 2
+    assert len({doc['file_id'] for doc in docs}) == 1 and app.db.fs.files.count_documents({}) == 1
+    # Written by put_file_stream (hashed on the way through), not buffered
+    assert app.db.fs.files.find_one()['metadata']['sha256']
+    assert docs[0]['metadata']['size'] == len(FILE_BYTES)
+    for share_info, (receiver_id, private_key) in zip(shares, receivers):
+        assert share_info['receiver_id'] == receiver_id
+        assert _read_share(app, share_info['content_id'], private_key) == FILE_BYTES
+
+
+def _pool_stats():
+    snapshot = metrics.snapshot()
+    windows = snapshot['histograms'].get('crypto_pool.seconds.encrypt_segments', {}).get('count', 0)
+    return snapshot['counters'].get('crypto_pool.calls', 0), windows
+
+
+def test_share_file_encrypts_large_upload_on_crypto_pool():
+    app = _app()
+    sender_id, _ = _user(app, 'sender')
+    receiver_id, private_key = _user(app, 'receiver')
+    data = os.urandom(3 * 1024 * 1024)  # more than one window of a two-worker pool
+    saved, crypto_executor._executor = crypto_executor._executor, CryptoExecutor(size=2)
+    try:
+        calls, windows = _pool_stats()
+        response = app.test_client().post('/api/content/share/file', headers=_headers(app, sender_id), data={
+            'file': (io.BytesIO(data), 'large.pdf'), 'receiver_id': receiver_id
+        }, content_type='multipart/form-data')
+        assert response.status_code == 201, response.json
+        after_calls, after_windows = _pool_stats()
+        # Two windows, the first split over both workers
+        assert after_windows - windows == 2
+        assert after_calls - calls >= 3
+    finally:
+        crypto_executor._executor.shutdown()
+        crypto_executor._executor = saved
+    assert _read_share(app, response.json['content_id'], private_key) == data
+
+
+def test_keyed_qr_image_is_cached_privately_and_revalidated():
+    app = _app()
+    sender_id, _ = _user(app, 'sender')
+    client = app.test_client()
+    # A public share's QR carries the raw AES key
+    response = client.post('/api/content/share/text', headers=_headers(app, sender_id),
+                           json={'text': 'hello', 'encryption_level': 'standard'})
+    assert response.status_code == 201, response.json
+    qr_url = response.json['qr_url']
+
+    response = client.get(qr_url)
+    assert response.status_code == 200 and response.mimetype == 'image/png'
+    cache_control = response.headers['Cache-Control']
+    assert 'private' in cache_control and 'must-revalidate' in cache_control
+    assert 'public' not in cache_control and 'immutable' not in cache_control
+    assert response.cache_control.max_age <= 3600
+
+    etag = response.headers['ETag']
+    assert client.get(qr_url, headers={'If-None-Match': etag}).status_code == 304
+    # Revalidation fails once the share is gone
+    app.db.shared_content.delete_one({'_id': ObjectId(qr_url.split('/')[-2])})
+    assert client.get(qr_url, headers={'If-None-Match': etag}).status_code == 404
+
+
+def test_delete_content_keeps_shared_blob_until_last_reference():
+    app = _app()
+    content_model = Content(app.db)
+    receiver_ids = [str(ObjectId()) for _ in range(2)]
+    for blob_type in ('file', 'text'):
+        metadata = {'type': blob_type, 'filename': 'a.txt', 'content_type': 'text/plain'}
+        _, content_ids = content_model.share_content_multi(
+            str(ObjectId()), {receiver_id: 'wrapped-' + receiver_id for receiver_id in receiver_ids},
+            b'ciphertext', metadata
+        )
+        field = 'file_id' if blob_type == 'file' else 'payload_id'
+        blob_id = content_model.collection.find_one({'_id': ObjectId(content_ids[receiver_ids[0]])})[field]
+
+        assert content_model.delete_content(content_ids[receiver_ids[0]])
+        assert content_model.fs.exists(blob_id)
+        remaining = content_model.collection.find_one({'_id': ObjectId(content_ids[receiver_ids[1]])})
+        assert content_model.read_payload(remaining) == b'ciphertext'
+
+        assert content_model.delete_content(content_ids[receiver_ids[1]])
+        assert not content_model.fs.exists(blob_id)
+
+
+def test_migrate_legacy_blobs_repoints_and_delays_delete():
+    app = _app()
+    content_model = Content(app.db)
+    key = EncryptionManager.generate_aes_key(32)
+    legacy = EncryptionManager.encrypt_data(b'legacy payload', key)
+    receiver_ids = [str(ObjectId()) for _ in range(2)]
+    old_ids = {}
+    for blob_type in ('file', 'text'):
+        metadata = {'type': blob_type, 'filename': 'a.txt', 'content_type': 'text/plain'}
+        _, content_ids = content_model.share_content_multi(
+            str(ObjectId()), {receiver_id: 'wrapped-' + receiver_id for receiver_id in receiver_ids},
+            legacy, metadata
+        )
+        old_ids[blob_type] = content_ids
+
+    assert content_model.migrate_legacy_blobs(pause=0, grace=60) == 2
+    for blob_type, content_ids in old_ids.items():
+        field = 'file_id' if blob_type == 'file' else 'payload_id'
+        docs = [content_model.collection.find_one({'_id': ObjectId(content_id)}) for content_id in content_ids.values()]
+        # Both receivers now read the binary envelope through the same field
+        assert len({doc[field] for doc in docs}) == 1
+        for doc in docs:
+            payload = content_model.read_payload(doc)
+            assert EncryptionManager.is_envelope(payload)
+            assert EncryptionManager.decrypt_data(payload, key, return_bytes=True) == b'legacy payload'
+    # Old files are kept for the grace period, then deleted
+    superseded = list(content_model.files.find({'metadata.superseded_by': {'$exists': True}}))
+    assert len(superseded) == 2
+    assert content_model.purge_superseded_blobs(grace=60) == 0
+    assert content_model.purge_superseded_blobs(grace=0) == 2
+    assert not any(content_model.fs.exists(file_doc['_id']) for file_doc in superseded)
+    assert content_model.files.count_documents({}) == 2
+
+
+def test_purge_keeps_superseded_blob_that_is_still_referenced():
+    app = _app()
+    content_model = Content(app.db)
+    legacy = EncryptionManager.encrypt_data(b'legacy payload', EncryptionManager.generate_aes_key(32))
+    content_id, content = content_model.share_content(
+        str(ObjectId()), str(ObjectId()), legacy,
+        {'type': 'file', 'filename': 'a.txt', 'content_type': 'text/plain'}, 'wrapped'
+    )
+    assert content_model.migrate_legacy_blobs(pause=0, grace=60) == 1
+    # A document written against the old blob during the migration
+    content_model.collection.insert_one({'file_id': content['file_id']})
+    assert content_model.purge_superseded_blobs(grace=0) == 0
+    assert content_model.fs.exists(content['file_id'])
+
+
+if __name__ == '__main__':
+    test_download_full_file()
+    test_download_range_returns_partial_content()
+    test_download_not_modified_and_unsatisfiable_range()
+    test_share_multi_streams_one_blob_for_all_receivers()
+    test_share_file_encrypts_large_upload_on_crypto_pool()
+    test_keyed_qr_image_is_cached_privately_and_revalidated()
+    test_delete_content_keeps_shared_blob_until_last_reference()
+    test_migrate_legacy_blobs_repoints_and_delays_delete()
+    test_purge_keeps_superseded_blob_that_is_still_referenced()
+    print("✅ Content route tests passed")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Tests for the crypto worker pool"""
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from utils import crypto_executor, metrics
+from utils.crypto_executor import CryptoExecutor, run_crypto
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _counter(name):
+    return metrics.snapshot()['counters'].get(name, 0)
+
+
+def _raises(exception_type, fn, *args):
+    try:
+        fn(*args)
+    except exception_type as e:
+        return e
+    raise AssertionError(f"{fn} did not raise {exception_type.__name__}")
+
+
+def _unavailable_spawn():
+    raise OSError("cannot start worker")
+
+
+def test_results_and_exceptions_propagate():
+    executor = CryptoExecutor(size=2)
+    try:
+        assert executor.run(pow, 2, 10) == 1024
+        assert executor.run(int, '12', base=16) == 18
+        error = _raises(ValueError, executor.run, int, 'not a number')
+        assert 'not a number' in str(error)
+        assert executor.map(pow, [(2, i) for i in range(6)]) == [2 ** i for i in range(6)]
+        _raises(ValueError, executor.map, int, [('1',), ('x',), ('3',)])
+        # The pool is still usable after a failed call
+        assert executor.run(pow, 3, 3) == 27
+    finally:
+        executor.shutdown()
+
+
+def test_crashed_worker_is_respawned():
+    executor = CryptoExecutor(size=1)
+    try:
+        pid = executor.run(os.getpid)
+        restarts = _counter('crypto_pool.worker_restarts')
+        _raises(RuntimeError, executor.run, os._exit, 1)
+        assert _counter('crypto_pool.worker_restarts') == restarts + 1
+        assert executor.run(os.getpid) not in (pid, os.getpid())
+        _raises(RuntimeError, executor.map, os._exit, [(1,)])
+        assert executor.map(pow, [(2, 2), (2, 3)]) == [4, 8]
+    finally:
+        executor.shutdown()
+
+
+def test_falls_back_inline_when_workers_cannot_start():
+    executor = CryptoExecutor(size=2)
+    executor._spawn_worker = _unavailable_spawn
+    assert executor.run(os.getpid) == os.getpid()
+    assert executor.mode == 'sync'
+    assert executor.map(pow, [(2, 5)]) == [32]
+
+    # run_crypto goes through the same fallback
+    saved, crypto_executor._executor = crypto_executor._executor, CryptoExecutor(size=1)
+    try:
+        crypto_executor._executor._spawn_worker = _unavailable_spawn
+        assert run_crypto(os.getpid) == os.getpid()
+    finally:
+        crypto_executor._executor = saved
+
+
+def test_falls_back_inline_when_crashed_worker_cannot_respawn():
+    executor = CryptoExecutor(size=1)
+    try:
+        assert executor.run(pow, 2, 2) == 4
+        executor._spawn_worker = _unavailable_spawn
+        _raises(RuntimeError, executor.run, os._exit, 1)
+        assert executor.run(os.getpid) == os.getpid()
+    finally:
+        executor.shutdown()
+
+
+class _Timeout(BaseException):
+    """Stands in for eventlet.Timeout / GreenletExit interrupting a waiting caller"""
+
+
+@contextmanager
+def _timeout(seconds):
+    def expire(signum, frame):
+        raise _Timeout()
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _call_with_timeout(call, seconds):
+    with _timeout(seconds):
+        call()
+
+
+def test_interrupted_call_does_not_leak_its_reply():
+    executor = CryptoExecutor(size=1)
+    try:
+        executor.run(pow, 2, 1)
+        for call in (lambda: executor.run(time.sleep, 0.5), lambda: executor.map(time.sleep, [(0.5,)])):
+            restarts = _counter('crypto_pool.worker_restarts')
+            _raises(_Timeout, _call_with_timeout, call, 0.1)
+            assert _counter('crypto_pool.worker_restarts') == restarts + 1
+            # The timed-out call's reply (None) must not reach the next caller
+            assert executor.run(pow, 2, 5) == 32
+            assert executor.map(pow, [(3, 2), (3, 3)]) == [9, 27]
+    finally:
+        executor.shutdown()
+
+
+SEND_SCRIPT = '''
+import eventlet
+eventlet.monkey_patch()
+import os, pickle, socket, struct
+from multiprocessing.connection import Connection
+from utils import crypto_executor
+
+parent, child = socket.socketpair()
+# Blocking like the parent end of a worker connection (see _spawn_worker)
+writer = Connection(os.dup(parent.fileno()))
+os.set_blocking(writer.fileno(), True)
+ticks = []
+
+def tick():
+    while True:
+        ticks.append(1)
+        eventlet.sleep(0)
+
+def recv_exact(size):
+    data = bytearray()
+    while len(data) < size:
+        data += child.recv(size - len(data))
+    return bytes(data)
+
+def read():
+    # The reader only starts once other greenlets have run meanwhile
+    while len(ticks) < 100:
+        eventlet.sleep(0)
+    return pickle.loads(recv_exact(struct.unpack('!i', recv_exact(4))[0]))
+
+eventlet.spawn(tick)
+reader = eventlet.spawn(read)
+message = (len, (b'x' * (16 * 1024 * 1024),), {})
+crypto_executor._send(writer, message)
+assert reader.wait() == message
+print('ok')
+'''
+
+
+def test_large_send_yields_to_eventlet_hub():
+    # Monkey patching is process-wide, so this runs in a child interpreter.
+    # A blocking send of more than the socket buffer would never return here.
+    result = subprocess.run([sys.executable, '-c', SEND_SCRIPT],
+                            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == 'ok'
+
+
+if __name__ == '__main__':
+    test_results_and_exceptions_propagate()
+    test_crashed_worker_is_respawned()
+    test_falls_back_inline_when_workers_cannot_start()
+    test_falls_back_inline_when_crashed_worker_cannot_respawn()
+    test_interrupted_call_does_not_leak_its_reply()
+    test_large_send_yields_to_eventlet_hub()
+    print("✅ Crypto executor tests passed")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Tests for the ciphertext formats produced by EncryptionManager"""
+import io
+import os
+from cryptography.exceptions import InvalidTag
+from utils.crypto_executor import CryptoExecutor
+from utils.encryption import EncryptionManager, ENVELOPE_MAGIC, KEY_WRAP_X25519, CIPHER_CHACHA20_POLY1305, ENCRYPTION_LEVELS
+
+SEGMENT = 1024
+
+
+def _encrypt_stream(data, key, **kwargs):
+    return b''.join(EncryptionManager.encrypt_data_stream(data, key, segment_size=SEGMENT, **kwargs))
+
+
+def test_segmented_stream_roundtrip():
+    key = EncryptionManager.generate_aes_key(32)
+    for size in (0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT, 5 * SEGMENT + 17):
+        data = os.urandom(size)
+        envelope = _encrypt_stream(data, key)
+        assert EncryptionManager.is_segmented(envelope)
+        assert b''.join(EncryptionManager.decrypt_data_stream(envelope, key)) == data
+        # File-like sources and chunked iterables behave the same
+        assert b''.join(EncryptionManager.decrypt_data_stream(io.BytesIO(envelope), key)) == data
+        chunks = [envelope[i:i + 333] for i in range(0, len(envelope), 333)]
+        assert b''.join(EncryptionManager.decrypt_data_stream(chunks, key)) == data
+
+
+def test_segmented_stream_is_deterministic_for_fixed_nonce_prefix():
+    key = EncryptionManager.generate_aes_key(16)
+    data = os.urandom(3 * SEGMENT)
+    prefix = os.urandom(8)
+    assert _encrypt_stream(data, key, nonce_prefix=prefix) == _encrypt_stream(io.BytesIO(data), key, nonce_prefix=prefix)
+
+
+def test_parallel_encryption_matches_sequential_stream():
+    key = EncryptionManager.generate_aes_key(32)
+    prefix = os.urandom(8)
+    executor = CryptoExecutor(size=0)
+    for size in (1, SEGMENT, 7 * SEGMENT, 7 * SEGMENT + 5):
+        data = os.urandom(size)
+        sequential = _encrypt_stream(data, key, nonce_prefix=prefix)
+        for jobs in (1, 3, 8):
+            parallel = EncryptionManager.encrypt_data_parallel(
+                data, key, segment_size=SEGMENT, nonce_prefix=prefix, executor=executor, jobs=jobs)
+            assert parallel == sequential
+    # The buffer kept for reuse holds no plaintext or ciphertext afterwards
+    assert executor._buffers
+    for buffer in executor._buffers:
+        assert not any(buffer.map[:buffer.size])
+
+
+def test_pooled_stream_windows_match_sequential_stream():
+    key = EncryptionManager.generate_aes_key(32)
+    prefix = os.urandom(8)
+    executor = CryptoExecutor(size=2)
+    try:
+        for size in (0, 1, SEGMENT, 6 * SEGMENT, 6 * SEGMENT + 1, 7 * SEGMENT + 5):
+            data = os.urandom(size)
+            sequential = _encrypt_stream(data, key, nonce_prefix=prefix)
+            for window in (1, 3, 4):
+                chunks = [data[i:i + 700] for i in range(0, len(data), 700)]
+                pooled = _encrypt_stream(chunks, key, nonce_prefix=prefix, executor=executor, window=window)
+                assert pooled == sequential, (size, window)
+        # An abandoned stream still hands its buffer back wiped
+        stream = EncryptionManager.encrypt_data_stream(os.urandom(8 * SEGMENT), key, segment_size=SEGMENT,
+                                                       executor=executor, window=2)
+        next(stream), next(stream)
+        stream.close()
+        for buffer in executor._buffers:
+            assert not any(buffer.map[:buffer.size])
+    finally:
+        executor.shutdown()
+
+
+def test_segmented_stream_rejects_tampering():
+    key = EncryptionManager.generate_aes_key(24)
+    data = os.urandom(3 * SEGMENT)
+    envelope = _encrypt_stream(data, key)
+    segment = SEGMENT + 16
+    header = envelope[:17]
+    segments = [envelope[17 + i * segment:17 + (i + 1) * segment] for i in range(3)]
+
+    tampered = bytearray(envelope)
+    tampered[40] ^= 1
+    reordered = header + segments[1] + segments[0] + segments[2]
+    truncated = header + segments[0] + segments[1]
+
+    for bad in (bytes(tampered), reordered, truncated):
+        try:
+            b''.join(EncryptionManager.decrypt_data_stream(bad, key))
+        except InvalidTag:
+            continue
+        raise AssertionError("Tampered stream decrypted")
+
+
+def test_segmented_stream_rejects_other_data():
+    key = EncryptionManager.generate_aes_key(32)
+    legacy = EncryptionManager.encrypt_data(b'legacy', key).encode()
+    assert not EncryptionManager.is_segmented(legacy)
+    assert not EncryptionManager.is_segmented(ENVELOPE_MAGIC)
+    try:
+        list(EncryptionManager.decrypt_data_stream(legacy, key))
+    except ValueError:
+        return
+    raise AssertionError("Legacy ciphertext accepted as a segmented stream")
+
+
+def test_binary_envelope_roundtrip_and_legacy_compat():
+    key = EncryptionManager.generate_aes_key(32)
+    data = os.urandom(4096)
+    envelope = EncryptionManager.encrypt_data(data, key, binary=True)
+    legacy = EncryptionManager.encrypt_data(data, key)
+    assert envelope.startswith(ENVELOPE_MAGIC)
+    assert len(envelope) < len(legacy)
+    assert EncryptionManager.decrypt_data(envelope, key, return_bytes=True) == data
+    # Legacy base64 is still readable as str and as bytes read back from GridFS
+    assert EncryptionManager.decrypt_data(legacy, key, return_bytes=True) == data
+    assert EncryptionManager.decrypt_data(legacy.encode(), key, return_bytes=True) == data
+    # Segmented streams are accepted by the one-shot API too
+    assert EncryptionManager.decrypt_data(_encrypt_stream(data, key), key, return_bytes=True) == data
+
+
+def test_legacy_ciphertext_converts_without_key():
+    key = EncryptionManager.generate_aes_key(16)
+    legacy = EncryptionManager.encrypt_data('migrate me', key)
+    envelope = EncryptionManager.to_binary_envelope(legacy.encode())
+    assert EncryptionManager.is_envelope(envelope)
+    assert EncryptionManager.decrypt_data(envelope, key) == 'migrate me'
+
+
+def test_x25519_key_wrap_roundtrip():
+    private_key, public_key = EncryptionManager.generate_ec_keypair()
+    other_private_key, _ = EncryptionManager.generate_ec_keypair()
+    aes_key = EncryptionManager.generate_aes_key(32)
+    wrapped = EncryptionManager.wrap_aes_key(aes_key, public_key, KEY_WRAP_X25519)
+    assert EncryptionManager.unwrap_aes_key(wrapped, private_key, KEY_WRAP_X25519) == aes_key
+    try:
+        EncryptionManager.unwrap_aes_key(wrapped, other_private_key, KEY_WRAP_X25519)
+    except InvalidTag:
+        return
+    raise AssertionError("Wrapped key opened with the wrong private key")
+
+
+def test_chacha20_poly1305_roundtrip_and_negotiation():
+    suite, key_size = EncryptionManager.negotiate_cipher_suite('unknown, chacha20-poly1305', ENCRYPTION_LEVELS['basic'])
+    assert (suite, key_size) == (CIPHER_CHACHA20_POLY1305, 32)
+    assert EncryptionManager.negotiate_cipher_suite(None, ENCRYPTION_LEVELS['basic']) == ('aes-gcm', 16)
+    key = EncryptionManager.generate_aes_key(key_size)
+    data = os.urandom(1000)
+    envelope = EncryptionManager.encrypt_data(data, key, binary=True, cipher_suite=suite)
+    text = EncryptionManager.encrypt_data(data, key, cipher_suite=suite)
+    # Envelopes identify their cipher; base64 text needs the stored suite
+    assert EncryptionManager.decrypt_data(envelope, key, return_bytes=True) == data
+    assert EncryptionManager.decrypt_data(text, key, return_bytes=True, cipher_suite=suite) == data
+    aes_text = EncryptionManager.encrypt_data(data, key)
+    assert EncryptionManager.decrypt_data(aes_text, key, return_bytes=True, cipher_suite=None) == data
+
+
+def test_compression_before_encryption():
+    key = EncryptionManager.generate_aes_key(32)
+    text = 'id,name,amount\n' + ''.join(f'{i},customer-{i % 50},{i * 3}\n' for i in range(5000))
+    payload, codec = EncryptionManager.compress_payload(text)
+    assert codec and len(payload) * 3 < len(text)
+    ciphertext = EncryptionManager.encrypt_data(payload, key)
+    assert EncryptionManager.decrypt_data(ciphertext, key, compression=codec) == text
+    # Incompressible data is left alone
+    noise = os.urandom(64 * 1024)
+    assert EncryptionManager.compress_payload(noise) == (noise, None)
+    assert EncryptionManager.compress_payload(text, enabled=False) == (text, None)
+
+
+def test_streaming_compression_before_segmented_encryption():
+    key = EncryptionManager.generate_aes_key(32)
+    text = ''.join(f'{i},customer-{i % 50},{i * 3}\n' for i in range(20000)).encode()
+    chunks = [text[i:i + 64 * 1024] for i in range(0, len(text), 64 * 1024)]
+    payload, codec = EncryptionManager.compress_payload_stream(chunks)
+    envelope = b''.join(EncryptionManager.encrypt_data_stream(payload, key, segment_size=SEGMENT))
+    assert codec and EncryptionManager.is_segmented(envelope) and len(envelope) * 3 < len(text)
+    assert EncryptionManager.decrypt_data(envelope, key, return_bytes=True, compression=codec) == text
+    noise = [os.urandom(64 * 1024) for _ in range(2)]
+    payload, codec = EncryptionManager.compress_payload_stream(noise)
+    assert codec is None and b''.join(payload) == b''.join(noise)
+
+
+if __name__ == '__main__':
+    test_segmented_stream_roundtrip()
+    test_segmented_stream_is_deterministic_for_fixed_nonce_prefix()
+    test_parallel_encryption_matches_sequential_stream()
+    test_pooled_stream_windows_match_sequential_stream()
+    test_segmented_stream_rejects_tampering()
+    test_segmented_stream_rejects_other_data()
+    test_binary_envelope_roundtrip_and_legacy_compat()
+    test_legacy_ciphertext_converts_without_key()
+    test_x25519_key_wrap_roundtrip()
+    test_chacha20_poly1305_roundtrip_and_negotiation()
+    test_compression_before_encryption()
+    test_streaming_compression_before_segmented_encryption()
+    print("All encryption format tests passed")
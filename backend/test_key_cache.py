@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Tests for the parsed RSA key cache and DER public keys"""
+import os
+import time
+import mongomock
+os.environ.setdefault('CRYPTO_EXECUTOR', 'sync')
+
+from models.user import User
+from utils import encryption
+from utils.encryption import EncryptionManager, KeyCache
+
+PRIVATE_KEY, PUBLIC_KEY = EncryptionManager.generate_keypair(2048)
+
+
+def test_key_cache_evicts_least_recently_used():
+    cache = KeyCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'a' is now the most recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert len(cache) == 2
+
+
+def test_key_cache_expires_entries_after_ttl():
+    cache = KeyCache(max_size=2, ttl=0.05)
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_loaded_keys_come_from_the_cache():
+    encryption._public_key_cache.clear()
+    encryption._private_key_cache.clear()
+    fingerprint = EncryptionManager.public_key_fingerprint(PUBLIC_KEY)
+    der = EncryptionManager.public_key_to_der(PUBLIC_KEY)
+    # The fingerprint is the same for the PEM and DER forms, so both share one entry
+    assert EncryptionManager.public_key_fingerprint(der) == fingerprint
+    public_key = EncryptionManager.load_public_key(PUBLIC_KEY, fingerprint)
+    assert EncryptionManager.load_public_key(der, fingerprint) is public_key
+    assert len(encryption._public_key_cache) == 1
+
+    private_key = EncryptionManager.load_private_key(PRIVATE_KEY, fingerprint)
+    assert EncryptionManager.load_private_key(PRIVATE_KEY, fingerprint) is private_key
+
+    # A key wrapped for the DER form unwraps with the cached private key
+    aes_key = EncryptionManager.generate_aes_key(32)
+    wrapped = EncryptionManager.wrap_aes_key(aes_key, der, fingerprint=fingerprint)
+    assert EncryptionManager.unwrap_aes_key(wrapped, PRIVATE_KEY, fingerprint=fingerprint) == aes_key
+    assert len(encryption._private_key_cache) == 1
+
+
+def test_private_keys_are_reparsed_after_ttl():
+    saved = encryption._private_key_cache
+    encryption._private_key_cache = KeyCache(max_size=4, ttl=0.05)
+    try:
+        private_key = EncryptionManager.load_private_key(PRIVATE_KEY)
+        assert EncryptionManager.load_private_key(PRIVATE_KEY) is private_key
+        time.sleep(0.1)
+        assert EncryptionManager.load_private_key(PRIVATE_KEY) is not private_key
+    finally:
+        encryption._private_key_cache = saved
+
+
+def test_users_get_der_public_keys():
+    users = User(mongomock.MongoClient().db)
+    user_id = users.create_user(email='der@example.com', username='der', password='password123')
+    user = users.collection.find_one()
+    assert str(user['_id']) == user_id
+    assert bytes(user['public_key_der']) == EncryptionManager.public_key_to_der(user['public_key'])
+    assert user['public_key_fingerprint'] == EncryptionManager.public_key_fingerprint(user['public_key'])
+
+    # Older accounts are backfilled on login
+    users.collection.update_one({'_id': user['_id']},
+                                {'$unset': {'public_key_der': '', 'public_key_fingerprint': ''}})
+    assert users.authenticate('der@example.com', 'password123')
+    user = users.collection.find_one()
+    assert bytes(user['public_key_der']) == EncryptionManager.public_key_to_der(user['public_key'])
+    assert user['public_key_fingerprint'] == EncryptionManager.public_key_fingerprint(user['public_key'])
+
+
+if __name__ == '__main__':
+    test_key_cache_evicts_least_recently_used()
+    test_key_cache_expires_entries_after_ttl()
+    test_loaded_keys_come_from_the_cache()
+    test_private_keys_are_reparsed_after_ttl()
+    test_users_get_der_public_keys()
+    print("✅ Key cache tests passed")
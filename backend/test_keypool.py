@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Tests for the RSA keypair pool and its MongoDB reserve"""
+import os
+import mongomock
+os.environ.setdefault('CRYPTO_EXECUTOR', 'sync')
+
+from utils import keypool, metrics
+from utils.encryption import EncryptionManager
+from utils.keypool import KeypairPool, init_keypair_pool
+
+KEY_SIZE = 1024
+
+
+def _pool(collection=None, secret='k' * 32, **kwargs):
+    options = dict(key_size=KEY_SIZE, size=2, low_water=1, reserve=2, refill_interval=0)
+    options.update(kwargs)
+    return KeypairPool(collection, secret=secret, **options)
+
+
+def _is_pair(keypair):
+    private_key, public_key = keypair
+    aes_key = EncryptionManager.generate_aes_key(32)
+    return EncryptionManager.unwrap_aes_key(EncryptionManager.wrap_aes_key(aes_key, public_key), private_key) == aes_key
+
+
+def test_refill_fills_memory_then_reserve():
+    collection = mongomock.MongoClient().db.keypair_pool
+    pool = _pool(collection)
+    while pool._refill_once():
+        pass
+    assert pool.depth == 2
+    assert collection.count_documents({'key_size': KEY_SIZE}) == 2
+    assert pool.reserve_depth() == 2
+
+
+def test_acquire_uses_memory_then_reserve_then_generates():
+    collection = mongomock.MongoClient().db.keypair_pool
+    pool = _pool(collection, size=1, reserve=1)
+    while pool._refill_once():
+        pass
+    before = metrics.snapshot()['counters']
+    sources = []
+    for _ in range(3):
+        assert _is_pair(pool.acquire())
+    after = metrics.snapshot()['counters']
+    for name in ('keypool.hits', 'keypool.reserve_hits', 'keypool.misses'):
+        sources.append(after.get(name, 0) - before.get(name, 0))
+    assert sources == [1, 1, 1]
+    assert collection.count_documents({}) == 0
+    # Dropping below the low-water mark wakes the refill worker
+    assert pool._wakeup.is_set()
+
+
+def test_reserve_private_keys_are_encrypted():
+    collection = mongomock.MongoClient().db.keypair_pool
+    pool = _pool(collection, size=0)
+    pool._refill_once()
+    doc = collection.find_one()
+    assert 'private_key' not in doc
+    assert b'PRIVATE KEY' not in doc['private_key_encrypted']
+    assert _is_pair(pool._take_from_reserve())
+
+    # Entries written under another secret are discarded, not returned
+    pool._refill_once()
+    assert _pool(collection, secret='other' * 8)._take_from_reserve() is None
+    assert collection.count_documents({}) == 0
+
+
+def test_reserve_disabled_without_secret():
+    collection = mongomock.MongoClient().db.keypair_pool
+    pool = _pool(collection, secret=None, size=1)
+    while pool._refill_once():
+        pass
+    assert pool.collection is None and pool.reserve_depth() == 0
+    assert collection.count_documents({}) == 0
+
+
+def test_init_purges_plaintext_reserve_entries():
+    db = mongomock.MongoClient().db
+    db.keypair_pool.insert_one({'key_size': 2048, 'private_key': 'legacy', 'public_key': 'legacy'})
+    os.environ['SECRET_KEY'] = 's' * 32
+    try:
+        init_keypair_pool(db, start=False)
+    finally:
+        os.environ.pop('SECRET_KEY')
+        keypool._pool = None
+    assert db.keypair_pool.count_documents({}) == 0
+
+
+def test_reserve_depth_is_counted_at_most_once_per_interval():
+    collection = mongomock.MongoClient().db.keypair_pool
+    pool = _pool(collection, size=0, reserve=3)
+    calls = []
+    count_documents = collection.count_documents
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return count_documents(*args, **kwargs)
+    collection.count_documents = counting
+
+    while pool._refill_once():
+        pass
+    for _ in range(3):
+        pool.acquire()
+    assert len(calls) == 1
+    # Tracked locally between counts
+    assert pool.reserve_depth() == 0
+    # Reserve written by another worker shows up on the next refresh
+    collection.insert_one({'key_size': KEY_SIZE, 'private_key_encrypted': b'x', 'public_key': 'x'})
+    assert pool.reserve_depth(refresh=True) == 1 and len(calls) == 2
+
+
+if __name__ == '__main__':
+    test_refill_fills_memory_then_reserve()
+    test_acquire_uses_memory_then_reserve_then_generates()
+    test_reserve_private_keys_are_encrypted()
+    test_reserve_disabled_without_secret()
+    test_init_purges_plaintext_reserve_entries()
+    test_reserve_depth_is_counted_at_most_once_per_interval()
+    print("✅ Keypair pool tests passed")
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""Tests for QR code generation"""
+import base64
+import os
+os.environ.setdefault('QR_TOKEN_SECRET', 't' * 32)
+
+from utils.qr_generator import QRGenerator
+from utils.qr_cache import QRCache, DiskStore, cache_key, get_qr_cache
+from utils import qr_generator, qr_payload, qr_policy, qr_raster
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+def test_qr_cache_reuses_rendered_image():
+    cache = get_qr_cache()
+    cache.clear()
+    data = {'content_id': 'abc', 'encrypted_key': 'k' * 40}
+
+    first = QRGenerator.generate_qr_code(data)
+    hits = cache.stats()['hits']
+    assert QRGenerator.generate_qr_code(data) == first
+    assert cache.stats()['hits'] == hits + 1
+    assert base64.b64decode(first).startswith(PNG_MAGIC)
+
+    # Different render options are different entries
+    assert QRGenerator.generate_qr_code(data, size=200) != first
+    assert QRGenerator.generate_qr_code(data, use_cache=False) == first
+
+
+def test_qr_cache_lru_byte_bound_and_disk_persistence(tmp_path):
+    cache = QRCache(max_bytes=10, store=DiskStore(str(tmp_path)))
+    cache.put(cache_key('a'), b'aaaaaa')
+    cache.put(cache_key('b'), b'bbbbbb')
+    assert len(cache) == 1 and cache.stats()['bytes'] == 6
+
+    # Evicted from memory but still found in the persistent store
+    assert cache.get(cache_key('a')) == b'aaaaaa'
+    assert QRCache(store=DiskStore(str(tmp_path))).get(cache_key('b')) == b'bbbbbb'
+    assert QRCache().get(cache_key('c')) is None
+
+
+def test_reference_token_roundtrip_and_signature():
+    ref = QRGenerator.new_token_ref()
+    payload = QRGenerator.encode_reference_token(ref)
+    assert payload.startswith('QRS://T/') and payload == payload.upper()
+    assert QRGenerator.decode_reference_token(payload) == ref
+    assert QRGenerator.decode_reference_token(payload.lower()) == ref
+    assert QRGenerator.decode_reference_token('qrs://v?d=e30=') is None
+
+    forged = QRGenerator.encode_reference_token(QRGenerator.new_token_ref())[:-4] + payload[-4:]
+    for bad in (forged, payload[:-3], 'QRS://T/!!!'):
+        try:
+            QRGenerator.decode_reference_token(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+def test_token_mode_requires_configured_secret():
+    saved = {name: os.environ.pop(name, None) for name in ('QR_TOKEN_SECRET', 'SECRET_KEY', 'QR_PAYLOAD_MODE')}
+    cached, qr_generator._token_secret = qr_generator._token_secret, None
+    try:
+        assert qr_generator.default_qr_mode() == qr_generator.QR_MODE_EMBEDDED
+        os.environ['QR_PAYLOAD_MODE'] = 'token'
+        assert not qr_generator.token_mode_available()
+        assert qr_generator.default_qr_mode() == qr_generator.QR_MODE_EMBEDDED
+        try:
+            QRGenerator.encode_reference_token(QRGenerator.new_token_ref())
+            assert False, "token signed without a secret"
+        except ValueError:
+            pass
+        os.environ['SECRET_KEY'] = 's' * 32
+        assert qr_generator.default_qr_mode() == qr_generator.QR_MODE_TOKEN
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+        qr_generator._token_secret = cached
+
+
+def test_binary_payload_roundtrip_and_legacy_formats():
+    payload = {
+        'content_id': '69520d2852639ea2d076900b',
+        'encrypted_key': base64.b64encode(bytes(range(256))).decode(),
+        'sender_id': '694e4e5a0a07a0f0888af99c',
+        'metadata': {'type': 'file', 'filename': 'a.mp3', 'size': 7960256, 'is_public': True,
+                     'custom': 'not in the key table', 'password_hash': 'scrypt:32768:8:1$salt$abc'}
+    }
+    binary = QRGenerator.encode_secure_data(payload, 'binary')
+    legacy = QRGenerator.encode_secure_data(payload, 'base64')
+    assert binary.startswith(qr_payload.BINARY_PREFIX) and len(binary) < len(legacy)
+    assert all(char in qr_payload.BASE45_ALPHABET for char in binary[len(qr_payload.BINARY_PREFIX):])
+    for encoded in (binary, legacy, legacy.replace('qrs://v?d=', 'hideanythingqr://decode?data=')):
+        assert QRGenerator.decode_secure_data(encoded) == payload
+
+    for data in (b'', b'\x00', b'\xff\xff', bytes(range(256))):
+        assert qr_payload.base45_decode(qr_payload.base45_encode(data)) == data
+    assert qr_payload.base45_encode(b'AB') == 'BB8'  # RFC 9285 example
+    try:
+        qr_payload.decode(binary[:-5])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_qr_policy_picks_error_correction_per_target():
+    short, long = 'QRS://T/' + 'A' * 29, 'x' * 600
+    assert qr_policy.choose(short, 'screen')['error_correction'] == 'H'
+    assert qr_policy.choose(short, 'email')['error_correction'] == 'Q'
+
+    # Too large for the screen's preferred version: screens go compact, print stays
+    # at the most robust level within its own preferred version (H would need v27)
+    screen, printed = qr_policy.choose(long, 'screen'), qr_policy.choose(long, 'print')
+    assert screen['error_correction'] == 'L' and printed['error_correction'] == 'Q'
+    assert screen['version'] < printed['version']
+    assert screen['modules'] == screen['version'] * 4 + 17
+
+    assert qr_policy.choose(long, 'print', error_correction='m')['error_correction'] == 'M'
+    try:
+        qr_policy.choose(long, 'print', max_version=5)
+        assert False
+    except qr_policy.QRCapacityError:
+        pass
+
+    png, info = QRGenerator.render_qr(long, secure=False, target='email')
+    assert png.startswith(PNG_MAGIC) and info['target'] == 'email'
+    assert qr_policy.validate_options('tv')[0] is False
+    assert qr_policy.validate_options('print', 'q', '12') == (True, None)
+
+
+def test_png_uses_integer_box_size_and_svg_renders():
+    from PIL import Image
+    import io
+    plan = QRGenerator.plan_qr('hello', 200, secure=False)
+    png = QRGenerator.render_plan(plan, use_cache=False)
+    edge = plan['info']['modules'] + 8
+    assert Image.open(io.BytesIO(png)).size == (edge * plan['box_size'],) * 2
+
+    svg_plan = QRGenerator.plan_qr('hello', 200, secure=False, image_format='svg')
+    assert svg_plan['key'] != plan['key']
+    assert QRGenerator.render_plan(svg_plan).startswith(b'<svg')
+    # Same payload and options give the same key (the image ETag)
+    assert QRGenerator.plan_qr('hello', 200, secure=False)['key'] == plan['key']
+
+
+def test_default_png_keeps_ten_pixel_modules():
+    from PIL import Image
+    import io
+    import numpy as np
+    import qrcode
+    data = {'content_id': 'abc', 'encrypted_key': 'k' * 40}
+    png, info = QRGenerator.render_qr(data, use_cache=False)
+    # Same pixels as qrcode's own rendering with the original box_size=10, border=4
+    qr = qrcode.QRCode(version=info['version'], error_correction=qr_policy.EC_LEVELS[info['error_correction']],
+                       box_size=10, border=4)
+    qr.add_data(QRGenerator._payload(data))
+    qr.make(fit=False)
+    expected = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(expected, format='PNG')
+    assert np.array_equal(np.array(Image.open(io.BytesIO(png))), np.array(Image.open(expected)))
+    assert base64.b64decode(QRGenerator.generate_qr_code(data)) == png
+    # An explicit size (the image routes' ?size=) scales modules to whole pixels instead
+    assert QRGenerator.plan_qr(data, 200)['box_size'] < 10
+
+
+def test_numpy_png_renderer_matches_pil_pixels():
+    from PIL import Image
+    import io
+    import numpy as np
+    for version, size in ((1, 64), (7, 400), (23, 1200)):
+        plan = QRGenerator.plan_qr('pixels', size, secure=False, target='print', error_correction='L')
+        plan['info'] = dict(plan['info'], version=version, modules=qr_policy.module_count(version))
+        qr = QRGenerator._make_qr(plan)
+        pil_image, numpy_image = (
+            Image.open(io.BytesIO(QRGenerator._rasterize_png(qr, plan['box_size'], renderer)))
+            for renderer in (qr_raster.RENDERER_PIL, qr_raster.RENDERER_NUMPY)
+        )
+        assert numpy_image.mode == pil_image.mode == '1'
+        assert np.array_equal(np.array(numpy_image), np.array(pil_image))
+
+
+def test_render_plans_streams_in_order_and_uses_cache():
+    import zipfile, io
+    from utils.crypto_executor import CryptoExecutor
+    from utils.streaming import iter_zip
+    cache = get_qr_cache()
+    cache.clear()
+    plans = [QRGenerator.plan_qr(f'batch {i}', 128, secure=False) for i in range(5)]
+    cached = QRGenerator.render_plan(plans[2])
+    results = list(QRGenerator.render_plans(plans, executor=CryptoExecutor(size=0), window=2))
+    assert [plan['key'] for plan, _ in results] == [plan['key'] for plan in plans]
+    assert results[2][1] == cached
+    assert all(cache.get(plan['key']) == image for plan, image in results)
+
+    archive = b''.join(iter_zip((f'{i}.png', image) for i, (_, image) in enumerate(results)))
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert z.namelist() == [f'{i}.png' for i in range(5)]
+        assert z.read('4.png') == results[4][1]
+
+
+def test_qr_reader_preprocessing_downscales_and_binarizes():
+    from PIL import Image
+    import io
+    from utils import qr_reader
+    png = QRGenerator.generate_qr_png('preprocess', size=400, secure=False, use_cache=False)
+    photo = Image.open(io.BytesIO(png)).convert('L').resize((3200, 3200))
+    buffered = io.BytesIO()
+    photo.save(buffered, format='JPEG')
+    image, scale = qr_reader.preprocess(buffered.getvalue(), max_edge=800)
+    assert image.mode == 'L' and max(image.size) == 800 and scale == 0.25
+
+    # Low-contrast grey on grey ends up black and white
+    faded = Image.new('L', (64, 64), 120)
+    faded.paste(140, (0, 0, 32, 64))
+    stages = dict(qr_reader.candidates(faded))
+    assert sorted(set(stages[qr_reader.STAGE_BINARIZED].tobytes())) == [0, 255]
+
+    try:
+        qr_reader.preprocess(b'not an image')
+        assert False, 'expected ValueError'
+    except ValueError:
+        pass
+    assert QRGenerator.is_share_payload(QRGenerator.encode_reference_token(QRGenerator.new_token_ref()))
+    assert not QRGenerator.is_share_payload('https://example.com')
+
+
+def test_qr_sheet_pdf_streams_pages_with_valid_xref():
+    import re
+    import zipfile, io
+    from utils import qr_sheet
+    from utils.crypto_executor import CryptoExecutor
+    sheet = qr_sheet.layout('letter', columns=2, rows=2)
+    codes = [(QRGenerator.encode_reference_token(QRGenerator.new_token_ref()), f'Label ({i})') for i in range(5)]
+    chunks = list(qr_sheet.iter_pdf(iter(codes), sheet, executor=CryptoExecutor(size=0)))
+    pdf = b''.join(chunks)
+    # header, 2 pages, trailer
+    assert len(chunks) == 4 and pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n')
+    assert b'/Count 2' in pdf and pdf.count(b'/Subtype /Image') == 5
+
+    xref_offset = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+    entries = pdf[xref_offset:].split(b'\n')[3:]
+    for number, entry in enumerate(entries[:int(re.search(rb'/Size (\d+)', pdf).group(1)) - 1], start=1):
+        offset = int(entry[:10])
+        assert pdf[offset:].startswith(f'{number} 0 obj'.encode())
+
+    archive = b''.join(qr_sheet.iter_png_zip(iter(codes), sheet, dpi=72, executor=CryptoExecutor(size=0)))
+    with zipfile.ZipFile(io.BytesIO(archive)) as z:
+        assert z.namelist() == ['page-001.png', 'page-002.png']
+
+
+def test_prerenderer_renders_scheduled_plans_into_cache():
+    from utils.crypto_executor import CryptoExecutor
+    from utils.qr_prerender import QRPrerenderer
+    cache = get_qr_cache()
+    cache.clear()
+    prerenderer = QRPrerenderer(batch_size=2, executor=CryptoExecutor(size=0))
+    plans = [QRGenerator.plan_qr(f'prerender {i}', 200, secure=False) for i in range(3)]
+    for plan in plans + plans[:1]:
+        prerenderer.schedule(plan)
+    for plan in plans:
+        assert prerenderer.wait(plan['key'], timeout=10)
+        assert not prerenderer.is_pending(plan['key'])
+        assert cache.get(plan['key']) == QRGenerator.render_plan(plan, use_cache=False)
+
+    disabled = QRPrerenderer(enabled=False)
+    disabled.schedule(QRGenerator.plan_qr('not rendered', 200, secure=False))
+    assert disabled._worker is None and not disabled._queue
+
+
+def test_qr_telemetry_records_bucketed_histograms_per_source():
+    from utils import metrics
+    from utils.crypto_executor import CryptoExecutor
+    metrics.reset()
+    plan = QRGenerator.plan_qr('telemetry', 200, secure=False, source='share')
+    QRGenerator.render_plan(plan, use_cache=False)
+    plans = [QRGenerator.plan_qr(f'telemetry {i}', 200, secure=False, source='regenerate') for i in range(3)]
+    list(QRGenerator.render_plans(plans, use_cache=False, executor=CryptoExecutor(size=0)))
+    QRGenerator.plan_qr('untracked', 200, secure=False)
+
+    histograms = metrics.snapshot()['histograms']
+    version = histograms['qr.version.share']
+    bound = next(b for b in qr_generator.VERSION_BUCKETS if b >= plan['info']['version'])
+    assert [bucket['le'] for bucket in version['buckets']] == list(qr_generator.VERSION_BUCKETS) + ['inf']
+    assert {bucket['le']: bucket['count'] for bucket in version['buckets']}[bound] == 1
+    assert sum(bucket['count'] for bucket in version['buckets']) == 1
+    assert histograms['qr.modules.share']['max'] == plan['info']['modules']
+    assert histograms['qr.render_seconds.regenerate']['count'] == 3
+    assert histograms['qr.png_bytes.regenerate']['count'] == 3
+    assert not any(name.endswith('.None') for name in histograms)
+
+
+if __name__ == '__main__':
+    import tempfile, pathlib
+    test_qr_cache_reuses_rendered_image()
+    test_qr_cache_lru_byte_bound_and_disk_persistence(pathlib.Path(tempfile.mkdtemp()))
+    test_reference_token_roundtrip_and_signature()
+    test_token_mode_requires_configured_secret()
+    test_binary_payload_roundtrip_and_legacy_formats()
+    test_qr_policy_picks_error_correction_per_target()
+    test_png_uses_integer_box_size_and_svg_renders()
+    test_default_png_keeps_ten_pixel_modules()
+    test_numpy_png_renderer_matches_pil_pixels()
+    test_render_plans_streams_in_order_and_uses_cache()
+    test_qr_reader_preprocessing_downscales_and_binarizes()
+    test_qr_sheet_pdf_streams_pages_with_valid_xref()
+    test_prerenderer_renders_scheduled_plans_into_cache()
+    test_qr_telemetry_records_bucketed_histograms_per_source()
+    print("✅ QR generator tests passed")
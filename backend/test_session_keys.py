@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Tests for the session key store"""
+import os
+import time
+os.environ.setdefault('CRYPTO_EXECUTOR', 'sync')
+os.environ.setdefault('QR_TOKEN_SECRET', 't' * 32)
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token, create_refresh_token, decode_token, get_jti
+from utils.crypto_executor import CryptoExecutor
+from utils.encryption import EncryptionManager, KEY_WRAP_X25519, unwrap_aes_key
+from utils.session_keys import SessionKeys, SessionKeyStore, REDIS_KEY_PREFIX, session_id_from_claims
+
+_rsa_private, _rsa_public = EncryptionManager.generate_keypair(2048)
+_ec_private, _ec_public = EncryptionManager.generate_ec_keypair()
+
+
+class FakeRedis:
+    """The few redis.Redis calls the store makes, with TTLs"""
+
+    def __init__(self):
+        self.data = {}
+
+    def setex(self, key, ttl, value):
+        self.data[key] = (value, time.monotonic() + ttl)
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            self.data.pop(key, None)
+            return None
+        return entry[0]
+
+    def ttl(self, key):
+        return int(self.data[key][1] - time.monotonic()) if key in self.data else -2
+
+    def expire(self, key, ttl):
+        if key in self.data:
+            self.data[key] = (self.data[key][0], time.monotonic() + ttl)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def _keys(user_id='user-1'):
+    return SessionKeys.from_serialized(user_id, _rsa_private, _ec_private)
+
+
+def test_memory_store_put_get_drop_and_owner_check():
+    store = SessionKeyStore(ttl=60)
+    store.put('jti-1', _keys())
+    keys = store.get('jti-1', 'user-1')
+    assert keys.rsa == _rsa_private and keys.x25519 == _ec_private and keys.rsa_fingerprint
+    # A session id presented by another user never yields the keys
+    assert store.get('jti-1', 'user-2') is None
+    assert store.get('unknown', 'user-1') is None
+    store.put('jti-2', _keys())
+    store.drop('jti-1')
+    assert store.get('jti-1', 'user-1') is None
+    store.drop_user('user-1')
+    assert len(store) == 0
+
+
+def test_entries_expire_after_ttl_unless_touched():
+    store = SessionKeyStore(ttl=0.2)
+    store.put('expiring', _keys())
+    store.put('refreshed', _keys())
+    time.sleep(0.12)
+    store.touch('refreshed')
+    time.sleep(0.12)
+    assert store.get('expiring', 'user-1') is None
+    assert store.get('refreshed', 'user-1') is not None
+
+
+def test_redis_store_encrypts_entries_and_survives_restart():
+    redis_client = FakeRedis()
+    store = SessionKeyStore(ttl=60, redis_client=redis_client, secret='s' * 32)
+    store.put('jti-1', _keys())
+    stored = redis_client.data[REDIS_KEY_PREFIX + 'jti-1'][0]
+    # Fernet-encrypted: no key material in clear text
+    assert b'PRIVATE KEY' not in stored and _ec_private.encode() not in stored
+
+    restarted = SessionKeyStore(ttl=60, redis_client=redis_client, secret='s' * 32)
+    keys = restarted.get('jti-1', 'user-1')
+    assert keys.rsa == _rsa_private and keys.x25519 == _ec_private
+    assert SessionKeyStore(ttl=60, redis_client=redis_client, secret='other' * 8).get('jti-1', 'user-1') is None
+
+    restarted.drop('jti-1')
+    assert REDIS_KEY_PREFIX + 'jti-1' not in redis_client.data
+    try:
+        SessionKeyStore(redis_client=redis_client)
+    except ValueError:
+        return
+    raise AssertionError("Redis store accepted no secret")
+
+
+def test_session_id_is_login_jti_and_survives_refresh():
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'j' * 32
+    JWTManager(app)
+    with app.app_context():
+        access_token = create_access_token(identity='user-1')
+        session_id = get_jti(access_token)
+        refresh_token = create_refresh_token(identity='user-1', additional_claims={'skid': session_id})
+        assert session_id_from_claims(decode_token(access_token)) == session_id
+        assert session_id_from_claims(decode_token(refresh_token)) == session_id
+        # /refresh hands the refresh token's skid on to the new access token
+        refreshed = create_access_token(identity='user-1', additional_claims={
+            'skid': session_id_from_claims(decode_token(refresh_token))})
+        assert session_id_from_claims(decode_token(refreshed)) == session_id
+        assert get_jti(refreshed) != session_id
+
+
+def test_session_keys_unwrap_on_worker_pool():
+    keys = _keys()
+    executor = CryptoExecutor(size=1)
+    try:
+        aes_key = EncryptionManager.generate_aes_key(32)
+        wrapped = EncryptionManager.wrap_aes_key(aes_key, _rsa_public)
+        for _ in range(2):
+            assert executor.run(unwrap_aes_key, wrapped, keys.rsa, 'rsa-oaep', keys.rsa_fingerprint) == aes_key
+        wrapped = EncryptionManager.wrap_aes_key(aes_key, _ec_public, KEY_WRAP_X25519)
+        assert executor.run(unwrap_aes_key, wrapped, keys.x25519, KEY_WRAP_X25519) == aes_key
+    finally:
+        executor.shutdown()
+    # Redis round trip keeps the serialized keys and the fingerprint
+    restored = SessionKeys.from_json(keys.to_json())
+    assert (restored.rsa, restored.x25519, restored.rsa_fingerprint) == (keys.rsa, keys.x25519, keys.rsa_fingerprint)
+
+
+def _auth_app():
+    import mongomock
+    import mongomock.gridfs
+    from routes.auth import auth_bp
+    from routes.content import content_bp
+    from routes.profile import profile_bp
+    mongomock.gridfs.enable_gridfs_integration()
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'j' * 32
+    JWTManager(app)
+    for blueprint, prefix in ((auth_bp, '/api/auth'), (profile_bp, '/api/profile'), (content_bp, '/api/content')):
+        app.register_blueprint(blueprint, url_prefix=prefix)
+    app.db = mongomock.MongoClient().db
+    app.socketio = type('FakeSocketIO', (), {'emit': lambda self, *args, **kwargs: None})()
+    return app
+
+
+def test_password_change_keeps_received_content_readable():
+    from utils.qr_generator import QRGenerator
+    app = _auth_app()
+    client = app.test_client()
+
+    def login(name, password):
+        response = client.post('/api/auth/login', json={'email': f'{name}@example.com', 'password': password})
+        assert response.status_code == 200, response.json
+        return response.json['user_id'], {'Authorization': 'Bearer ' + response.json['access_token']}
+
+    for name in ('alice', 'bob'):
+        response = client.post('/api/auth/register', json={
+            'email': f'{name}@example.com', 'username': name, 'password': 'Passw0rd!old'})
+        assert response.status_code == 201, response.json
+    _, alice = login('alice', 'Passw0rd!old')
+    bob_id, bob = login('bob', 'Passw0rd!old')
+    for encryption_level in ('standard', 'modern'):
+        response = client.post('/api/content/share/text', headers=alice, json={
+            'text': f'for bob ({encryption_level})', 'receiver_id': bob_id,
+            'encryption_level': encryption_level, 'qr_mode': 'token'})
+        assert response.status_code == 201, response.json
+
+    response = client.put('/api/profile/change-password', headers=bob, json={
+        'current_password': 'Passw0rd!old', 'new_password': 'Passw0rd!new'})
+    assert response.status_code == 200, response.json
+    assert client.post('/api/auth/login', json={
+        'email': 'bob@example.com', 'password': 'Passw0rd!old'}).status_code == 401
+
+    # A new session unlocks the re-encrypted keys and decrypts what bob received
+    _, bob = login('bob', 'Passw0rd!new')
+    contents = list(app.db.shared_content.find())
+    assert {content['metadata'].get('key_wrap', 'rsa-oaep') for content in contents} == {'rsa-oaep', KEY_WRAP_X25519}
+    for content in contents:
+        response = client.post('/api/content/decode', headers=bob, json={
+            'qr_data': QRGenerator.encode_reference_token(content['qr_token'])})
+        assert response.status_code == 200, response.json
+        assert response.json['decrypted_content'] == f"for bob ({content['metadata']['encryption_level']})"
+
+
+if __name__ == '__main__':
+    test_memory_store_put_get_drop_and_owner_check()
+    test_entries_expire_after_ttl_unless_touched()
+    test_redis_store_encrypts_entries_and_survives_restart()
+    test_session_id_is_login_jti_and_survives_refresh()
+    test_session_keys_unwrap_on_worker_pool()
+    test_password_change_keeps_received_content_readable()
+    print("✅ Session key store tests passed")
@@ -0,0 +1,185 @@
+"""
+Compression stage applied before encryption.
+
+Ciphertext does not compress, so text, CSV, JSON and similar payloads are
+compressed before they are encrypted. Whether a payload is worth
+compressing is decided by compressing a few small samples of it first, so
+already-compressed data (images, archives, office documents) costs almost
+nothing. zstd is used when the zstandard package is installed, zlib
+otherwise. The codec is recorded in the content metadata ('compression')
+and decryption reverses it.
+
+Uploads too large to hold in memory go through compress_stream(), which
+samples only the first chunk and compresses chunk by chunk.
+
+Configuration:
+    COMPRESSION: 'auto' (default: zstd if available, else zlib), 'zstd',
+        'zlib' or 'off'
+"""
+import os
+import time
+import zlib
+import itertools
+from utils import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+MIN_COMPRESS_SIZE = 256  # Smaller payloads gain too little to be worth it
+SAMPLE_SIZE = 16 * 1024
+SAMPLE_COUNT = 3
+MAX_SAMPLE_RATIO = 0.9  # Compress only if samples shrink by at least 10%
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def available_codecs():
+    return (CODEC_ZSTD, CODEC_ZLIB) if zstandard is not None else (CODEC_ZLIB,)
+
+
+def default_codec():
+    """Codec configured by COMPRESSION, or None when compression is off"""
+    setting = os.environ.get('COMPRESSION', 'auto').lower()
+    if setting == 'off':
+        return None
+    if setting in available_codecs():
+        return setting
+    if setting != 'auto':
+        print(f"[WARNING] Compression codec '{setting}' unavailable, using {available_codecs()[0]}")
+    return available_codecs()[0]
+
+
+def _compress(data, codec):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    raise ValueError(f"Unsupported compression codec {codec}")
+
+
+def decompress(data, codec):
+    """Reverse compress(); codec None returns data unchanged"""
+    if not codec:
+        return data
+    started = time.perf_counter()
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Content is zstd-compressed but the zstandard package is not installed")
+        # decompressobj also accepts streamed frames, which do not record their content size
+        result = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    elif codec == CODEC_ZLIB:
+        result = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unsupported compression codec {codec}")
+    metrics.observe('compression.decompress_seconds', time.perf_counter() - started)
+    return result
+
+
+def _samples(data):
+    """Up to SAMPLE_COUNT evenly spread slices of data"""
+    if len(data) <= SAMPLE_SIZE * SAMPLE_COUNT:
+        return [data]
+    step = (len(data) - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+    return [data[i * step:i * step + SAMPLE_SIZE] for i in range(SAMPLE_COUNT)]
+
+
+def worth_compressing(data, codec):
+    """Estimate compressibility from samples of data"""
+    if len(data) < MIN_COMPRESS_SIZE:
+        return False
+    started = time.perf_counter()
+    samples = _samples(memoryview(data))
+    sampled = sum(len(sample) for sample in samples)
+    compressed = sum(len(_compress(sample, codec)) for sample in samples)
+    metrics.observe('compression.sample_seconds', time.perf_counter() - started)
+    return compressed / sampled <= MAX_SAMPLE_RATIO
+
+
+def compress(data, codec=None):
+    """Compress data if sampling says it pays off
+
+    Args:
+        data: Plaintext bytes (str is encoded as UTF-8)
+        codec: Codec to use (defaults to default_codec())
+
+    Returns:
+        Tuple of (payload, codec); codec is None when data is returned as is
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    codec = codec or default_codec()
+    if codec is None or not worth_compressing(data, codec):
+        metrics.inc('compression.skipped')
+        return data, None
+
+    started = time.perf_counter()
+    compressed = _compress(data, codec)
+    metrics.observe('compression.seconds', time.perf_counter() - started)
+    if len(compressed) >= len(data):
+        metrics.inc('compression.skipped')
+        return data, None
+
+    metrics.inc(f'compression.payloads.{codec}')
+    metrics.inc('compression.bytes_in', len(data))
+    metrics.inc('compression.bytes_out', len(compressed))
+    metrics.observe('compression.ratio', len(data) / len(compressed))
+    return compressed, codec
+
+
+def _compressor(codec):
+    if codec == CODEC_ZSTD:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    if codec == CODEC_ZLIB:
+        return zlib.compressobj(ZLIB_LEVEL)
+    raise ValueError(f"Unsupported compression codec {codec}")
+
+
+def compress_stream(chunks, codec=None):
+    """Streaming counterpart of compress() for payloads read chunk by chunk
+
+    Compressibility is sampled from the first chunk only, and the output
+    cannot be compared with the input before it is sent on, so a payload
+    that turns out not to shrink is still stored compressed.
+
+    Args:
+        chunks: Iterable of plaintext byte chunks; the first should be at
+            least SAMPLE_SIZE * SAMPLE_COUNT bytes for a representative sample
+        codec: Codec to use (defaults to default_codec())
+
+    Returns:
+        Tuple of (iterator of payload chunks, codec); codec is None when the
+        chunks are passed through unchanged
+    """
+    chunks = iter(chunks)
+    head = next(chunks, b'')
+    codec = codec or default_codec()
+    if codec is None or not worth_compressing(head, codec):
+        metrics.inc('compression.skipped')
+        return itertools.chain([head], chunks), None
+    return _compressed_chunks(head, chunks, codec), codec
+
+
+def _compressed_chunks(head, chunks, codec):
+    compressor = _compressor(codec)
+    bytes_in = bytes_out = 0
+    started = time.perf_counter()
+    for chunk in itertools.chain([head], chunks):
+        bytes_in += len(chunk)
+        out = compressor.compress(chunk)
+        if out:
+            bytes_out += len(out)
+            yield out
+    out = compressor.flush()
+    bytes_out += len(out)
+    yield out
+    metrics.observe('compression.seconds', time.perf_counter() - started)
+    metrics.inc(f'compression.payloads.{codec}')
+    metrics.inc('compression.bytes_in', bytes_in)
+    metrics.inc('compression.bytes_out', bytes_out)
+    if bytes_out:
+        metrics.observe('compression.ratio', bytes_in / bytes_out)
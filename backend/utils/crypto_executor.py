@@ -0,0 +1,492 @@
+"""
+Process-pool offload for CPU-bound crypto.
+
+The app runs a single eventlet worker, so RSA key generation, RSA decrypt,
+bcrypt and PBKDF2 running on the event loop freeze every other request and
+socket. run_crypto() ships such calls to a small pool of worker processes and
+waits for the reply cooperatively: under eventlet the caller parks on the
+worker's pipe through the hub, so other greenlets keep running.
+
+concurrent.futures / multiprocessing.Pool are not used on purpose: their
+internal threads and locks become green threads under monkey patching and
+deadlock, and spawned children re-import the app's __main__. Each worker here
+is a fresh interpreter started with subprocess, serving one call at a time
+over a socketpair.
+
+If worker processes cannot be started (or respawned after a crash), the
+pool falls back to running calls inline rather than failing them.
+
+Large payloads are not pickled through the pipe: callers place them in a
+SharedBuffer (a memory-mapped file, in /dev/shm where available) and pass
+its path and offsets, and workers keep their mapping of it between calls.
+
+Configuration:
+    CRYPTO_POOL_SIZE: Number of worker processes (default 2, 0 = synchronous)
+    CRYPTO_EXECUTOR: 'process' (default) or 'sync' to run calls inline (tests)
+    CRYPTO_SHARED_BUFFER_RETAIN: Largest shared buffer kept for reuse, in bytes
+        (default 128MB; larger ones are released after use)
+"""
+import os
+import sys
+import mmap
+import atexit
+import queue
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from multiprocessing.connection import Connection
+from multiprocessing.reduction import ForkingPickler
+from utils import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_BUFFER_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+SHARED_BUFFER_RETAIN = int(os.environ.get('CRYPTO_SHARED_BUFFER_RETAIN', 128 * 1024 * 1024))
+
+
+class SharedBuffer:
+    """Growable memory-mapped file shared with the worker processes"""
+
+    def __init__(self, size):
+        fd, self.path = tempfile.mkstemp(prefix='crypto-buffer-', dir=SHARED_BUFFER_DIR)
+        self._fd = fd
+        self.size = 0
+        self.map = None
+        self.ensure_size(size)
+
+    def ensure_size(self, size):
+        if size <= self.size:
+            return
+        if self.map is not None:
+            self.map.close()
+        os.ftruncate(self._fd, size)
+        self.map = mmap.mmap(self._fd, size)
+        self.size = size
+
+    def zero(self, length):
+        """Overwrite the first length bytes (plaintext must not outlive a call)"""
+        length = min(length, self.size)
+        block = bytes(min(length, 1024 * 1024))
+        for offset in range(0, length, len(block) or 1):
+            end = min(offset + len(block), length)
+            self.map[offset:end] = block[:end - offset]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        os.close(self._fd)
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+_attached_buffers = OrderedDict()
+
+
+def attach_shared_buffer(path):
+    """Map a SharedBuffer inside a worker, reusing the mapping between calls"""
+    size = os.stat(path).st_size
+    attached = _attached_buffers.get(path)
+    if attached is None or len(attached) != size:
+        if attached is not None:
+            attached.close()
+        with open(path, 'r+b') as f:
+            attached = mmap.mmap(f.fileno(), size)
+        _attached_buffers[path] = attached
+    _attached_buffers.move_to_end(path)
+    # Buffers released by the parent are unlinked; drop their old mappings
+    while len(_attached_buffers) > 4:
+        _attached_buffers.popitem(last=False)[1].close()
+    return attached
+
+
+def _worker_main(conn):
+    """Worker process loop: receive (fn, args, kwargs), send (ok, result)"""
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        fn, args, kwargs = message
+        try:
+            conn.send((True, fn(*args, **kwargs)))
+        except Exception as e:
+            conn.send((False, e))
+
+
+def _worker_entry(fd):
+    """Entry point of a worker interpreter (see CryptoExecutor._spawn_worker)"""
+    os.set_blocking(fd, True)
+    _worker_main(Connection(fd))
+
+
+def _green_trampoline():
+    """eventlet's trampoline when sockets are monkey patched, else None"""
+    if 'eventlet' not in sys.modules:
+        return None
+    try:
+        from eventlet.patcher import is_monkey_patched
+        from eventlet.hubs import trampoline
+    except ImportError:
+        return None
+    return trampoline if is_monkey_patched('socket') else None
+
+
+def _wait_readable(conn):
+    """Yield to the eventlet hub until the worker has replied"""
+    trampoline = _green_trampoline()
+    if trampoline is not None:
+        trampoline(conn.fileno(), read=True)
+
+
+def _send(conn, message):
+    """Connection.send() that yields to the eventlet hub while the socket buffer is full
+
+    The parent's sockets are blocking (see _spawn_worker), so a plain send of
+    a large call would stall every greenlet until the worker had read it.
+    Frames are written exactly as Connection.send_bytes() does.
+    """
+    trampoline = _green_trampoline()
+    if trampoline is None:
+        conn.send(message)
+        return
+    data = ForkingPickler.dumps(message)
+    if len(data) > 0x7fffffff:
+        header = struct.pack('!i', -1) + struct.pack('!Q', len(data))
+    else:
+        header = struct.pack('!i', len(data))
+    fd = conn.fileno()
+    os.set_blocking(fd, False)
+    try:
+        for chunk in (header, data):
+            view = memoryview(chunk)
+            while view:
+                try:
+                    view = view[os.write(fd, view):]
+                except BlockingIOError:
+                    trampoline(fd, write=True)
+    finally:
+        os.set_blocking(fd, True)
+
+
+class CryptoExecutor:
+    def __init__(self, size=2, mode='process'):
+        self.size = size
+        self.mode = 'sync' if size <= 0 else mode
+        self._idle = queue.LifoQueue()
+        self._workers = []
+        self._processes = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._busy = 0
+        self._buffers = []
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            size=int(os.environ.get('CRYPTO_POOL_SIZE', 2)),
+            mode=os.environ.get('CRYPTO_EXECUTOR', 'process')
+        )
+
+    def _spawn_worker(self):
+        parent_sock, child_sock = socket.socketpair()
+        child_fd = child_sock.fileno()
+        process = subprocess.Popen(
+            [sys.executable, '-c',
+             'import sys; from utils.crypto_executor import _worker_entry; _worker_entry(int(sys.argv[1]))',
+             str(child_fd)],
+            pass_fds=(child_fd,),
+            cwd=BACKEND_DIR
+        )
+        child_sock.close()
+        self._workers.append(process)
+        # Green sockets are non-blocking; the hub wait happens in _wait_readable
+        parent_sock.setblocking(True)
+        conn = Connection(parent_sock.detach())
+        self._processes[conn] = process
+        return conn
+
+    def _discard_worker(self, conn):
+        """Close a worker that cannot be reused and stop its process"""
+        process = self._processes.pop(conn, None)
+        try:
+            conn.close()
+        except OSError:
+            pass
+        if process is not None:
+            process.kill()
+            process.wait()
+            self._workers.remove(process)
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            try:
+                for _ in range(self.size):
+                    self._idle.put(self._spawn_worker())
+            except OSError as e:
+                self._fall_back(e)
+            self._started = True
+            metrics.set_gauge('crypto_pool.size', len(self._workers))
+
+    def _fall_back(self, error):
+        """Run calls inline from now on; None in the idle queue wakes any waiting callers"""
+        print(f"[WARNING] Crypto worker pool unavailable ({error}), running crypto calls inline")
+        self.mode = 'sync'
+        metrics.inc('crypto_pool.fallbacks')
+        self._idle.put(None)
+
+    def _replace_worker(self):
+        """A fresh worker for one that died, or None (after falling back) if none can be started"""
+        try:
+            return self._spawn_worker()
+        except OSError as e:
+            self._fall_back(e)
+            return None
+
+    @property
+    def parallelism(self):
+        """Number of calls that can run at the same time"""
+        return 1 if self.mode == 'sync' else self.size
+
+    def _update_gauges(self):
+        metrics.set_gauge('crypto_pool.queue_depth', self._waiting)
+        metrics.set_gauge('crypto_pool.busy', self._busy)
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) in a worker process and return its result
+
+        fn and its arguments must be picklable (module-level functions).
+        Exceptions raised by fn are re-raised in the caller.
+        """
+        name = getattr(fn, '__qualname__', repr(fn))
+        started = time.perf_counter()
+        if self.mode != 'sync':
+            self._ensure_started()
+        if self.mode == 'sync':
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                metrics.observe(f'crypto_pool.seconds.{name}', time.perf_counter() - started)
+
+        self._waiting += 1
+        self._update_gauges()
+        try:
+            conn = self._idle.get()
+        finally:
+            self._waiting -= 1
+        if conn is None:
+            # The pool fell back to inline calls while we waited
+            self._idle.put(None)
+            return self.run(fn, *args, **kwargs)
+        metrics.observe('crypto_pool.wait_seconds', time.perf_counter() - started)
+
+        self._busy += 1
+        self._update_gauges()
+        healthy = True
+        try:
+            _send(conn, (fn, args, kwargs))
+            _wait_readable(conn)
+            ok, result = conn.recv()
+        except BaseException as e:
+            # The worker died, or the caller was interrupted (eventlet.Timeout,
+            # GreenletExit) with the reply unread: a reused connection would
+            # hand that reply to the next caller. Replace the worker.
+            healthy = False
+            metrics.inc('crypto_pool.worker_restarts')
+            if isinstance(e, (EOFError, OSError)):
+                raise RuntimeError(f"Crypto worker failed while running {name}")
+            raise
+        finally:
+            self._busy -= 1
+            if not healthy:
+                self._discard_worker(conn)
+            self._idle.put(conn if healthy else self._replace_worker())
+            self._update_gauges()
+            metrics.inc('crypto_pool.calls')
+            metrics.observe(f'crypto_pool.seconds.{name}', time.perf_counter() - started)
+
+        if not ok:
+            raise result
+        return result
+
+    def map(self, fn, arg_tuples):
+        """Run fn(*args) for every args tuple, spread over the idle workers
+
+        Jobs are handed out in order and results are returned in the same
+        order. At least one worker is used; more are used when idle.
+        """
+        jobs = deque(enumerate(arg_tuples))
+        results = [None] * len(jobs)
+        name = getattr(fn, '__qualname__', repr(fn))
+        started = time.perf_counter()
+        if self.mode != 'sync' and jobs:
+            self._ensure_started()
+        if self.mode == 'sync' or not jobs:
+            for index, args in jobs:
+                results[index] = fn(*args)
+            metrics.observe(f'crypto_pool.seconds.{name}', time.perf_counter() - started)
+            return results
+
+        self._waiting += 1
+        self._update_gauges()
+        try:
+            conns = [self._idle.get()]
+        finally:
+            self._waiting -= 1
+        if conns[0] is None:
+            self._idle.put(None)
+            return self.map(fn, arg_tuples)
+        while len(conns) < len(jobs):
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is None:
+                self._idle.put(None)
+                break
+            conns.append(conn)
+        metrics.observe('crypto_pool.wait_seconds', time.perf_counter() - started)
+
+        self._busy += len(conns)
+        self._update_gauges()
+        in_flight = deque()
+        pending = set()  # connections with a request sent and its reply unread
+        error = None
+
+        def release(conn):
+            self._busy -= 1
+            self._idle.put(conn)
+
+        def dispatch(conn):
+            nonlocal error
+            index, args = jobs.popleft()
+            pending.add(conn)
+            try:
+                _send(conn, (fn, args, {}))
+            except OSError:
+                metrics.inc('crypto_pool.worker_restarts')
+                error = error or RuntimeError(f"Crypto worker failed while running {name}")
+                pending.discard(conn)
+                self._discard_worker(conn)
+                release(self._replace_worker())
+                return
+            in_flight.append((conn, index))
+
+        try:
+            for conn in conns:
+                if jobs and error is None:
+                    dispatch(conn)
+                else:
+                    release(conn)
+            # Collect in dispatch order; every in-flight reply is drained
+            # even after a failure so connections go back to the pool clean
+            while in_flight:
+                conn, index = in_flight.popleft()
+                try:
+                    _wait_readable(conn)
+                    ok, result = conn.recv()
+                except (EOFError, OSError):
+                    metrics.inc('crypto_pool.worker_restarts')
+                    error = error or RuntimeError(f"Crypto worker failed while running {name}")
+                    pending.discard(conn)
+                    self._discard_worker(conn)
+                    conn = self._replace_worker()
+                else:
+                    pending.discard(conn)
+                    if ok:
+                        results[index] = result
+                    else:
+                        error = error or result
+                metrics.inc('crypto_pool.calls')
+                if jobs and error is None:
+                    dispatch(conn)
+                else:
+                    release(conn)
+        except BaseException:
+            # Interrupted (e.g. eventlet.Timeout) with replies outstanding:
+            # those workers would hand stale results to the next caller
+            for conn in pending:
+                metrics.inc('crypto_pool.worker_restarts')
+                self._discard_worker(conn)
+                release(self._replace_worker())
+            raise
+        finally:
+            self._update_gauges()
+            metrics.observe(f'crypto_pool.seconds.{name}', time.perf_counter() - started)
+
+        if error is not None:
+            raise error
+        return results
+
+    @contextmanager
+    def shared_buffer(self, size):
+        """Borrow a SharedBuffer of at least size bytes for passing data to workers"""
+        buffer = self._buffers.pop() if self._buffers else None
+        if buffer is None:
+            buffer = SharedBuffer(size)
+            metrics.inc('crypto_pool.shared_buffers_created')
+        buffer.ensure_size(size)
+        try:
+            yield buffer
+        finally:
+            if buffer.size <= SHARED_BUFFER_RETAIN and len(self._buffers) < max(self.size, 1):
+                # Reused buffers stay in /dev/shm: wipe what this call wrote.
+                # Closed ones are unlinked, which frees their pages.
+                buffer.zero(size)
+                self._buffers.append(buffer)
+            else:
+                buffer.close()
+
+    def shutdown(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is None:
+                continue
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for process in self._workers:
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._workers = []
+        self._processes = {}
+        self._started = False
+        while self._buffers:
+            self._buffers.pop().close()
+
+
+_executor = None
+
+
+def get_crypto_executor():
+    global _executor
+    if _executor is None:
+        _executor = CryptoExecutor.from_env()
+        # Stop workers and remove shared buffer files on interpreter exit
+        atexit.register(_executor.shutdown)
+    return _executor
+
+
+def run_crypto(fn, *args, **kwargs):
+    """Run a CPU-bound crypto call off the event loop"""
+    return get_crypto_executor().run(fn, *args, **kwargs)
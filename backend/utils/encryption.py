@@ -1,11 +1,18 @@
 import os
 import base64
-from cryptography.hazmat.primitives.asymmetric import rsa, padding
+from cryptography.hazmat.primitives.asymmetric import rsa, padding, x25519
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.fernet import Fernet
+from collections import OrderedDict
 import hashlib
+import struct
+import threading
+import time
+from utils import compression as compression_stage
 
 # Encryption levels configuration
 ENCRYPTION_LEVELS = {
@@ -13,28 +20,294 @@ ENCRYPTION_LEVELS = {
         'name': 'Basic (AES-128)',
         'aes_key_size': 16,  # 128-bit
         'rsa_key_size': 2048,
+        'key_wrap': 'rsa-oaep',
+        'cipher': 'aes-gcm',
         'description': 'Fast encryption suitable for non-sensitive data'
     },
     'standard': {
         'name': 'Standard (AES-192)',
         'aes_key_size': 24,  # 192-bit
         'rsa_key_size': 2048,
+        'key_wrap': 'rsa-oaep',
+        'cipher': 'aes-gcm',
         'description': 'Balanced security and performance'
     },
     'high': {
         'name': 'High (AES-256)',
         'aes_key_size': 32,  # 256-bit
         'rsa_key_size': 3072,
+        'key_wrap': 'rsa-oaep',
+        'cipher': 'aes-gcm',
         'description': 'Strong encryption for sensitive data'
     },
     'maximum': {
         'name': 'Maximum (AES-256 + RSA-4096)',
         'aes_key_size': 32,  # 256-bit
         'rsa_key_size': 4096,
+        'key_wrap': 'rsa-oaep',
+        'cipher': 'aes-gcm',
         'description': 'Military-grade encryption for highly confidential data'
+    },
+    'modern': {
+        'name': 'Modern (AES-256 + X25519)',
+        'aes_key_size': 32,  # 256-bit
+        'rsa_key_size': None,
+        'key_wrap': 'x25519',
+        'cipher': 'aes-gcm',
+        'description': 'Elliptic-curve key wrapping: fast to decrypt and keeps QR codes small'
+    },
+    'chacha': {
+        'name': 'High (ChaCha20-Poly1305)',
+        'aes_key_size': 32,  # 256-bit ChaCha20 key
+        'rsa_key_size': 3072,
+        'key_wrap': 'rsa-oaep',
+        'cipher': 'chacha20-poly1305',
+        'description': 'Strong encryption that stays fast on devices without AES hardware'
     }
 }
 
+# Bulk cipher suites
+CIPHER_AES_GCM = 'aes-gcm'
+CIPHER_CHACHA20_POLY1305 = 'chacha20-poly1305'
+CIPHER_SUITES = (CIPHER_AES_GCM, CIPHER_CHACHA20_POLY1305)
+CHACHA_NONCE_SIZE = 12
+
+# Key wrapping schemes
+KEY_WRAP_RSA = 'rsa-oaep'
+KEY_WRAP_X25519 = 'x25519'
+X25519_WRAP_INFO = b'hide-anything-qr/x25519-aes-key-wrap/v1'
+
+# Binary ciphertext envelope
+# Header: magic (4) + version (1) + version-specific fields
+ENVELOPE_MAGIC = b'\x89HQE'  # 0x89 can never start legacy base64 text
+ENVELOPE_SEGMENTED = 1
+ENVELOPE_SINGLE = 2  # nonce (16) + tag (16) + ciphertext, single AES-GCM call
+ENVELOPE_SINGLE_CHACHA = 3  # nonce (12) + ciphertext + tag (16), single ChaCha20-Poly1305 call
+
+# Segmented AES-GCM stream (ENVELOPE_SEGMENTED)
+# Header continues with segment size (4, big-endian) + nonce prefix (8).
+# Each segment is ciphertext + 16-byte tag; its nonce is the prefix followed
+# by the 4-byte segment index, and the header, index and final flag are
+# authenticated as associated data so segments cannot be reordered,
+# dropped or truncated.
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+SEGMENT_HEADER_SIZE = 17
+SEGMENT_NONCE_PREFIX_SIZE = 8
+GCM_TAG_SIZE = 16
+
+# Binary AES-GCM payloads at least this large are encrypted as a segmented
+# stream, with segment batches spread over the crypto worker pool (0 = never)
+PARALLEL_ENCRYPT_THRESHOLD = int(os.environ.get('PARALLEL_ENCRYPT_THRESHOLD', 8 * 1024 * 1024))
+# Segments per worker read ahead into one window when a stream is encrypted on the pool
+STREAM_SEGMENTS_PER_JOB = int(os.environ.get('STREAM_SEGMENTS_PER_JOB', 16))
+
+# Parsed key-object cache configuration
+KEY_CACHE_SIZE = int(os.environ.get('KEY_CACHE_SIZE', 256))
+PRIVATE_KEY_CACHE_TTL = int(os.environ.get('PRIVATE_KEY_CACHE_TTL', 3600))  # seconds
+
+class KeyCache:
+    """Bounded LRU cache of loaded key objects, with optional TTL eviction"""
+    
+    def __init__(self, max_size=256, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, fingerprint):
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                return None
+            key, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[fingerprint]
+                return None
+            self._entries.move_to_end(fingerprint)
+            return key
+    
+    def put(self, fingerprint, key):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[fingerprint] = (key, expires_at)
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+
+_public_key_cache = KeyCache(KEY_CACHE_SIZE)
+_private_key_cache = KeyCache(KEY_CACHE_SIZE, ttl=PRIVATE_KEY_CACHE_TTL)
+
+def _key_bytes(key):
+    """Normalise PEM text / DER bytes to bytes"""
+    return key.encode() if isinstance(key, str) else bytes(key)
+
+def _is_pem(key_bytes):
+    return key_bytes.lstrip().startswith(b'-----BEGIN')
+
+def _fill(source, buf):
+    """Read from source into buf until it is full or the source is exhausted"""
+    view = memoryview(buf)
+    filled = 0
+    readinto = getattr(source, 'readinto', None)
+    while filled < len(buf):
+        if readinto is not None:
+            n = readinto(view[filled:])
+        else:
+            chunk = source.read(len(buf) - filled)
+            n = len(chunk) if chunk else 0
+            view[filled:filled + n] = chunk or b''
+        if not n:
+            break
+        filled += n
+    return filled
+
+class _ChunkReader:
+    """File-like read() adapter over bytes or an iterable of byte chunks"""
+    
+    def __init__(self, source):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = [source]
+        self._chunks = iter(source)
+        self._pending = memoryview(b'')
+    
+    def read(self, size):
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b''
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            self._pending = memoryview(chunk)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+def _iter_blocks(source, size):
+    """Yield (memoryview, is_final) for fixed-size blocks of source
+
+    Two preallocated buffers alternate so the block after the current one is
+    always read ahead; that is how the final block is recognised. Each view is
+    only valid until the generator is resumed.
+    """
+    if not hasattr(source, 'read'):
+        source = _ChunkReader(source)
+    current, ahead = bytearray(size), bytearray(size)
+    n = _fill(source, current)
+    while True:
+        m = _fill(source, ahead) if n == size else 0
+        yield memoryview(current)[:n], m == 0
+        if m == 0:
+            return
+        current, ahead, n = ahead, current, m
+
+def _segment_aad(header, index, is_final):
+    return header + struct.pack('>IB', index, 1 if is_final else 0)
+
+def _segment_nonce(nonce_prefix, index):
+    return nonce_prefix + struct.pack('>I', index)
+
+def _segment_header(segment_size, nonce_prefix):
+    if nonce_prefix is None:
+        nonce_prefix = os.urandom(SEGMENT_NONCE_PREFIX_SIZE)
+    if len(nonce_prefix) != SEGMENT_NONCE_PREFIX_SIZE:
+        raise ValueError("Nonce prefix must be 8 bytes")
+    return ENVELOPE_MAGIC + struct.pack('>BI', ENVELOPE_SEGMENTED, segment_size) + nonce_prefix
+
+def _encrypt_segment_into(algorithm, header, index, block, is_final, out):
+    """Encrypt one stream segment into out; returns the ciphertext + tag length"""
+    encryptor = Cipher(algorithm, modes.GCM(_segment_nonce(header[9:], index)),
+                       backend=default_backend()).encryptor()
+    encryptor.authenticate_additional_data(_segment_aad(header, index, is_final))
+    n = encryptor.update_into(block, out)
+    encryptor.finalize()
+    out[n:n + GCM_TAG_SIZE] = encryptor.tag
+    return n + GCM_TAG_SIZE
+
+def _encrypt_stream_windows(source, aes_key, header, executor, window):
+    """Yield the segments of a stream encrypted window by window on the crypto pool
+
+    Each window of up to `window` segments is read into a SharedBuffer and
+    split into one encrypt_segments job per worker. A one-byte read-ahead
+    after a full window tells whether it ends the stream.
+    """
+    if not hasattr(source, 'read'):
+        source = _ChunkReader(source)
+    segment_size = struct.unpack('>I', header[5:9])[0]
+    jobs = max(1, executor.parallelism)
+    window = window or jobs * STREAM_SEGMENTS_PER_JOB
+    per_job = -(-window // jobs)
+    window_bytes = window * segment_size
+    # Buffer layout: plaintext window | segments | update_into slack
+    out_offset = window_bytes
+    lookahead = bytearray(1)
+    carry = 0
+    index = 0
+    with executor.shared_buffer(2 * window_bytes + window * GCM_TAG_SIZE + 15) as shared:
+        view = memoryview(shared.map)
+        try:
+            while True:
+                if carry:
+                    view[0] = lookahead[0]
+                length = carry + _fill(source, view[carry:window_bytes])
+                final = length < window_bytes or _fill(source, lookahead) == 0
+                carry = 0 if final else 1
+                count = max(1, -(-length // segment_size))
+                batches = []
+                for first in range(0, count, per_job):
+                    batches.append((shared.path, aes_key, header, index + first, first * segment_size,
+                                    min(per_job * segment_size, length - first * segment_size),
+                                    out_offset + first * (segment_size + GCM_TAG_SIZE),
+                                    final and first + per_job >= count))
+                executor.map(encrypt_segments, batches)
+                yield bytes(view[out_offset:out_offset + length + count * GCM_TAG_SIZE])
+                if final:
+                    return
+                index += count
+        finally:
+            view.release()
+
+def encrypt_segments(path, aes_key, header, first_index, in_offset, length, out_offset, final):
+    """Encrypt consecutive segments of a segmented stream in a shared buffer (crypto pool job)
+
+    The plaintext and the ciphertext both live in a crypto pool SharedBuffer
+    so that only its path and offsets cross the process boundary.
+
+    Args:
+        path: SharedBuffer path
+        aes_key: AES key
+        header: Stream header produced for the whole payload
+        first_index: Index of the first segment of this job
+        in_offset: Offset of the job's plaintext in the buffer
+        length: Plaintext length (whole segments; only the last job may end short)
+        out_offset: Offset where the job's ciphertext + tags are written
+        final: Whether this job ends the stream
+
+    Returns:
+        Number of bytes written at out_offset
+    """
+    segment_size = struct.unpack('>I', header[5:9])[0]
+    algorithm = algorithms.AES(aes_key)
+    count = max(1, -(-length // segment_size))
+    from utils.crypto_executor import attach_shared_buffer
+    view = memoryview(attach_shared_buffer(path))
+    written = 0
+    try:
+        for i in range(count):
+            start = in_offset + i * segment_size
+            with view[start:min(start + segment_size, in_offset + length)] as block, \
+                    view[out_offset + written:] as out:
+                written += _encrypt_segment_into(algorithm, header, first_index + i, block,
+                                                 final and i == count - 1, out)
+    finally:
+        view.release()
+    return written
+
 class EncryptionManager:
     @staticmethod
     def generate_keypair(key_size=2048):
@@ -93,12 +366,61 @@ class EncryptionManager:
         return decrypted.decode()
     
     @staticmethod
-    def encrypt_aes_key(aes_key, public_key_pem):
-        """Encrypt AES key with RSA public key"""
-        public_key = serialization.load_pem_public_key(
-            public_key_pem.encode(),
-            backend=default_backend()
+    def public_key_to_der(public_key_pem):
+        """Convert a PEM public key to its DER (SubjectPublicKeyInfo) form"""
+        public_key = serialization.load_pem_public_key(_key_bytes(public_key_pem), backend=default_backend())
+        return public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
         )
+    
+    @staticmethod
+    def public_key_fingerprint(public_key):
+        """SHA-256 fingerprint of a public key (PEM or DER), hex encoded"""
+        key_bytes = _key_bytes(public_key)
+        if _is_pem(key_bytes):
+            key_bytes = EncryptionManager.public_key_to_der(key_bytes)
+        return hashlib.sha256(key_bytes).hexdigest()
+    
+    @staticmethod
+    def load_public_key(public_key, fingerprint=None):
+        """Load an RSA public key (PEM text or DER bytes) through the key cache"""
+        key_bytes = _key_bytes(public_key)
+        cache_key = fingerprint or hashlib.sha256(key_bytes).hexdigest()
+        key = _public_key_cache.get(cache_key)
+        if key is None:
+            if _is_pem(key_bytes):
+                key = serialization.load_pem_public_key(key_bytes, backend=default_backend())
+            else:
+                key = serialization.load_der_public_key(key_bytes, backend=default_backend())
+            _public_key_cache.put(cache_key, key)
+        return key
+    
+    @staticmethod
+    def load_private_key(private_key, fingerprint=None):
+        """Load an unencrypted RSA private key (PEM text or DER bytes) through the key cache
+
+        Args:
+            private_key: PEM text, DER bytes or an already loaded key (returned as is)
+            fingerprint: Fingerprint of the matching public key, used as cache key
+        """
+        if isinstance(private_key, rsa.RSAPrivateKey):
+            return private_key
+        key_bytes = _key_bytes(private_key)
+        cache_key = fingerprint or hashlib.sha256(key_bytes).hexdigest()
+        key = _private_key_cache.get(cache_key)
+        if key is None:
+            if _is_pem(key_bytes):
+                key = serialization.load_pem_private_key(key_bytes, password=None, backend=default_backend())
+            else:
+                key = serialization.load_der_private_key(key_bytes, password=None, backend=default_backend())
+            _private_key_cache.put(cache_key, key)
+        return key
+    
+    @staticmethod
+    def encrypt_aes_key(aes_key, public_key_pem, fingerprint=None):
+        """Encrypt AES key with RSA public key (PEM text or DER bytes)"""
+        public_key = EncryptionManager.load_public_key(public_key_pem, fingerprint)
         
         encrypted = public_key.encrypt(
             aes_key,
@@ -111,13 +433,9 @@ class EncryptionManager:
         return base64.b64encode(encrypted).decode()
     
     @staticmethod
-    def decrypt_aes_key(encrypted_aes_key, private_key_pem):
-        """Decrypt AES key with RSA private key"""
-        private_key = serialization.load_pem_private_key(
-            private_key_pem.encode(),
-            password=None,
-            backend=default_backend()
-        )
+    def decrypt_aes_key(encrypted_aes_key, private_key_pem, fingerprint=None):
+        """Decrypt AES key with RSA private key (PEM text or DER bytes)"""
+        private_key = EncryptionManager.load_private_key(private_key_pem, fingerprint)
         
         encrypted = base64.b64decode(encrypted_aes_key)
         decrypted = private_key.decrypt(
@@ -131,37 +449,100 @@ class EncryptionManager:
         return decrypted
     
     @staticmethod
-    def encrypt_data(data, aes_key):
-        """Encrypt data with AES-GCM"""
+    def encrypt_data(data, aes_key, binary=False, cipher_suite=CIPHER_AES_GCM):
+        """Encrypt data with AES-GCM or ChaCha20-Poly1305
+        
+        Args:
+            data: Plaintext (str or bytes)
+            aes_key: Symmetric key for encryption (32 bytes for ChaCha20-Poly1305)
+            binary: If True, return a raw binary envelope (for GridFS).
+                If False, return base64 text (for inline storage and JSON).
+                AES-GCM envelopes of PARALLEL_ENCRYPT_THRESHOLD bytes or more
+                are segmented streams encrypted in parallel.
+            cipher_suite: One of CIPHER_SUITES
+        """
         if isinstance(data, str):
             data = data.encode()
         
+        if (binary and cipher_suite == CIPHER_AES_GCM
+                and PARALLEL_ENCRYPT_THRESHOLD and len(data) >= PARALLEL_ENCRYPT_THRESHOLD):
+            return EncryptionManager.encrypt_data_parallel(data, aes_key)
+        
+        if cipher_suite == CIPHER_CHACHA20_POLY1305:
+            nonce = os.urandom(CHACHA_NONCE_SIZE)
+            encrypted = ChaCha20Poly1305(aes_key).encrypt(nonce, data, None)
+            if binary:
+                return ENVELOPE_MAGIC + bytes([ENVELOPE_SINGLE_CHACHA]) + nonce + encrypted
+            return base64.b64encode(nonce + encrypted).decode()
+        if cipher_suite != CIPHER_AES_GCM:
+            raise ValueError(f"Unsupported cipher suite {cipher_suite}")
+        
         salt = os.urandom(16)
         cipher = Cipher(algorithms.AES(aes_key), modes.GCM(salt), backend=default_backend())
         encryptor = cipher.encryptor()
         
         encrypted = encryptor.update(data) + encryptor.finalize()
+        if binary:
+            return ENVELOPE_MAGIC + bytes([ENVELOPE_SINGLE]) + salt + encryptor.tag + encrypted
         return base64.b64encode(salt + encryptor.tag + encrypted).decode()
     
     @staticmethod
-    def decrypt_data(encrypted_data, aes_key, return_bytes=False):
-        """Decrypt data with AES-GCM
+    def to_binary_envelope(legacy_data):
+        """Convert legacy base64 ciphertext to the binary envelope without decrypting it"""
+        if isinstance(legacy_data, str):
+            legacy_data = legacy_data.encode()
+        if EncryptionManager.is_envelope(legacy_data):
+            return bytes(legacy_data)
+        raw = base64.b64decode(legacy_data, validate=True)
+        if len(raw) < 32:
+            raise ValueError("Ciphertext too short")
+        return ENVELOPE_MAGIC + bytes([ENVELOPE_SINGLE]) + raw
+    
+    @staticmethod
+    def is_envelope(data):
+        """Check whether data is a binary envelope (as opposed to legacy base64 text)"""
+        return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:4]) == ENVELOPE_MAGIC
+    
+    @staticmethod
+    def decrypt_data(encrypted_data, aes_key, return_bytes=False, cipher_suite=None, compression=None):
+        """Decrypt data with AES-GCM or ChaCha20-Poly1305
         
         Args:
-            encrypted_data: Base64-encoded encrypted data
-            aes_key: AES key for decryption
+            encrypted_data: Base64-encoded encrypted data (str or bytes), or a
+                binary envelope (single-shot or segmented)
+            aes_key: Symmetric key for decryption
             return_bytes: If True, return raw bytes. If False, decode to string.
+            cipher_suite: Suite recorded with the content. Envelopes carry their
+                own suite; base64 data without one is AES-GCM.
+            compression: Codec recorded with the content (see compress_payload);
+                the plaintext is decompressed after decryption
         """
-        data = base64.b64decode(encrypted_data)
-        salt = data[:16]
-        tag = data[16:32]
-        encrypted = data[32:]
-        
-        cipher = Cipher(algorithms.AES(aes_key), modes.GCM(salt, tag), backend=default_backend())
-        decryptor = cipher.decryptor()
-        
-        decrypted = decryptor.update(encrypted) + decryptor.finalize()
+        if EncryptionManager.is_segmented(encrypted_data):
+            decrypted = b''.join(EncryptionManager.decrypt_data_stream(encrypted_data, aes_key))
+        elif (EncryptionManager.is_envelope(encrypted_data) and encrypted_data[4] == ENVELOPE_SINGLE_CHACHA) \
+                or (cipher_suite == CIPHER_CHACHA20_POLY1305 and not EncryptionManager.is_envelope(encrypted_data)):
+            if EncryptionManager.is_envelope(encrypted_data):
+                data = bytes(encrypted_data[5:])
+            else:
+                data = base64.b64decode(encrypted_data)
+            decrypted = ChaCha20Poly1305(aes_key).decrypt(data[:CHACHA_NONCE_SIZE], data[CHACHA_NONCE_SIZE:], None)
+        else:
+            if EncryptionManager.is_envelope(encrypted_data):
+                if encrypted_data[4] != ENVELOPE_SINGLE:
+                    raise ValueError(f"Unsupported envelope version {encrypted_data[4]}")
+                data = memoryview(encrypted_data)[5:]
+            else:
+                data = base64.b64decode(encrypted_data)
+            salt = bytes(data[:16])
+            tag = bytes(data[16:32])
+            encrypted = data[32:]
+            
+            cipher = Cipher(algorithms.AES(aes_key), modes.GCM(salt, tag), backend=default_backend())
+            decryptor = cipher.decryptor()
+            
+            decrypted = decryptor.update(encrypted) + decryptor.finalize()
         
+        decrypted = compression_stage.decompress(decrypted, compression)
         if return_bytes:
             return decrypted
         else:
@@ -171,6 +552,276 @@ class EncryptionManager:
                 # If can't decode as text, return bytes
                 return decrypted
     
+    @staticmethod
+    def compress_payload(data, enabled=True):
+        """Compress plaintext before encryption when sampling shows it pays off
+        
+        Returns:
+            Tuple of (payload, codec); codec is None if the payload was left
+            uncompressed and must be stored in metadata['compression'] otherwise
+        """
+        if not enabled:
+            return data, None
+        return compression_stage.compress(data)
+    
+    @staticmethod
+    def compress_payload_stream(chunks, enabled=True):
+        """Streaming counterpart of compress_payload (see compression.compress_stream)
+        
+        Returns:
+            Tuple of (iterator of payload chunks, codec)
+        """
+        if not enabled:
+            return iter(chunks), None
+        return compression_stage.compress_stream(chunks)
+    
+    @staticmethod
+    def is_segmented(data):
+        """Check whether data starts with a segmented stream envelope header"""
+        return (isinstance(data, (bytes, bytearray, memoryview))
+                and bytes(data[:5]) == ENVELOPE_MAGIC + bytes([ENVELOPE_SEGMENTED]))
+    
+    @staticmethod
+    def encrypt_data_stream(source, aes_key, segment_size=DEFAULT_SEGMENT_SIZE, nonce_prefix=None,
+                            executor=None, window=None):
+        """Encrypt data as a segmented AES-GCM stream
+        
+        Generator counterpart of encrypt_data: peak memory stays near
+        segment_size regardless of the payload size. With an executor, windows
+        of segments are encrypted on its workers in parallel instead (peak
+        memory near two windows); the output is byte-identical.
+        
+        Args:
+            source: bytes, a file-like object with read()/readinto(), or an
+                iterable of byte chunks
+            aes_key: AES key for encryption
+            segment_size: Plaintext bytes per segment
+            nonce_prefix: 8 random bytes shared by all segment nonces
+                (generated when omitted)
+            executor: CryptoExecutor to spread segment windows over (optional)
+            window: Segments per window (defaults to STREAM_SEGMENTS_PER_JOB
+                per worker)
+        
+        Yields:
+            The envelope header followed by the encrypted segments
+        """
+        header = _segment_header(segment_size, nonce_prefix)
+        yield header
+        if executor is not None:
+            yield from _encrypt_stream_windows(source, aes_key, header, executor, window)
+            return
+        
+        algorithm = algorithms.AES(aes_key)
+        # update_into needs block_size - 1 bytes of slack; the tag is written after the ciphertext
+        out = bytearray(segment_size + 15 + GCM_TAG_SIZE)
+        out_view = memoryview(out)
+        
+        for index, (block, is_final) in enumerate(_iter_blocks(source, segment_size)):
+            n = _encrypt_segment_into(algorithm, header, index, block, is_final, out_view)
+            yield bytes(out_view[:n])
+    
+    @staticmethod
+    def encrypt_data_parallel(data, aes_key, segment_size=DEFAULT_SEGMENT_SIZE, nonce_prefix=None,
+                              executor=None, jobs=None):
+        """Encrypt data as a segmented AES-GCM stream on several cores
+        
+        Segments are independent, so contiguous batches of them are encrypted
+        by the crypto worker pool at the same time. The result is
+        byte-identical to b''.join(encrypt_data_stream(...)) with the same
+        nonce_prefix.
+        
+        Args:
+            data: Plaintext bytes
+            aes_key: AES key for encryption
+            segment_size: Plaintext bytes per segment
+            nonce_prefix: 8 random bytes shared by all segment nonces
+            executor: CryptoExecutor to use (defaults to the process-wide pool)
+            jobs: Number of batches (defaults to the pool's parallelism)
+        """
+        if executor is None:
+            from utils.crypto_executor import get_crypto_executor
+            executor = get_crypto_executor()
+        header = _segment_header(segment_size, nonce_prefix)
+        if isinstance(data, str):
+            data = data.encode()
+        length = len(data)
+        count = max(1, -(-length // segment_size))
+        jobs = max(1, min(jobs or executor.parallelism, count))
+        per_job = -(-count // jobs)
+        
+        # Buffer layout: plaintext | header | segments | update_into slack.
+        # Job outputs are contiguous, so header + segments is the envelope.
+        envelope_offset = length
+        out_offset = envelope_offset + len(header)
+        envelope_size = len(header) + length + count * GCM_TAG_SIZE
+        with executor.shared_buffer(envelope_offset + envelope_size + 15) as shared:
+            shared.map[:length] = data
+            shared.map[envelope_offset:out_offset] = header
+            batches = []
+            for first in range(0, count, per_job):
+                batches.append((shared.path, aes_key, header, first, first * segment_size,
+                                min(per_job * segment_size, length - first * segment_size),
+                                out_offset + first * (segment_size + GCM_TAG_SIZE),
+                                first + per_job >= count))
+            executor.map(encrypt_segments, batches)
+            return shared.map[envelope_offset:envelope_offset + envelope_size]
+    
+    @staticmethod
+    def decrypt_data_stream(source, aes_key):
+        """Decrypt a segmented AES-GCM stream produced by encrypt_data_stream
+        
+        Generator counterpart of decrypt_data. Every segment is authenticated
+        before its plaintext is yielded; tampering raises InvalidTag.
+        
+        Args:
+            source: bytes, a file-like object or an iterable of byte chunks
+            aes_key: AES key for decryption
+        
+        Yields:
+            Plaintext bytes, one object per segment
+        """
+        if not hasattr(source, 'read'):
+            source = _ChunkReader(source)
+        
+        header = bytearray(SEGMENT_HEADER_SIZE)
+        if _fill(source, header) != SEGMENT_HEADER_SIZE or not EncryptionManager.is_segmented(header):
+            raise ValueError("Not a segmented encryption stream")
+        header = bytes(header)
+        segment_size = struct.unpack('>I', header[5:9])[0]
+        nonce_prefix = header[9:]
+        
+        algorithm = algorithms.AES(aes_key)
+        out = bytearray(segment_size + 15)
+        out_view = memoryview(out)
+        
+        for index, (block, is_final) in enumerate(_iter_blocks(source, segment_size + GCM_TAG_SIZE)):
+            if len(block) < GCM_TAG_SIZE:
+                raise ValueError("Truncated encryption stream")
+            ciphertext, tag = block[:-GCM_TAG_SIZE], block[-GCM_TAG_SIZE:]
+            decryptor = Cipher(algorithm, modes.GCM(_segment_nonce(nonce_prefix, index), bytes(tag)),
+                               backend=default_backend()).decryptor()
+            decryptor.authenticate_additional_data(_segment_aad(header, index, is_final))
+            n = decryptor.update_into(ciphertext, out)
+            decryptor.finalize()
+            yield bytes(out_view[:n])
+    
+    @staticmethod
+    def generate_ec_keypair():
+        """Generate an X25519 key pair as base64 raw keys (private, public)"""
+        private_key = x25519.X25519PrivateKey.generate()
+        private_raw = private_key.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        public_raw = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        return base64.b64encode(private_raw).decode(), base64.b64encode(public_raw).decode()
+    
+    @staticmethod
+    def _x25519_wrap_key(shared_secret, ephemeral_public, recipient_public):
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=X25519_WRAP_INFO + ephemeral_public + recipient_public,
+            backend=default_backend()
+        ).derive(shared_secret)
+    
+    @staticmethod
+    def wrap_aes_key_x25519(aes_key, public_key_b64):
+        """Wrap an AES key for an X25519 public key (ECIES: ephemeral X25519 + HKDF + AES-GCM)
+        
+        Returns:
+            Base64 of ephemeral public key (32) + nonce (12) + wrapped key and tag
+        """
+        recipient_public = base64.b64decode(public_key_b64)
+        ephemeral = x25519.X25519PrivateKey.generate()
+        ephemeral_public = ephemeral.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        shared = ephemeral.exchange(x25519.X25519PublicKey.from_public_bytes(recipient_public))
+        wrap_key = EncryptionManager._x25519_wrap_key(shared, ephemeral_public, recipient_public)
+        nonce = os.urandom(12)
+        wrapped = AESGCM(wrap_key).encrypt(nonce, aes_key, None)
+        return base64.b64encode(ephemeral_public + nonce + wrapped).decode()
+    
+    @staticmethod
+    def unwrap_aes_key_x25519(wrapped_key_b64, private_key_b64):
+        """Unwrap an AES key wrapped by wrap_aes_key_x25519
+        
+        Args:
+            wrapped_key_b64: Output of wrap_aes_key_x25519
+            private_key_b64: Base64 raw private key or a loaded X25519PrivateKey
+        """
+        data = base64.b64decode(wrapped_key_b64)
+        ephemeral_public, nonce, wrapped = data[:32], data[32:44], data[44:]
+        if isinstance(private_key_b64, x25519.X25519PrivateKey):
+            private_key = private_key_b64
+        else:
+            private_key = x25519.X25519PrivateKey.from_private_bytes(base64.b64decode(private_key_b64))
+        recipient_public = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PublicFormat.Raw
+        )
+        shared = private_key.exchange(x25519.X25519PublicKey.from_public_bytes(ephemeral_public))
+        wrap_key = EncryptionManager._x25519_wrap_key(shared, ephemeral_public, recipient_public)
+        return AESGCM(wrap_key).decrypt(nonce, wrapped, None)
+    
+    @staticmethod
+    def wrap_aes_key(aes_key, public_key, key_wrap=KEY_WRAP_RSA, fingerprint=None):
+        """Wrap an AES key with the given scheme (RSA-OAEP or X25519)"""
+        if key_wrap == KEY_WRAP_X25519:
+            return EncryptionManager.wrap_aes_key_x25519(aes_key, public_key)
+        return EncryptionManager.encrypt_aes_key(aes_key, public_key, fingerprint)
+    
+    @staticmethod
+    def unwrap_aes_key(wrapped_key, private_key, key_wrap=KEY_WRAP_RSA, fingerprint=None):
+        """Unwrap an AES key with the given scheme (RSA-OAEP or X25519)"""
+        if key_wrap == KEY_WRAP_X25519:
+            return EncryptionManager.unwrap_aes_key_x25519(wrapped_key, private_key)
+        return EncryptionManager.decrypt_aes_key(wrapped_key, private_key, fingerprint)
+    
+    @staticmethod
+    def encrypt_for_recipients(data, recipients, aes_key_size=32, binary=False, cipher_suite=CIPHER_AES_GCM):
+        """Encrypt data once and wrap its AES key for every recipient
+        
+        Args:
+            data: Plaintext (str or bytes)
+            recipients: Iterable of (recipient_id, public_key, fingerprint, key_wrap)
+                tuples; public_key is PEM text / DER bytes for RSA-OAEP or a
+                base64 raw key for X25519, fingerprint may be None
+            aes_key_size: AES key size in bytes
+            binary: Passed to encrypt_data
+            cipher_suite: Passed to encrypt_data
+        
+        Returns:
+            Tuple of (ciphertext, {recipient_id: wrapped_aes_key})
+        """
+        aes_key = EncryptionManager.generate_aes_key(aes_key_size)
+        ciphertext = EncryptionManager.encrypt_data(data, aes_key, binary=binary, cipher_suite=cipher_suite)
+        return ciphertext, EncryptionManager.wrap_for_recipients(aes_key, recipients)
+    
+    @staticmethod
+    def wrap_for_recipients(aes_key, recipients):
+        """Wrap one AES key for every recipient
+        
+        Args:
+            aes_key: AES key the payload was encrypted with
+            recipients: Iterable of (recipient_id, public_key, fingerprint, key_wrap)
+                tuples, as for encrypt_for_recipients
+        
+        Returns:
+            Dict of recipient_id -> wrapped AES key
+        """
+        return {
+            recipient_id: EncryptionManager.wrap_aes_key(aes_key, public_key, key_wrap, fingerprint)
+            for recipient_id, public_key, fingerprint, key_wrap in recipients
+        }
+    
     @staticmethod
     def generate_aes_key(key_size=32):
         """Generate random AES key with specified size (16, 24, or 32 bytes)"""
@@ -178,6 +829,27 @@ class EncryptionManager:
             raise ValueError("AES key size must be 16, 24, or 32 bytes")
         return os.urandom(key_size)
     
+    @staticmethod
+    def negotiate_cipher_suite(requested, enc_config):
+        """Choose the bulk cipher for a share
+        
+        Args:
+            requested: Client preference: a suite name, a comma-separated or
+                list preference order, or None to use the level default
+            enc_config: Encryption level configuration
+        
+        Returns:
+            Tuple of (cipher_suite, key_size); ChaCha20-Poly1305 always uses
+            a 256-bit key whatever the level's AES key size
+        """
+        if isinstance(requested, str):
+            requested = [name.strip() for name in requested.split(',')]
+        suite = next((name for name in requested or [] if name in CIPHER_SUITES),
+                     enc_config.get('cipher', CIPHER_AES_GCM))
+        if suite == CIPHER_CHACHA20_POLY1305:
+            return suite, 32
+        return suite, enc_config['aes_key_size']
+    
     @staticmethod
     def get_encryption_level_config(level='standard'):
         """Get encryption configuration for specified level"""
@@ -193,6 +865,12 @@ def encrypt_private_key(private_key, password):
 def decrypt_private_key(encrypted_key, password):
     return EncryptionManager.decrypt_private_key(encrypted_key, password)
 
+def unwrap_aes_key(wrapped_key, private_key, key_wrap=KEY_WRAP_RSA, fingerprint=None):
+    return EncryptionManager.unwrap_aes_key(wrapped_key, private_key, key_wrap, fingerprint)
+
+def generate_ec_keypair():
+    return EncryptionManager.generate_ec_keypair()
+
 def generate_aes_key(key_size=32):
     return EncryptionManager.generate_aes_key(key_size)
 
@@ -0,0 +1,240 @@
+"""
+Pre-generated RSA keypair pool.
+
+RSA key generation takes hundreds of milliseconds and used to run inline in
+/api/auth/register, stalling the single eventlet worker. The pool keeps a
+small in-memory stock of ready keypairs plus a persisted reserve in MongoDB
+(so a restart does not start cold) and refills both from a background worker
+whenever the in-memory depth drops below the low-water mark.
+
+Reserve entries hold private keys of future users, so they are stored
+Fernet-encrypted with a key derived from KEYPOOL_SECRET (or SECRET_KEY) and
+decrypted on acquire. Without a secret the reserve is disabled and the pool
+is kept in memory only.
+"""
+import os
+import time
+import base64
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from utils.encryption import generate_keypair
+from utils import metrics
+from utils.crypto_executor import run_crypto
+
+# Seconds between reserve count_documents() calls; counted locally in between
+RESERVE_COUNT_INTERVAL = 30
+
+
+class KeypairPool:
+    def __init__(self, collection=None, key_size=2048, size=8, low_water=3,
+                 reserve=16, refill_interval=0.5, secret=None):
+        """
+        Args:
+            collection: MongoDB collection used for the persisted reserve (optional)
+            key_size: RSA key size of pooled keys
+            size: Target number of keypairs kept in memory
+            low_water: Refill is triggered when in-memory depth drops below this
+            reserve: Target number of keypairs kept in the persisted reserve
+            refill_interval: Seconds to pause between generated keys (throttle)
+            secret: Secret the reserve's private keys are encrypted with; the
+                reserve is disabled without one
+        """
+        if collection is not None and not secret:
+            print("[WARNING] KEYPOOL_SECRET/SECRET_KEY not set, keypair reserve disabled (in-memory pool only)")
+            collection = None
+        self.collection = collection
+        self._fernet = None
+        if collection is not None:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+        self.key_size = key_size
+        self.size = size
+        self.low_water = min(low_water, size)
+        self.reserve = reserve if collection is not None else 0
+        self.refill_interval = refill_interval
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._reserve_count = 0
+        self._reserve_counted_at = None
+        metrics.set_gauge('keypool.depth', 0)
+
+    @classmethod
+    def from_env(cls, collection=None):
+        """Build a pool configured from KEYPOOL_* environment variables"""
+        return cls(
+            collection=collection,
+            key_size=int(os.environ.get('KEYPOOL_KEY_SIZE', 2048)),
+            size=int(os.environ.get('KEYPOOL_SIZE', 8)),
+            low_water=int(os.environ.get('KEYPOOL_LOW_WATER', 3)),
+            reserve=int(os.environ.get('KEYPOOL_RESERVE', 16)),
+            refill_interval=float(os.environ.get('KEYPOOL_REFILL_INTERVAL', 0.5)),
+            secret=os.environ.get('KEYPOOL_SECRET') or os.environ.get('SECRET_KEY')
+        )
+
+    @property
+    def depth(self):
+        return len(self._keys)
+
+    def reserve_depth(self, refresh=False):
+        """Keypairs in the persisted reserve
+
+        Counted in MongoDB at most every RESERVE_COUNT_INTERVAL seconds (other
+        workers share the reserve) and tracked locally in between.
+        """
+        if self.collection is None:
+            return 0
+        now = time.monotonic()
+        if refresh or self._reserve_counted_at is None or now - self._reserve_counted_at >= RESERVE_COUNT_INTERVAL:
+            try:
+                self._reserve_count = self.collection.count_documents({'key_size': self.key_size})
+            except Exception as e:
+                print(f"[WARNING] Keypair reserve unavailable: {e}")
+            self._reserve_counted_at = now
+        return self._reserve_count
+
+    def start(self):
+        """Start the background refill worker (idempotent)"""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name='keypair-pool', daemon=True)
+        self._worker.start()
+        self._wakeup.set()
+
+    def acquire(self):
+        """Take a ready keypair, generating one inline only if the pool is empty
+
+        Returns:
+            Tuple of (private_key_pem, public_key_pem)
+        """
+        keypair = None
+        with self._lock:
+            if self._keys:
+                keypair = self._keys.popleft()
+        if keypair:
+            metrics.inc('keypool.hits')
+        else:
+            keypair = self._take_from_reserve()
+            if keypair:
+                metrics.inc('keypool.reserve_hits')
+            else:
+                metrics.inc('keypool.misses')
+                keypair = self._generate()
+
+        self._update_depth_gauges()
+        if self.depth < self.low_water:
+            self._wakeup.set()
+        return keypair
+
+    def _generate(self):
+        started = time.perf_counter()
+        keypair = run_crypto(generate_keypair, self.key_size)
+        metrics.observe('keypool.generate_seconds', time.perf_counter() - started)
+        metrics.inc('keypool.generated')
+        return keypair
+
+    def _take_from_reserve(self):
+        if self.collection is None:
+            return None
+        try:
+            doc = self.collection.find_one_and_delete(
+                {'key_size': self.key_size},
+                sort=[('created_at', 1)]
+            )
+        except Exception as e:
+            print(f"[WARNING] Keypair reserve unavailable: {e}")
+            return None
+        if not doc:
+            return None
+        self._reserve_count = max(0, self._reserve_count - 1)
+        try:
+            private_key = self._fernet.decrypt(doc['private_key_encrypted']).decode()
+        except Exception as e:
+            # Written with another secret (or by an older version): unusable
+            print(f"[WARNING] Discarding unreadable reserve keypair: {e}")
+            return None
+        return private_key, doc['public_key']
+
+    def _store_in_reserve(self, keypair):
+        private_key, public_key = keypair
+        self.collection.insert_one({
+            'key_size': self.key_size,
+            'private_key_encrypted': self._fernet.encrypt(private_key.encode()),
+            'public_key': public_key,
+            'created_at': datetime.now(timezone.utc)
+        })
+        self._reserve_count += 1
+
+    def _refill_once(self):
+        """Generate one keypair where it is most needed. Returns False when full."""
+        if self.depth < self.size:
+            keypair = self._generate()
+            with self._lock:
+                self._keys.append(keypair)
+            return True
+        if self.reserve and self.reserve_depth() < self.reserve:
+            self._store_in_reserve(self._generate())
+            return True
+        return False
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            burst_started = time.perf_counter()
+            generated = 0
+            try:
+                while self._refill_once():
+                    generated += 1
+                    self._update_depth_gauges()
+                    time.sleep(self.refill_interval)
+            except Exception as e:
+                print(f"[WARNING] Keypair pool refill failed: {e}")
+                time.sleep(max(self.refill_interval, 5))
+                self._wakeup.set()
+            if generated:
+                elapsed = time.perf_counter() - burst_started
+                metrics.set_gauge('keypool.refill_rate', generated / elapsed if elapsed else 0)
+            self._update_depth_gauges()
+
+    def _update_depth_gauges(self):
+        metrics.set_gauge('keypool.depth', self.depth)
+        if self.collection is not None:
+            metrics.set_gauge('keypool.reserve_depth', self.reserve_depth())
+
+
+_pool = None
+
+
+def init_keypair_pool(db=None, start=True):
+    """Create the process-wide keypair pool, backed by db.keypair_pool if available"""
+    global _pool
+    collection = db.keypair_pool if db is not None else None
+    if collection is not None:
+        try:
+            collection.create_index([('key_size', 1), ('created_at', 1)], name='key_size_created_idx')
+            # Earlier versions stored reserve private keys unencrypted
+            removed = collection.delete_many({'private_key': {'$exists': True}}).deleted_count
+            if removed:
+                print(f"[INFO] Removed {removed} unencrypted keypairs from the reserve")
+        except Exception as e:
+            print(f"[WARNING] Failed to prepare keypair pool collection: {e}")
+    _pool = KeypairPool.from_env(collection)
+    if start:
+        _pool.start()
+    return _pool
+
+
+def get_keypair_pool():
+    return _pool
+
+
+def acquire_keypair(key_size=2048):
+    """Get an RSA keypair from the pool, falling back to inline generation"""
+    if _pool is not None and _pool.key_size == key_size:
+        return _pool.acquire()
+    metrics.inc('keypool.misses')
+    return run_crypto(generate_keypair, key_size)
@@ -0,0 +1,82 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and histograms live in memory for the lifetime of the
+worker and are exposed as JSON through the /api/metrics endpoint.
+Histograms keep count / sum / min / max, plus per-bucket counts when
+observed with bucket bounds.
+"""
+import bisect
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def inc(name, value=1):
+    """Increment a counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Set a gauge to an absolute value"""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, value, buckets=None):
+    """Record a sample in a histogram (count / sum / min / max)
+
+    Args:
+        buckets: Optional ascending upper bounds; the histogram then also
+            counts samples per bucket (the first call for a name fixes them)
+    """
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = {'count': 0, 'sum': 0.0, 'min': value, 'max': value}
+            if buckets:
+                hist['bounds'] = tuple(buckets)
+                hist['buckets'] = [0] * (len(buckets) + 1)
+            _histograms[name] = hist
+        hist['count'] += 1
+        hist['sum'] += value
+        hist['min'] = min(hist['min'], value)
+        hist['max'] = max(hist['max'], value)
+        if 'bounds' in hist:
+            hist['buckets'][bisect.bisect_left(hist['bounds'], value)] += 1
+
+
+def get_counter(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot():
+    """Return a copy of all metrics suitable for JSON serialisation"""
+    with _lock:
+        histograms = {}
+        for name, hist in _histograms.items():
+            histograms[name] = {key: value for key, value in hist.items() if key not in ('bounds', 'buckets')}
+            histograms[name]['avg'] = hist['sum'] / hist['count'] if hist['count'] else 0
+            if 'bounds' in hist:
+                # Samples per bucket in bound order; 'le' is the inclusive upper bound
+                bounds = list(hist['bounds']) + ['inf']
+                histograms[name]['buckets'] = [{'le': bound, 'count': count}
+                                               for bound, count in zip(bounds, hist['buckets'])]
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'histograms': histograms
+        }
+
+
+def reset():
+    """Clear all metrics (used by tests and benchmarks)"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
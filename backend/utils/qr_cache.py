@@ -0,0 +1,206 @@
+"""
+Content-addressed cache of rendered QR images.
+
+The payload of a content's QR code never changes, yet /api/content/qr/<id>
+and /send-qr-email used to re-render and re-encode the PNG on every call.
+Rendered images are cached under a SHA-256 of the encoded payload and the
+render options (size, error-correction level), so identical requests reuse
+the same bytes whichever route asks for them.
+
+The in-process cache is an LRU bounded by the total size of the cached
+images. Optionally images are also persisted to disk or GridFS, so a
+restarted worker does not start cold; persisted entries are not evicted.
+
+Configuration:
+    QR_CACHE_BYTES: Size bound of the in-process cache (default 32MB, 0 disables it)
+    QR_CACHE_PERSIST: 'none' (default), 'disk' or 'gridfs'
+    QR_CACHE_DIR: Directory used when QR_CACHE_PERSIST=disk
+"""
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from utils import metrics
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+GRIDFS_COLLECTION = 'qr_cache'
+
+
+def cache_key(payload, *options):
+    """SHA-256 hex digest of an encoded QR payload and its render options"""
+    digest = hashlib.sha256(payload.encode('utf-8') if isinstance(payload, str) else payload)
+    for option in options:
+        digest.update(b'\x00' + str(option).encode())
+    return digest.hexdigest()
+
+
+class DiskStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, image):
+        # Write to a temporary file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(image)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+class GridFSStore:
+    def __init__(self, db):
+        import gridfs
+        self.fs = gridfs.GridFS(db, collection=GRIDFS_COLLECTION)
+
+    def get(self, key):
+        grid_out = self.fs.find_one({'filename': key})
+        return grid_out.read() if grid_out is not None else None
+
+    def put(self, key, image):
+        if not self.fs.exists({'filename': key}):
+            self.fs.put(image, filename=key)
+
+
+class QRCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, store=None):
+        """
+        Args:
+            max_bytes: Total size of images kept in memory before the least
+                recently used ones are evicted
+            store: Optional persistent store (DiskStore or GridFSStore)
+        """
+        self.max_bytes = max_bytes
+        self.store = store
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached image for key, or None"""
+        with self._lock:
+            self._requests += 1
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+        if image is None and self.store is not None:
+            image = self._get_from_store(key)
+            if image is not None:
+                metrics.inc('qr_cache.persistent_hits')
+                with self._lock:
+                    self._hits += 1
+                self._remember(key, image)
+        metrics.inc('qr_cache.hits' if image is not None else 'qr_cache.misses')
+        metrics.set_gauge('qr_cache.hit_rate', self.hit_rate)
+        return image
+
+    def put(self, key, image):
+        """Cache a rendered image (and persist it if a store is configured)"""
+        self._remember(key, image)
+        if self.store is not None:
+            try:
+                self.store.put(key, image)
+            except Exception as e:
+                print(f"[WARNING] Failed to persist QR image: {e}")
+
+    def get_or_render(self, key, render):
+        """Return the cached image for key, calling render() to create it on a miss"""
+        image = self.get(key)
+        if image is None:
+            image = render()
+            self.put(key, image)
+        return image
+
+    def _get_from_store(self, key):
+        try:
+            return self.store.get(key)
+        except Exception as e:
+            print(f"[WARNING] QR cache store unavailable: {e}")
+            return None
+
+    def _remember(self, key, image):
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = image
+            self._bytes += len(image)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                metrics.inc('qr_cache.evictions')
+            metrics.set_gauge('qr_cache.bytes', self._bytes)
+            metrics.set_gauge('qr_cache.entries', len(self._entries))
+
+    @property
+    def hit_rate(self):
+        return self._hits / self._requests if self._requests else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._requests - self._hits,
+                'hit_rate': self.hit_rate,
+                'persist': type(self.store).__name__ if self.store is not None else None
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = None
+
+
+def init_qr_cache(db=None):
+    """Create the process-wide QR image cache from QR_CACHE_* settings"""
+    global _cache
+    store = None
+    persist = os.environ.get('QR_CACHE_PERSIST', 'none').lower()
+    try:
+        if persist == 'disk':
+            store = DiskStore(os.environ.get('QR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'qr_cache')))
+        elif persist == 'gridfs':
+            if db is None:
+                print("[WARNING] QR_CACHE_PERSIST=gridfs requires MongoDB, QR images cached in memory only")
+            else:
+                store = GridFSStore(db)
+    except Exception as e:
+        print(f"[WARNING] QR cache persistence unavailable, caching in memory only: {e}")
+        store = None
+    _cache = QRCache(max_bytes=int(os.environ.get('QR_CACHE_BYTES', DEFAULT_MAX_BYTES)), store=store)
+    return _cache
+
+
+def get_qr_cache():
+    global _cache
+    if _cache is None:
+        _cache = QRCache()
+    return _cache
@@ -1,13 +1,137 @@
+import os
+import hmac
 import qrcode
 import base64
 import json
+import hashlib
+import secrets
+import time
 from io import BytesIO
-from PIL import Image
+from qrcode.image.svg import SvgPathFillImage
+from utils.qr_cache import cache_key, get_qr_cache
+from utils import metrics, qr_payload, qr_policy, qr_raster
+
+# Reference-token QR payloads: the QR carries only a signed random reference
+# that the server resolves to the content. Upper-case base32 keeps the whole
+# payload in the QR alphanumeric character set, the densest mode available.
+TOKEN_PREFIX = 'QRS://T/'
+TOKEN_REF_BYTES = 10
+TOKEN_TAG_BYTES = 8
+QR_MODE_TOKEN = 'token'
+QR_MODE_EMBEDDED = 'embedded'
+QR_MODES = (QR_MODE_TOKEN, QR_MODE_EMBEDDED)
+
+FORMAT_PNG = 'png'
+FORMAT_SVG = 'svg'
+IMAGE_FORMATS = (FORMAT_PNG, FORMAT_SVG)
+QR_BORDER = 4
+# Pixels per module when no size is requested (the original 10px boxes)
+QR_BOX_SIZE = 10
+QR_SVG_BOX_SIZE = 10
+
+# Encodings of embedded payloads: dense msgpack + base45, or the original base64 JSON URL
+QR_ENCODING_BINARY = 'binary'
+QR_ENCODING_BASE64 = 'base64'
+
+# Histogram bucket bounds of the per-source QR telemetry (qr.<value>.<source>)
+VERSION_BUCKETS = (1, 2, 3, 4, 5, 7, 10, 15, 20, 25, 30, 40)
+MODULE_BUCKETS = tuple(4 * version + 17 for version in VERSION_BUCKETS)
+PAYLOAD_CHAR_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096)
+RENDER_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+PNG_BYTES_BUCKETS = (512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+_token_secret = None
+_token_mode_warned = False
+
+
+def _configured_token_secret():
+    return os.environ.get('QR_TOKEN_SECRET') or os.environ.get('SECRET_KEY')
+
+
+def _get_token_secret():
+    global _token_secret
+    if _token_secret is None:
+        secret = _configured_token_secret()
+        if not secret:
+            # A random per-process secret would invalidate every printed QR on restart
+            raise ValueError("QR tokens are disabled: QR_TOKEN_SECRET/SECRET_KEY not set")
+        _token_secret = secret.encode()
+    return _token_secret
+
+
+def token_mode_available():
+    """Whether reference-token payloads can be signed (a token secret is configured)"""
+    return bool(_configured_token_secret())
+
+
+def default_qr_mode():
+    """QR payload mode configured by QR_PAYLOAD_MODE ('token' or 'embedded')
+
+    Token mode is only used when a token secret is configured; otherwise the
+    payload is embedded.
+    """
+    global _token_mode_warned
+    mode = os.environ.get('QR_PAYLOAD_MODE', QR_MODE_EMBEDDED).lower()
+    if mode == QR_MODE_TOKEN and not token_mode_available():
+        if not _token_mode_warned:
+            print("[WARNING] QR_PAYLOAD_MODE=token needs QR_TOKEN_SECRET or SECRET_KEY, using embedded payloads")
+            _token_mode_warned = True
+        return QR_MODE_EMBEDDED
+    return mode if mode in QR_MODES else QR_MODE_EMBEDDED
+
+
+def default_qr_encoding():
+    """Embedded payload encoding configured by QR_PAYLOAD_ENCODING ('binary' or 'base64')"""
+    encoding = os.environ.get('QR_PAYLOAD_ENCODING', QR_ENCODING_BINARY).lower()
+    if encoding == QR_ENCODING_BINARY and not qr_payload.available():
+        return QR_ENCODING_BASE64
+    return encoding if encoding in (QR_ENCODING_BINARY, QR_ENCODING_BASE64) else QR_ENCODING_BINARY
+
+
+def _timed_render(plan):
+    started = time.perf_counter()
+    image = QRGenerator._render(plan)
+    return image, time.perf_counter() - started
+
+
+def render_plan_batch(plans):
+    """Render several plan_qr() plans; module-level so crypto pool workers can run it
+
+    Returns:
+        List of (image, render seconds); metrics recorded in a worker process
+        would be lost, so the caller records the timings
+    """
+    return [_timed_render(plan) for plan in plans]
+
+
+def _observe_plan(plan):
+    source = plan['source']
+    metrics.observe(f'qr.payload_chars.{source}', len(plan['payload']), PAYLOAD_CHAR_BUCKETS)
+    metrics.observe(f'qr.version.{source}', plan['info']['version'], VERSION_BUCKETS)
+    metrics.observe(f'qr.modules.{source}', plan['info']['modules'], MODULE_BUCKETS)
+
+
+def _observe_render(plan, image, seconds):
+    source = plan.get('source')
+    if not source:
+        return
+    metrics.observe(f'qr.render_seconds.{source}', seconds, RENDER_SECONDS_BUCKETS)
+    if plan['format'] == FORMAT_PNG:
+        metrics.observe(f'qr.png_bytes.{source}', len(image), PNG_BYTES_BUCKETS)
+
 
 class QRGenerator:
     @staticmethod
-    def encode_secure_data(data):
-        """Encode data to prevent sensitive info exposure in regular scanners"""
+    def encode_secure_data(data, encoding=None):
+        """Encode data to prevent sensitive info exposure in regular scanners
+        Args:
+            data: Data to encode (dict or string)
+            encoding: 'binary' or 'base64' (defaults to default_qr_encoding())
+        """
+        encoding = encoding or default_qr_encoding()
+        if encoding == QR_ENCODING_BINARY and isinstance(data, dict):
+            return qr_payload.encode(data)
+        
         # Convert dict to JSON string
         if isinstance(data, dict):
             json_str = json.dumps(data, ensure_ascii=False)
@@ -26,6 +150,9 @@ class QRGenerator:
     def decode_secure_data(encoded_url):
         """Decode the secure QR data back to original format"""
         try:
+            if qr_payload.is_binary(encoded_url):
+                return qr_payload.decode(encoded_url)
+            
             # Handle both URL format and direct base64
             if encoded_url.startswith('qrs://v?d='):
                 encoded = encoded_url.replace('qrs://v?d=', '')
@@ -44,45 +171,241 @@ class QRGenerator:
             return encoded_url
     
     @staticmethod
-    def generate_qr_code(data, size=400, secure=True):
-        """Generate QR code from data
-        Args:
-            data: Data to encode (dict or string)
-            size: Size of QR code image
-            secure: If True, encodes data to hide sensitive information
-        """
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
+    def new_token_ref():
+        """Random reference stored on the content document as qr_token"""
+        return secrets.token_hex(TOKEN_REF_BYTES)
+
+    @staticmethod
+    def _token_tag(ref_bytes):
+        return hmac.new(_get_token_secret(), ref_bytes, hashlib.sha256).digest()[:TOKEN_TAG_BYTES]
+
+    @staticmethod
+    def encode_reference_token(ref):
+        """Signed QR payload for a qr_token reference"""
+        ref_bytes = bytes.fromhex(ref)
+        token = base64.b32encode(ref_bytes + QRGenerator._token_tag(ref_bytes)).decode().rstrip('=')
+        return TOKEN_PREFIX + token
+
+    @staticmethod
+    def decode_reference_token(qr_data):
+        """Return the qr_token reference of a token payload
         
+        Returns:
+            The reference, or None if qr_data is not a token payload
+
+        Raises:
+            ValueError: If the token is malformed or its signature does not match
+        """
+        if not isinstance(qr_data, str) or not qr_data.upper().startswith(TOKEN_PREFIX):
+            return None
+        token = qr_data[len(TOKEN_PREFIX):].strip().upper()
+        try:
+            raw = base64.b32decode(token + '=' * (-len(token) % 8))
+        except Exception:
+            raise ValueError("Malformed QR token")
+        ref_bytes, tag = raw[:TOKEN_REF_BYTES], raw[TOKEN_REF_BYTES:]
+        if len(raw) != TOKEN_REF_BYTES + TOKEN_TAG_BYTES or not hmac.compare_digest(tag, QRGenerator._token_tag(ref_bytes)):
+            raise ValueError("Invalid QR token signature")
+        return ref_bytes.hex()
+
+    @staticmethod
+    def is_share_payload(qr_data):
+        """Whether scanned QR text is one of this app's share payloads (token, binary or URL formats)"""
+        if not isinstance(qr_data, str):
+            return False
+        return (qr_data.upper().startswith(TOKEN_PREFIX) or qr_payload.is_binary(qr_data)
+                or qr_data.startswith(('qrs://v?d=', 'hideanythingqr://decode?data=')))
+
+    @staticmethod
+    def _payload(data, secure=True):
+        """Encoded string carried by the QR code"""
         # If secure mode, encode the data to hide sensitive info
         if secure and isinstance(data, dict):
-            qr_data = QRGenerator.encode_secure_data(data)
-        else:
-            # If data is dict, convert to JSON string
-            if isinstance(data, dict):
-                qr_data = json.dumps(data, ensure_ascii=False)
-            else:
-                qr_data = data
+            return QRGenerator.encode_secure_data(data)
+        # If data is dict, convert to JSON string
+        if isinstance(data, dict):
+            return json.dumps(data, ensure_ascii=False)
+        return data
+
+    @staticmethod
+    def _box_size(size, modules):
+        """Integer pixels per module so the image is as close to size as possible without resampling
+
+        Without a requested size the modules keep the default QR_BOX_SIZE.
+        """
+        if size is None:
+            return QR_BOX_SIZE
+        return max(1, round(size / (modules + 2 * QR_BORDER)))
+
+    @staticmethod
+    def plan_qr(data, size=None, secure=True, image_format=FORMAT_PNG, target=None, error_correction=None,
+                max_version=None, source=None):
+        """Resolve payload, error correction, version and cache key of a QR image without rendering it
         
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+        The cache key identifies the exact image bytes, so it doubles as a strong ETag.
         
-        img = qr.make_image(fill_color="black", back_color="white")
+        Args:
+            source: Optional label of the calling path (e.g. 'share'); when
+                set, payload size, version and modules are recorded in the
+                qr.*.<source> histograms, and render time and PNG size when
+                the plan is rendered
+        
+        Raises:
+            QRCapacityError: If the payload does not fit within the version cap
+        """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported QR image format {image_format}")
+        qr_data = QRGenerator._payload(data, secure)
+        info = qr_policy.choose(qr_data, target, error_correction, max_version)
+        # SVG is resolution independent; only PNG depends on the requested size
+        box_size = QRGenerator._box_size(size, info['modules']) if image_format == FORMAT_PNG else QR_SVG_BOX_SIZE
+        plan = {
+            'payload': qr_data,
+            'info': info,
+            'format': image_format,
+            'box_size': box_size,
+            'key': cache_key(qr_data, image_format, box_size, info['error_correction'], info['version']),
+            'source': source
+        }
+        if source:
+            _observe_plan(plan)
+        return plan
+
+    @staticmethod
+    def render_plan(plan, use_cache=True):
+        """Render (or fetch from the cache) the image described by plan_qr()"""
+        def render():
+            image, seconds = _timed_render(plan)
+            _observe_render(plan, image, seconds)
+            return image
+        
+        if not use_cache:
+            return render()
+        return get_qr_cache().get_or_render(plan['key'], render)
+
+    @staticmethod
+    def render_plans(plans, use_cache=True, executor=None, window=None):
+        """Render many plans on the crypto worker pool, yielding (plan, image) in input order
+        
+        Cached images are yielded without rendering. Misses are rendered in
+        windows of plans spread over the pool's workers, so results start
+        streaming before the whole batch is done.
+        
+        Args:
+            plans: Plans from plan_qr()
+            use_cache: Look up and store images in the QR image cache
+            executor: CryptoExecutor to use (defaults to the process-wide pool)
+            window: Plans rendered per round trip to the pool (defaults to
+                QR_BATCH_PER_WORKER plans per worker)
+        """
+        if executor is None:
+            from utils.crypto_executor import get_crypto_executor
+            executor = get_crypto_executor()
+        cache = get_qr_cache() if use_cache else None
+        per_worker = int(os.environ.get('QR_BATCH_PER_WORKER', 4))
+        window = window or max(1, executor.parallelism * per_worker)
+        
+        for start in range(0, len(plans), window):
+            chunk = plans[start:start + window]
+            images = [cache.get(plan['key']) if cache is not None else None for plan in chunk]
+            missing = [i for i, image in enumerate(images) if image is None]
+            if missing:
+                jobs = max(1, min(executor.parallelism, len(missing)))
+                per_job = -(-len(missing) // jobs)
+                batches = [missing[i:i + per_job] for i in range(0, len(missing), per_job)]
+                rendered = executor.map(render_plan_batch, [([chunk[i] for i in batch],) for batch in batches])
+                for batch, batch_images in zip(batches, rendered):
+                    for i, (image, seconds) in zip(batch, batch_images):
+                        _observe_render(chunk[i], image, seconds)
+                        images[i] = image
+                        if cache is not None:
+                            cache.put(chunk[i]['key'], image)
+            yield from zip(chunk, images)
+
+    @staticmethod
+    def _make_qr(plan):
+        qr = qrcode.QRCode(
+            version=plan['info']['version'],
+            error_correction=qr_policy.EC_LEVELS[plan['info']['error_correction']],
+            box_size=plan['box_size'],
+            border=QR_BORDER,
+        )
+        qr.add_data(plan['payload'])
+        qr.make(fit=False)
+        return qr
+
+    @staticmethod
+    def _render(plan):
+        qr = QRGenerator._make_qr(plan)
         
-        # Resize if needed
-        if size != 400:
-            img = img.resize((size, size), Image.Resampling.LANCZOS)
+        if plan['format'] == FORMAT_SVG:
+            return qr.make_image(image_factory=SvgPathFillImage).to_string()
+        return QRGenerator._rasterize_png(qr, plan['box_size'])
+
+    @staticmethod
+    def _rasterize_png(qr, box_size, renderer=None):
+        """Encode a built QR code as PNG with the NumPy renderer or qrcode's PIL factory"""
+        if (renderer or qr_raster.default_renderer()) == qr_raster.RENDERER_NUMPY:
+            return qr_raster.render_png(qr.get_matrix(), box_size)
         
-        # Convert to base64
+        img = qr.make_image(fill_color="black", back_color="white")
         buffered = BytesIO()
         img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        return buffered.getvalue()
+
+    @staticmethod
+    def render_qr(data, size=None, secure=True, use_cache=True, target=None, error_correction=None,
+                  max_version=None, image_format=FORMAT_PNG, source=None):
+        """Render a QR code image with error correction and version chosen by the QR policy
+        Args:
+            data: Data to encode (dict or string)
+            size: Approximate edge length of the PNG in pixels (modules are whole
+                pixels); None keeps the default 10-pixel modules
+            secure: If True, encodes data to hide sensitive information
+            use_cache: If False, always render a fresh image
+            target: 'screen', 'print' or 'email' (see utils.qr_policy)
+            error_correction: Force a level ('L', 'M', 'Q' or 'H')
+            max_version: Lower the target's version cap
+            image_format: 'png' or 'svg'
+            source: Label of the calling path for the qr.* histograms (see plan_qr)
+
+        Returns:
+            Tuple of (image bytes, dict with target, error_correction, version and modules)
+
+        Raises:
+            QRCapacityError: If the payload does not fit within the version cap
+        """
+        plan = QRGenerator.plan_qr(data, size, secure, image_format, target, error_correction, max_version, source)
+        return QRGenerator.render_plan(plan, use_cache), plan['info']
+
+    @staticmethod
+    def generate_qr_png(data, size=None, secure=True, use_cache=True, **policy):
+        """Generate QR code PNG bytes, reusing a cached rendering of the same payload
         
-        return img_str
+        Accepts the same arguments as render_qr.
+        """
+        return QRGenerator.render_qr(data, size, secure, use_cache, **policy)[0]
+
+    @staticmethod
+    def generate_qr_code_with_info(data, size=None, secure=True, use_cache=True, **policy):
+        """Like generate_qr_code, also returning the chosen error correction, version and modules"""
+        png, info = QRGenerator.render_qr(data, size, secure, use_cache, **policy)
+        return base64.b64encode(png).decode(), info
+
+    @staticmethod
+    def generate_qr_code(data, size=None, secure=True, use_cache=True, **policy):
+        """Generate QR code from data
+        Args:
+            data: Data to encode (dict or string)
+            size: Approximate edge length in pixels; None keeps the default 10-pixel modules
+            secure: If True, encodes data to hide sensitive information
+            use_cache: If False, always render a fresh image
+            **policy: target, error_correction, max_version, source (see render_qr)
+
+        Returns:
+            Base64-encoded PNG
+        """
+        return QRGenerator.generate_qr_code_with_info(data, size, secure, use_cache, **policy)[0]
     
     @staticmethod
     def generate_content_qr(content_id, encrypted_key, metadata):
@@ -0,0 +1,160 @@
+"""
+Dense binary encoding of embedded QR payloads.
+
+The original secure format is JSON, base64-encoded inside a 'qrs://v?d='
+URL and stored in QR byte mode: every JSON key is spelled out and base64
+inflates the (already base64) wrapped key a second time. The binary format
+carries the same payload in far fewer QR modules:
+
+    QRS://B/<base45 of: version byte | flags byte | body>
+
+    body: msgpack of the payload (zlib-deflated when flags & FLAG_DEFLATE)
+
+Known keys are replaced by their index in a versioned key table, 24-hex
+ObjectId strings are packed as 12 raw bytes and canonical base64 strings
+(wrapped keys) as their raw bytes, so decoding restores the original
+payload exactly. Base45 (RFC 9285) only uses the QR alphanumeric character
+set, which the QR encoder packs at 5.5 bits per character instead of 8.
+
+msgpack is optional: without it payloads fall back to the base64 JSON format.
+"""
+import re
+import zlib
+import base64
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BINARY_PREFIX = 'QRS://B/'
+FORMAT_VERSION = 1
+FLAG_DEFLATE = 0x01
+
+EXT_OBJECT_ID = 1
+EXT_BASE64 = 2
+
+BASE45_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+_BASE45_INDEX = {char: i for i, char in enumerate(BASE45_ALPHABET)}
+
+# Append only: a key's index is part of FORMAT_VERSION 1
+KEY_TABLE = (
+    'content_id', 'encrypted_key', 'sender_id', 'metadata', 'type', 'filename',
+    'content_type', 'size', 'length', 'is_public', 'encryption_level', 'encryption_name',
+    'cipher_suite', 'key_wrap', 'compression', 'password_hash', 'max_views', 'views',
+    'recipient_count', 'version', 'user_id', 'public_key', 'username',
+)
+_KEY_INDEX = {key: i for i, key in enumerate(KEY_TABLE)}
+
+_OBJECT_ID_RE = re.compile(r'^[0-9a-f]{24}$')
+_BASE64_RE = re.compile(r'^[A-Za-z0-9+/]{16,}={0,2}$')
+
+
+def available():
+    return msgpack is not None
+
+
+def base45_encode(data):
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        n = data[i] * 256 + data[i + 1]
+        n, c = divmod(n, 45)
+        e, d = divmod(n, 45)
+        chars += (BASE45_ALPHABET[c], BASE45_ALPHABET[d], BASE45_ALPHABET[e])
+    if len(data) % 2:
+        e, c = divmod(data[-1], 45)
+        chars += (BASE45_ALPHABET[c], BASE45_ALPHABET[e])
+    return ''.join(chars)
+
+
+def base45_decode(text):
+    try:
+        values = [_BASE45_INDEX[char] for char in text]
+    except KeyError:
+        raise ValueError("Invalid base45 character")
+    if len(values) % 3 == 1:
+        raise ValueError("Invalid base45 length")
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        n = sum(v * 45 ** j for j, v in enumerate(chunk))
+        if len(chunk) == 3:
+            if n > 0xFFFF:
+                raise ValueError("Invalid base45 chunk")
+            out.extend(divmod(n, 256))
+        else:
+            if n > 0xFF:
+                raise ValueError("Invalid base45 chunk")
+            out.append(n)
+    return bytes(out)
+
+
+def _pack_value(value):
+    if isinstance(value, dict):
+        return {_KEY_INDEX.get(key, key): _pack_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_pack_value(item) for item in value]
+    if isinstance(value, str):
+        if _OBJECT_ID_RE.match(value):
+            return msgpack.ExtType(EXT_OBJECT_ID, bytes.fromhex(value))
+        if len(value) % 4 == 0 and _BASE64_RE.match(value):
+            raw = base64.b64decode(value)
+            # Only canonical base64 is packed, so decoding restores the exact string
+            if base64.b64encode(raw).decode() == value:
+                return msgpack.ExtType(EXT_BASE64, raw)
+    return value
+
+
+def _unpack_value(value):
+    if isinstance(value, dict):
+        return {
+            (KEY_TABLE[key] if isinstance(key, int) and key < len(KEY_TABLE) else key): _unpack_value(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_unpack_value(item) for item in value]
+    return value
+
+
+def _ext_hook(code, data):
+    if code == EXT_OBJECT_ID:
+        return data.hex()
+    if code == EXT_BASE64:
+        return base64.b64encode(data).decode()
+    raise ValueError(f"Unknown QR payload extension type {code}")
+
+
+def encode(payload):
+    """Encode a payload dict as a QRS://B/ string"""
+    if msgpack is None:
+        raise RuntimeError("The msgpack package is required for binary QR payloads")
+    body = msgpack.packb(_pack_value(payload), use_bin_type=True)
+    flags = 0
+    deflated = zlib.compress(body, 9)
+    if len(deflated) < len(body):
+        body, flags = deflated, FLAG_DEFLATE
+    return BINARY_PREFIX + base45_encode(bytes([FORMAT_VERSION, flags]) + body)
+
+
+def is_binary(qr_data):
+    return isinstance(qr_data, str) and qr_data.startswith(BINARY_PREFIX)
+
+
+def decode(qr_data):
+    """Decode a QRS://B/ string back into the original payload dict
+
+    Raises:
+        ValueError: If the data is not a valid binary payload
+    """
+    if msgpack is None:
+        raise ValueError("The msgpack package is required to decode binary QR payloads")
+    raw = base45_decode(qr_data[len(BINARY_PREFIX):])
+    if len(raw) < 2 or raw[0] != FORMAT_VERSION:
+        raise ValueError("Unsupported QR payload version")
+    body = raw[2:]
+    try:
+        if raw[1] & FLAG_DEFLATE:
+            body = zlib.decompress(body)
+        return _unpack_value(msgpack.unpackb(body, raw=False, strict_map_key=False, ext_hook=_ext_hook))
+    except (zlib.error, ValueError, TypeError) as e:
+        raise ValueError(f"Malformed QR payload: {e}")
@@ -0,0 +1,152 @@
+"""
+Error-correction and version policy for rendered QR codes.
+
+Every QR used to be rendered at ERROR_CORRECT_H with the version grown to
+fit, so large payloads ended up at very high versions: slow to render,
+large images and hard to scan. The policy picks the error-correction level
+from the payload and the target medium:
+
+    screen: shown on a display and scanned immediately; small and fast matters
+    print:  printed and possibly scuffed or partially covered; robustness matters
+    email:  embedded in mail clients that rescale and recompress images
+
+For a target, the most robust level whose version stays within the target's
+preferred version is used. If none does, the target's fallback decides among
+the levels that fit the version cap: 'compact' takes the smallest code
+(screens and mail, where module size limits scanning more than damage does),
+'robust' the most error correction (print). Callers may force a level and
+lower the cap.
+
+Configuration:
+    QR_DEFAULT_TARGET: Target used when a request does not name one (default 'screen')
+"""
+import os
+from functools import lru_cache
+import qrcode
+from qrcode import constants
+from qrcode.exceptions import DataOverflowError
+
+EC_LEVELS = {
+    'L': constants.ERROR_CORRECT_L,
+    'M': constants.ERROR_CORRECT_M,
+    'Q': constants.ERROR_CORRECT_Q,
+    'H': constants.ERROR_CORRECT_H,
+}
+
+TARGET_SCREEN = 'screen'
+TARGET_PRINT = 'print'
+TARGET_EMAIL = 'email'
+
+FALLBACK_COMPACT = 'compact'
+FALLBACK_ROBUST = 'robust'
+
+# levels: candidates, most robust first
+TARGET_POLICIES = {
+    TARGET_SCREEN: {'levels': ('H', 'Q', 'M', 'L'), 'preferred_version': 10, 'max_version': 25,
+                    'fallback': FALLBACK_COMPACT},
+    TARGET_PRINT: {'levels': ('H', 'Q', 'M'), 'preferred_version': 25, 'max_version': 40,
+                   'fallback': FALLBACK_ROBUST},
+    TARGET_EMAIL: {'levels': ('Q', 'M', 'L'), 'preferred_version': 15, 'max_version': 30,
+                   'fallback': FALLBACK_COMPACT},
+}
+
+MAX_VERSION = 40
+
+
+class QRCapacityError(ValueError):
+    """The payload does not fit any allowed error-correction level and version"""
+
+
+def default_target():
+    target = os.environ.get('QR_DEFAULT_TARGET', TARGET_SCREEN).lower()
+    return target if target in TARGET_POLICIES else TARGET_SCREEN
+
+
+def module_count(version):
+    """Modules per side of a QR version (without the quiet zone)"""
+    return version * 4 + 17
+
+
+def validate_options(target=None, error_correction=None, max_version=None):
+    """Check client-supplied policy options
+
+    Returns:
+        Tuple of (is_valid, error_message)
+    """
+    if target is not None and target not in TARGET_POLICIES:
+        return False, f"Unknown QR target '{target}' (expected one of: {', '.join(TARGET_POLICIES)})"
+    if error_correction is not None and str(error_correction).upper() not in EC_LEVELS:
+        return False, "QR error correction must be one of L, M, Q, H"
+    if max_version is not None:
+        try:
+            max_version = int(max_version)
+        except (TypeError, ValueError):
+            return False, "QR max version must be a number"
+        if not 1 <= max_version <= MAX_VERSION:
+            return False, f"QR max version must be between 1 and {MAX_VERSION}"
+    return True, None
+
+
+def _min_versions(payload, levels):
+    """Smallest version per level (None when the payload does not fit at all)"""
+    qr = qrcode.QRCode(error_correction=EC_LEVELS[levels[0]])
+    qr.add_data(payload)
+    versions = {}
+    for level in levels:
+        qr.error_correction = EC_LEVELS[level]
+        try:
+            versions[level] = qr.best_fit()
+        except (ValueError, DataOverflowError):
+            versions[level] = None
+    return versions
+
+
+def choose(payload, target=None, error_correction=None, max_version=None):
+    """Pick error correction and version for a payload
+
+    Args:
+        payload: Encoded QR string
+        target: 'screen', 'print' or 'email' (defaults to default_target())
+        error_correction: Force a level ('L', 'M', 'Q' or 'H')
+        max_version: Lower the target's version cap
+
+    Returns:
+        Dict with target, error_correction (letter), version and modules
+
+    Raises:
+        QRCapacityError: If the payload does not fit within the version cap
+    """
+    target = target or default_target()
+    level, version = _choose(
+        payload, target,
+        error_correction.upper() if error_correction else None,
+        int(max_version) if max_version else None
+    )
+    return {
+        'target': target,
+        'error_correction': level,
+        'version': version,
+        'modules': module_count(version)
+    }
+
+
+@lru_cache(maxsize=1024)
+def _choose(payload, target, error_correction, max_version):
+    policy = TARGET_POLICIES[target]
+    cap = min(max_version, policy['max_version']) if max_version else policy['max_version']
+    levels = (error_correction,) if error_correction else policy['levels']
+    versions = _min_versions(payload, levels)
+
+    fitting = [level for level in levels if versions[level] is not None and versions[level] <= cap]
+    if not fitting:
+        raise QRCapacityError(
+            f"Payload of {len(payload)} characters does not fit a QR code of version {cap} or lower"
+        )
+    preferred = [level for level in fitting if versions[level] <= policy['preferred_version']]
+    if preferred:
+        level = preferred[0]
+    elif policy['fallback'] == FALLBACK_COMPACT:
+        level = fitting[-1]
+    else:
+        level = fitting[0]
+    return level, versions[level]
@@ -0,0 +1,146 @@
+"""
+Background pre-rendering of share QR images.
+
+The share routes used to render the QR PNG inline and return it as base64
+in the 201 response. They now only plan the image (payload, version, cache
+key), schedule it here and return its content-addressed URL. A background
+worker renders scheduled plans in small batches on the crypto worker pool
+and stores them in the QR image cache; with QR_CACHE_PERSIST=disk or gridfs
+the PNG is also persisted under its content-hash key.
+
+A request for the URL that arrives before the render finished waits for it
+up to QR_PRERENDER_WAIT seconds, then renders on demand.
+
+Configuration:
+    QR_PRERENDER: 'background' (default) or 'off' to render on first request only
+    QR_PRERENDER_BATCH: Plans rendered per batch (default 8)
+    QR_PRERENDER_WAIT: Seconds an image request waits for a pending render (default 2)
+"""
+import os
+import time
+import threading
+from collections import deque
+from utils import metrics
+
+
+class QRPrerenderer:
+    def __init__(self, batch_size=8, enabled=True, executor=None):
+        """
+        Args:
+            batch_size: Most plans handed to the worker pool in one batch
+            enabled: When False, schedule() does nothing and images render on first request
+            executor: CryptoExecutor to render on (defaults to the process-wide pool)
+        """
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.executor = executor
+        self._queue = deque()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            batch_size=int(os.environ.get('QR_PRERENDER_BATCH', 8)),
+            enabled=os.environ.get('QR_PRERENDER', 'background').lower() != 'off'
+        )
+
+    def start(self):
+        """Start the background render worker (idempotent)"""
+        if self._worker is not None or not self.enabled:
+            return
+        self._worker = threading.Thread(target=self._run, name='qr-prerender', daemon=True)
+        self._worker.start()
+
+    def schedule(self, plan):
+        """Queue a plan_qr() plan for rendering unless it is already queued"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if plan['key'] in self._pending:
+                return
+            self._pending[plan['key']] = threading.Event()
+            self._queue.append(plan)
+            depth = len(self._queue)
+        metrics.inc('qr_prerender.scheduled')
+        metrics.set_gauge('qr_prerender.queue_depth', depth)
+        self.start()
+        self._wakeup.set()
+
+    def is_pending(self, key):
+        return key in self._pending
+
+    def wait(self, key, timeout=None):
+        """Wait until a scheduled image has been rendered
+
+        Returns:
+            True if the key is not (or no longer) pending
+        """
+        event = self._pending.get(key)
+        if event is None:
+            return True
+        if timeout is None:
+            timeout = float(os.environ.get('QR_PRERENDER_WAIT', 2))
+        started = time.perf_counter()
+        done = event.wait(timeout)
+        metrics.observe('qr_prerender.wait_seconds', time.perf_counter() - started)
+        return done
+
+    def _take_batch(self):
+        with self._lock:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            metrics.set_gauge('qr_prerender.queue_depth', len(self._queue))
+        return batch
+
+    def _finish(self, plans):
+        with self._lock:
+            events = [self._pending.pop(plan['key'], None) for plan in plans]
+        for event in events:
+            if event is not None:
+                event.set()
+
+    def render_pending(self):
+        """Render everything queued so far (the worker loop; also usable inline)"""
+        from utils.qr_generator import QRGenerator
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            started = time.perf_counter()
+            try:
+                # render_plans stores every image in the QR image cache (and its persistent store)
+                for _ in QRGenerator.render_plans(batch, executor=self.executor):
+                    pass
+                metrics.inc('qr_prerender.rendered', len(batch))
+            except Exception as e:
+                # Waiters fall back to rendering on demand
+                metrics.inc('qr_prerender.failed', len(batch))
+                print(f"[WARNING] QR pre-render failed: {e}")
+            finally:
+                metrics.observe('qr_prerender.batch_seconds', time.perf_counter() - started)
+                self._finish(batch)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            self.render_pending()
+
+
+_prerenderer = None
+
+
+def init_qr_prerenderer():
+    """Create the process-wide QR pre-renderer from QR_PRERENDER_* settings"""
+    global _prerenderer
+    _prerenderer = QRPrerenderer.from_env()
+    return _prerenderer
+
+
+def get_qr_prerenderer():
+    global _prerenderer
+    if _prerenderer is None:
+        _prerenderer = QRPrerenderer.from_env()
+    return _prerenderer
@@ -0,0 +1,76 @@
+"""
+Vectorized PNG renderer for QR module matrices.
+
+The qrcode PIL image factory draws every dark module as a separate
+rectangle and then hands the image to PIL's PNG encoder; at high versions
+and large box sizes that dominates render time. This renderer scales the
+module matrix from qr.get_matrix() with NumPy and writes the PNG itself:
+
+    - each module row is widened with np.repeat and bit-packed once
+    - the packed row is repeated box_size times (all pixel rows of a
+      module row are identical)
+    - the rows go into a single IDAT chunk of a 1-bit greyscale PNG
+
+The output has the same dimensions, colour type (1-bit greyscale, like PIL
+mode '1') and pixels as the PIL path. NumPy is optional; without it
+QRGenerator keeps using PIL.
+
+Configuration:
+    QR_RENDERER: 'auto' (default: numpy if installed), 'numpy' or 'pil'
+"""
+import os
+import zlib
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COMPRESSION_LEVEL = 6
+RENDERER_NUMPY = 'numpy'
+RENDERER_PIL = 'pil'
+
+
+def available():
+    return np is not None
+
+
+def default_renderer():
+    setting = os.environ.get('QR_RENDERER', 'auto').lower()
+    if setting == RENDERER_PIL or not available():
+        return RENDERER_PIL
+    return RENDERER_NUMPY
+
+
+def _chunk(chunk_type, data):
+    return (struct.pack('>I', len(data)) + chunk_type + data +
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+def render_png(matrix, box_size):
+    """Render a QR module matrix (rows of booleans, True = dark, quiet zone included) as PNG bytes
+
+    Args:
+        matrix: Output of qrcode.QRCode.get_matrix()
+        box_size: Pixels per module
+    """
+    # White is 1 in a greyscale PNG, dark modules are 0
+    modules = ~np.asarray(matrix, dtype=bool)
+    width = modules.shape[1] * box_size
+    height = modules.shape[0] * box_size
+
+    packed = np.packbits(np.repeat(modules, box_size, axis=1), axis=1)
+    # Every scanline starts with filter type 0 (None)
+    scanlines = np.zeros((packed.shape[0], packed.shape[1] + 1), dtype=np.uint8)
+    scanlines[:, 1:] = packed
+    raw = np.repeat(scanlines, box_size, axis=0).tobytes()
+
+    header = struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0)  # 1-bit greyscale
+    return b''.join((
+        PNG_SIGNATURE,
+        _chunk(b'IHDR', header),
+        _chunk(b'IDAT', zlib.compress(raw, PNG_COMPRESSION_LEVEL)),
+        _chunk(b'IEND', b'')
+    ))
@@ -0,0 +1,173 @@
+"""
+Server-side decoding of QR codes in uploaded images.
+
+Browsers decode camera frames and screenshots with jsQR, which is slow on
+low-end phones and misses codes in large or low-contrast photos. Uploaded
+images are decoded here with zbar instead (pyzbar; libzbar0 is installed in
+the Docker image):
+
+    1. normalise: apply the EXIF orientation, flatten transparency onto
+       white, convert to greyscale
+    2. downscale so the longest edge is at most QR_DECODE_MAX_EDGE; phone
+       photos are far larger than zbar needs and decode time grows with area
+    3. scan the greyscale image; if nothing is found, scan again after
+       autocontrast and after a global (Otsu) binarization, which recover
+       washed-out screenshots and unevenly lit prints
+
+zbar reports every QR code in the image, so one upload can carry several.
+Decoding is CPU-bound and runs on the crypto worker pool.
+
+pyzbar is optional: without it (or without the zbar library) available()
+is False and callers answer with 503.
+
+Configuration:
+    QR_DECODE_MAX_BYTES: Largest accepted upload (default 10MB)
+    QR_DECODE_MAX_EDGE: Longest edge after downscaling (default 1600 px)
+    QR_DECODE_MAX_PIXELS: Largest accepted image area before downscaling (default 40 megapixels)
+"""
+import os
+from io import BytesIO
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+try:
+    from pyzbar import pyzbar
+    from pyzbar.pyzbar import ZBarSymbol
+except ImportError:
+    # Also raised when the zbar shared library is missing
+    pyzbar = None
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_EDGE = 1600
+DEFAULT_MAX_PIXELS = 40_000_000
+
+STAGE_GREYSCALE = 'greyscale'
+STAGE_AUTOCONTRAST = 'autocontrast'
+STAGE_BINARIZED = 'binarized'
+
+
+def available():
+    return pyzbar is not None
+
+
+def max_upload_bytes():
+    return int(os.environ.get('QR_DECODE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def otsu_threshold(image):
+    """Global threshold of a greyscale image that best separates dark and light pixels"""
+    histogram = image.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_dark = weight_dark = 0
+    best_threshold, best_variance = 0, -1.0
+    for threshold, count in enumerate(histogram):
+        weight_dark += count
+        if weight_dark == 0:
+            continue
+        weight_light = total - weight_dark
+        if weight_light == 0:
+            break
+        sum_dark += threshold * count
+        mean_dark = sum_dark / weight_dark
+        mean_light = (sum_all - sum_dark) / weight_light
+        variance = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = threshold, variance
+    return best_threshold
+
+
+def preprocess(image_bytes, max_edge=None):
+    """Normalise and downscale an uploaded image
+
+    Returns:
+        Tuple of (greyscale image, scale factor from original to processed coordinates)
+
+    Raises:
+        ValueError: If the data is not a readable image or is too large
+    """
+    max_edge = max_edge or int(os.environ.get('QR_DECODE_MAX_EDGE', DEFAULT_MAX_EDGE))
+    max_pixels = int(os.environ.get('QR_DECODE_MAX_PIXELS', DEFAULT_MAX_PIXELS))
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"Image is too large ({image.width}x{image.height})")
+        original_edge = max(image.size)
+        # JPEG decoders can skip most of the work when a reduced size is enough
+        image.draft('L', (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Invalid image: {e}")
+
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Transparent pixels would turn black; QR codes are dark on light
+        background = Image.new('RGBA', image.size, 'white')
+        image = Image.alpha_composite(background, image.convert('RGBA'))
+    image = image.convert('L')
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    return image, max(image.size) / original_edge
+
+
+def candidates(image):
+    """Preprocessed variants of a greyscale image, cheapest first, as (stage, image)"""
+    yield STAGE_GREYSCALE, image
+    contrasted = ImageOps.autocontrast(image, cutoff=1)
+    yield STAGE_AUTOCONTRAST, contrasted
+    threshold = otsu_threshold(contrasted)
+    yield STAGE_BINARIZED, contrasted.point(lambda value: 255 if value > threshold else 0)
+
+
+def _text(data):
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def decode_image(image_bytes, max_edge=None):
+    """Find and decode every QR code in an image
+
+    Args:
+        image_bytes: Encoded image (PNG, JPEG, WebP, ...)
+        max_edge: Longest edge after downscaling (defaults to QR_DECODE_MAX_EDGE)
+
+    Returns:
+        List of dicts with data, rect (left, top, width, height in original
+        image pixels) and stage (preprocessing step that found the codes);
+        empty when no QR code was found
+
+    Raises:
+        ValueError: If the data is not a readable image
+        RuntimeError: If pyzbar / zbar is not installed
+    """
+    if pyzbar is None:
+        raise RuntimeError("pyzbar and the zbar library are required to decode QR images")
+    image, scale = preprocess(image_bytes, max_edge)
+    for stage, candidate in candidates(image):
+        symbols = pyzbar.decode(candidate, symbols=[ZBarSymbol.QRCODE])
+        if symbols:
+            break
+    else:
+        return []
+
+    codes = []
+    seen = set()
+    for symbol in symbols:
+        data = _text(symbol.data)
+        if data in seen:
+            continue
+        seen.add(data)
+        left, top, width, height = symbol.rect
+        codes.append({
+            'data': data,
+            'rect': {
+                'left': round(left / scale),
+                'top': round(top / scale),
+                'width': round(width / scale),
+                'height': round(height / scale)
+            },
+            'stage': stage
+        })
+    # Reading order: top to bottom, then left to right
+    codes.sort(key=lambda code: (code['rect']['top'], code['rect']['left']))
+    return codes
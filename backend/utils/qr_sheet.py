@@ -0,0 +1,293 @@
+"""
+Printable sheets of QR codes: paginated PDF, or PNG pages in a ZIP.
+
+Codes are laid out on a grid of columns x rows per page, each with a short
+label underneath. Whole pages are rendered on the crypto worker pool, a few
+pages per worker at a time, and written out as soon as they are ready, so
+memory stays bounded by the render window however many codes are printed.
+
+The PDF is written incrementally: every page is emitted as soon as it is
+rendered, and only the page tree, cross-reference table and trailer wait
+for the end. Each QR code is embedded as a 1-bit image with one pixel per
+module, scaled up by the page transform, so codes stay sharp at any
+printer resolution and cost a few hundred bytes each.
+
+PNG pages are rendered at the requested DPI with every module an integer
+number of pixels.
+
+Configuration:
+    QR_SHEET_MAX_CODES: Most codes on one sheet export (default 5000)
+    QR_SHEET_PAGES_PER_WORKER: Pages rendered per worker per round trip (default 2)
+"""
+import os
+import zlib
+from io import BytesIO
+from PIL import Image, ImageDraw
+from utils.qr_generator import QRGenerator
+from utils.qr_policy import QRCapacityError, TARGET_PRINT
+from utils.streaming import iter_zip
+
+POINTS_PER_INCH = 72
+PAGE_SIZES = {
+    'a4': (595.28, 841.89),
+    'letter': (612.0, 792.0),
+}
+MARGIN = 36  # points
+LABEL_HEIGHT = 14  # points
+LABEL_FONT_SIZE = 7  # points
+MAX_GRID = 10
+
+DEFAULT_MAX_CODES = 5000
+
+
+def max_codes():
+    return int(os.environ.get('QR_SHEET_MAX_CODES', DEFAULT_MAX_CODES))
+
+
+def layout(page='a4', columns=3, rows=4, labels=True):
+    """Grid geometry of a sheet in points (origin bottom left, as in PDF)
+
+    Returns:
+        Dict with page size, grid and code size, and cells: the (x, y) of the
+        bottom left corner of each code, in reading order
+    """
+    width, height = PAGE_SIZES[page]
+    label_height = LABEL_HEIGHT if labels else 0
+    cell_width = (width - 2 * MARGIN) / columns
+    cell_height = (height - 2 * MARGIN) / rows
+    code_size = min(cell_width, cell_height - label_height) * 0.92
+    cells = []
+    for row in range(rows):
+        top = height - MARGIN - row * cell_height
+        for column in range(columns):
+            x = MARGIN + column * cell_width + (cell_width - code_size) / 2
+            y = top - (cell_height - label_height - code_size) / 2 - code_size
+            cells.append((x, y))
+    return {
+        'page': page,
+        'width': width,
+        'height': height,
+        'columns': columns,
+        'rows': rows,
+        'labels': labels,
+        'code_size': code_size,
+        'cells': cells
+    }
+
+
+def _module_bitmap(qr_data):
+    """Plan and build one code for print
+
+    Returns:
+        Tuple of (modules per side including the quiet zone, packed 1-bit rows
+        with white = 1), or None if the payload does not fit a QR code
+    """
+    try:
+        plan = QRGenerator.plan_qr(qr_data, secure=True, target=TARGET_PRINT)
+    except QRCapacityError:
+        return None
+    matrix = QRGenerator._make_qr(plan).get_matrix()
+    size = len(matrix)
+    padding = -size % 8
+    rows = bytearray()
+    for row in matrix:
+        bits = ''.join('0' if dark else '1' for dark in row) + '1' * padding
+        rows += int(bits, 2).to_bytes((size + padding) // 8, 'big')
+    return size, bytes(rows)
+
+
+def _pdf_text(text):
+    """Latin-1 PDF string literal (standard fonts have no glyphs beyond that)"""
+    text = text.encode('latin-1', 'replace').decode('latin-1')
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def _fit_label(label, width, font_size):
+    # Helvetica averages about half an em per character
+    max_chars = max(4, int(width / (font_size * 0.5)))
+    return label if len(label) <= max_chars else label[:max_chars - 3] + '...'
+
+
+def render_pdf_page(cells, sheet):
+    """Render one PDF page; module-level so crypto pool workers can run it
+
+    Args:
+        cells: List of (qr_data, label) for this page
+        sheet: Geometry from layout()
+
+    Returns:
+        Tuple of (content stream, list of (modules, deflated 1-bit image data))
+    """
+    size = sheet['code_size']
+    commands = []
+    images = []
+    for (qr_data, label), (x, y) in zip(cells, sheet['cells']):
+        bitmap = _module_bitmap(qr_data)
+        if bitmap is None:
+            label = 'QR code too large: ' + label
+        else:
+            modules, data = bitmap
+            images.append((modules, zlib.compress(data, 9)))
+            commands.append(f'q {size:.2f} 0 0 {size:.2f} {x:.2f} {y:.2f} cm /Im{len(images)} Do Q')
+        if sheet['labels'] and label:
+            text = _pdf_text(_fit_label(label, size, LABEL_FONT_SIZE))
+            commands.append(f'BT /F1 {LABEL_FONT_SIZE} Tf {x:.2f} {y - LABEL_FONT_SIZE - 2:.2f} Td {text} Tj ET')
+    return '\n'.join(commands).encode('latin-1'), images
+
+
+def render_png_page(cells, sheet, dpi):
+    """Render one sheet page as PNG; module-level so crypto pool workers can run it"""
+    scale = dpi / POINTS_PER_INCH
+    page = Image.new('1', (round(sheet['width'] * scale), round(sheet['height'] * scale)), 1)
+    draw = ImageDraw.Draw(page)
+    code_pixels = int(sheet['code_size'] * scale)
+    for (qr_data, label), (x, y) in zip(cells, sheet['cells']):
+        left = round(x * scale)
+        top = round((sheet['height'] - y - sheet['code_size']) * scale)
+        bitmap = _module_bitmap(qr_data)
+        if bitmap is None:
+            label = 'QR code too large: ' + label
+        else:
+            modules, data = bitmap
+            # Whole pixels per module keep the modules crisp; centre what is left over
+            box = max(1, code_pixels // modules)
+            offset = (code_pixels - box * modules) // 2
+            code = Image.frombytes('1', (modules, modules), data).resize(
+                (box * modules, box * modules), Image.Resampling.NEAREST)
+            page.paste(code, (left + offset, top + offset))
+        if sheet['labels'] and label:
+            draw.text((left, top + code_pixels + 2), _fit_label(label, sheet['code_size'], LABEL_FONT_SIZE), fill=0)
+    buffered = BytesIO()
+    page.save(buffered, format='PNG', dpi=(dpi, dpi))
+    return buffered.getvalue()
+
+
+def _pages(codes, per_page):
+    page = []
+    for code in codes:
+        page.append(code)
+        if len(page) == per_page:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def _render_pages(codes, sheet, fn, extra_args, executor):
+    """Render pages on the worker pool in windows, yielding results in page order"""
+    if executor is None:
+        from utils.crypto_executor import get_crypto_executor
+        executor = get_crypto_executor()
+    per_worker = int(os.environ.get('QR_SHEET_PAGES_PER_WORKER', 2))
+    window_size = max(1, executor.parallelism * per_worker)
+    window = []
+    for page in _pages(codes, len(sheet['cells'])):
+        window.append((page, sheet) + extra_args)
+        if len(window) == window_size:
+            yield from executor.map(fn, window)
+            window = []
+    if window:
+        yield from executor.map(fn, window)
+
+
+class PDFStreamWriter:
+    """Minimal PDF writer that emits each page as soon as it is added
+
+    Object 1 is the catalog, 2 the page tree and 3 the label font; they are
+    referenced up front and the page tree is written last, once all its
+    kids are known.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.offsets = {}
+        self.position = 0
+        self.next_object = 4
+        self.pages = []
+
+    def _emit(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        parts = [f'{number} 0 obj\n'.encode(), body]
+        if stream is not None:
+            parts += [b'\nstream\n', stream, b'\nendstream']
+        parts.append(b'\nendobj\n')
+        data = b''.join(parts)
+        self.position += len(data)
+        return data
+
+    def _allocate(self):
+        number = self.next_object
+        self.next_object += 1
+        return number
+
+    def _write(self, data):
+        self.position += len(data)
+        return data
+
+    def begin(self):
+        return b''.join([
+            self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'),
+            self._emit(1, b'<< /Type /Catalog /Pages 2 0 R >>'),
+            self._emit(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        ])
+
+    def add_page(self, content, images):
+        """Write a page from render_pdf_page() output"""
+        chunks = []
+        xobjects = []
+        for index, (modules, data) in enumerate(images, start=1):
+            number = self._allocate()
+            chunks.append(self._emit(number, (
+                f'<< /Type /XObject /Subtype /Image /Width {modules} /Height {modules} '
+                f'/ColorSpace /DeviceGray /BitsPerComponent 1 /Interpolate false '
+                f'/Filter /FlateDecode /Length {len(data)} >>').encode(), data))
+            xobjects.append(f'/Im{index} {number} 0 R')
+        content = zlib.compress(content, 9)
+        content_number = self._allocate()
+        chunks.append(self._emit(content_number,
+                                 f'<< /Filter /FlateDecode /Length {len(content)} >>'.encode(), content))
+        page_number = self._allocate()
+        chunks.append(self._emit(page_number, (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.width:.2f} {self.height:.2f}] '
+            f'/Resources << /Font << /F1 3 0 R >> /XObject << {" ".join(xobjects)} >> >> '
+            f'/Contents {content_number} 0 R >>').encode()))
+        self.pages.append(page_number)
+        return b''.join(chunks)
+
+    def finish(self):
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        chunks = [self._emit(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'.encode())]
+        xref_offset = self.position
+        xref = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        xref += [f'{self.offsets[number]:010d} 00000 n \n' for number in range(1, self.next_object)]
+        chunks.append(''.join(xref).encode())
+        chunks.append((f'trailer\n<< /Size {self.next_object} /Root 1 0 R >>\n'
+                       f'startxref\n{xref_offset}\n%%EOF\n').encode())
+        return b''.join(chunks)
+
+
+def iter_pdf(codes, sheet, executor=None):
+    """Stream a PDF sheet
+
+    Args:
+        codes: Iterable of (qr_data, label); may be a lazy database cursor
+        sheet: Geometry from layout()
+        executor: CryptoExecutor to render on (defaults to the process-wide pool)
+
+    Yields:
+        Chunks of the PDF, one per page plus header and trailer
+    """
+    writer = PDFStreamWriter(sheet['width'], sheet['height'])
+    yield writer.begin()
+    for content, images in _render_pages(codes, sheet, render_pdf_page, (), executor):
+        yield writer.add_page(content, images)
+    if not writer.pages:
+        yield writer.add_page(b'', [])
+    yield writer.finish()
+
+
+def iter_png_zip(codes, sheet, dpi=150, executor=None):
+    """Stream a ZIP of PNG sheet pages (page-001.png, page-002.png, ...)"""
+    pages = _render_pages(codes, sheet, render_png_page, (dpi,), executor)
+    return iter_zip((f'page-{number:03d}.png', png) for number, png in enumerate(pages, start=1))
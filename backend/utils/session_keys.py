@@ -0,0 +1,222 @@
+"""
+Session key store for decrypted user private keys.
+
+Login used to write the decrypted private keys back into the users
+collection, and every decode read them back. Keys now live only here, for
+the lifetime of the login session. Decode unwraps content keys with them on
+the crypto worker pool, where the loaded RSA key is cached by fingerprint,
+so the RSA decrypt never runs on the event loop.
+
+A session is identified by the jti of the access token issued at login. The
+refresh token carries it as the 'skid' claim and refreshed access tokens keep
+it, so one login session maps to one entry however often the access token is
+refreshed. Entries expire after the access-token lifetime unless a refresh
+extends them.
+
+The in-process store is the default (single eventlet worker). With
+SESSION_KEY_STORE=redis the keys are additionally kept in Redis, encrypted
+with a key derived from SESSION_KEY_SECRET (or SECRET_KEY), so they survive a
+worker restart and can be shared between workers; entries are still cached
+in-process.
+
+Configuration:
+    SESSION_KEY_STORE: 'memory' (default) or 'redis'
+    REDIS_URL: Redis connection URL when SESSION_KEY_STORE=redis
+    SESSION_KEY_SECRET: Secret used to encrypt keys in Redis (defaults to SECRET_KEY)
+"""
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+from cryptography.fernet import Fernet
+from utils import metrics
+
+REDIS_KEY_PREFIX = 'session_keys:'
+
+
+class SessionKeys:
+    """Serialized private keys of one login session
+
+    Keys are kept serialized (RSA as PEM text or DER bytes, X25519 as base64
+    raw bytes) so unwrapping can run on the crypto worker pool; the workers
+    cache the loaded RSA key under rsa_fingerprint.
+    """
+
+    __slots__ = ('user_id', 'rsa', 'x25519', 'rsa_fingerprint')
+
+    def __init__(self, user_id, rsa=None, x25519=None):
+        self.user_id = str(user_id)
+        self.rsa = rsa
+        self.x25519 = x25519
+        self.rsa_fingerprint = None
+        if rsa:
+            self.rsa_fingerprint = hashlib.sha256(rsa.encode() if isinstance(rsa, str) else rsa).hexdigest()
+
+    @classmethod
+    def from_serialized(cls, user_id, private_key_pem=None, ec_private_key_b64=None):
+        """Keys as returned by decrypt_private_key (PEM text / base64 raw X25519)"""
+        return cls(user_id, private_key_pem or None, ec_private_key_b64 or None)
+
+    def to_json(self):
+        data = {'user_id': self.user_id}
+        if self.rsa:
+            data['rsa'] = self.rsa if isinstance(self.rsa, str) else base64.b64encode(self.rsa).decode()
+        if self.x25519:
+            data['x25519'] = self.x25519
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        rsa_key = data.get('rsa')
+        if rsa_key and not rsa_key.startswith('-----BEGIN'):
+            # Base64 PKCS8 DER
+            rsa_key = base64.b64decode(rsa_key)
+        return cls(data['user_id'], rsa_key, data.get('x25519'))
+
+
+class SessionKeyStore:
+    def __init__(self, ttl=3600, redis_client=None, secret=None):
+        """
+        Args:
+            ttl: Seconds an entry lives without being extended
+            redis_client: Optional redis.Redis client for the shared backing store
+            secret: Secret used to encrypt entries stored in Redis
+        """
+        self.ttl = ttl
+        self.redis = redis_client
+        self._fernet = None
+        if redis_client is not None:
+            if not secret:
+                raise ValueError("A secret is required to store session keys in Redis")
+            self._fernet = Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, session_id, keys):
+        """Store the loaded keys of a login session"""
+        with self._lock:
+            self._prune()
+            self._entries[session_id] = (keys, time.monotonic() + self.ttl)
+            metrics.set_gauge('session_keys.size', len(self._entries))
+        if self.redis is not None:
+            try:
+                self.redis.setex(REDIS_KEY_PREFIX + session_id, int(self.ttl),
+                                 self._fernet.encrypt(keys.to_json().encode()))
+            except Exception as e:
+                print(f"[WARNING] Session key store (Redis) unavailable: {e}")
+        metrics.inc('session_keys.stored')
+
+    def get(self, session_id, user_id):
+        """Return the SessionKeys of a session, or None if absent, expired or not the user's"""
+        keys = None
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                if entry[1] < time.monotonic():
+                    del self._entries[session_id]
+                else:
+                    keys = entry[0]
+        if keys is None and self.redis is not None:
+            keys = self._get_from_redis(session_id)
+        if keys is None or keys.user_id != str(user_id):
+            metrics.inc('session_keys.misses')
+            return None
+        metrics.inc('session_keys.hits')
+        return keys
+
+    def _get_from_redis(self, session_id):
+        try:
+            stored = self.redis.get(REDIS_KEY_PREFIX + session_id)
+            if stored is None:
+                return None
+            ttl = self.redis.ttl(REDIS_KEY_PREFIX + session_id)
+            keys = SessionKeys.from_json(self._fernet.decrypt(stored).decode())
+        except Exception as e:
+            print(f"[WARNING] Session key store (Redis) unavailable: {e}")
+            return None
+        with self._lock:
+            self._entries[session_id] = (keys, time.monotonic() + (ttl if ttl and ttl > 0 else self.ttl))
+        return keys
+
+    def touch(self, session_id):
+        """Extend a session's lifetime (called when its access token is refreshed)"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries[session_id] = (entry[0], time.monotonic() + self.ttl)
+        if self.redis is not None:
+            try:
+                self.redis.expire(REDIS_KEY_PREFIX + session_id, int(self.ttl))
+            except Exception as e:
+                print(f"[WARNING] Session key store (Redis) unavailable: {e}")
+
+    def drop(self, session_id):
+        """Forget a session's keys (logout)"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+            metrics.set_gauge('session_keys.size', len(self._entries))
+        if self.redis is not None:
+            try:
+                self.redis.delete(REDIS_KEY_PREFIX + session_id)
+            except Exception as e:
+                print(f"[WARNING] Session key store (Redis) unavailable: {e}")
+
+    def drop_user(self, user_id):
+        """Forget every in-process session of a user (account deletion)
+
+        Redis entries of other workers are left to expire with their TTL.
+        """
+        user_id = str(user_id)
+        with self._lock:
+            session_ids = [sid for sid, (keys, _) in self._entries.items() if keys.user_id == user_id]
+        for session_id in session_ids:
+            self.drop(session_id)
+
+    def _prune(self):
+        """Remove expired in-process entries (caller holds the lock)"""
+        now = time.monotonic()
+        expired = [sid for sid, (_, expires_at) in self._entries.items() if expires_at < now]
+        for session_id in expired:
+            del self._entries[session_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_store = None
+
+
+def init_session_key_store(ttl=3600):
+    """Create the process-wide session key store from SESSION_KEY_STORE settings"""
+    global _store
+    redis_client = None
+    if os.environ.get('SESSION_KEY_STORE', 'memory') == 'redis':
+        try:
+            import redis
+            redis_client = redis.Redis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+            redis_client.ping()
+            print("[INFO] Session keys stored in Redis")
+        except Exception as e:
+            print(f"[WARNING] Redis unavailable for session keys, using in-memory store: {e}")
+            redis_client = None
+    _store = SessionKeyStore(
+        ttl=ttl,
+        redis_client=redis_client,
+        secret=os.environ.get('SESSION_KEY_SECRET') or os.environ.get('SECRET_KEY')
+    )
+    return _store
+
+
+def get_session_key_store():
+    global _store
+    if _store is None:
+        _store = SessionKeyStore()
+    return _store
+
+
+def session_id_from_claims(claims):
+    """Session id of a decoded JWT: the 'skid' claim, or the jti of a login access token"""
+    return claims.get('skid') or claims.get('jti')
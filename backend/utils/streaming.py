@@ -0,0 +1,53 @@
+"""
+Helpers for streaming generated archives in HTTP responses.
+
+zipfile can write to an unseekable stream (sizes and CRCs then follow each
+member in a data descriptor), so an archive can be sent while its members
+are still being produced instead of being assembled in memory first.
+"""
+import time
+import zipfile
+
+
+class _ChunkSink:
+    """Write-only file object collecting what zipfile writes"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_zip(members, compress=False):
+    """Build a ZIP archive incrementally
+
+    Args:
+        members: Iterable of (name, bytes) pairs
+        compress: Deflate members (leave off for already compressed data such as PNG)
+
+    Yields:
+        Chunks of the archive; one per member, then the central directory
+    """
+    sink = _ChunkSink()
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(sink, 'w', compression=compression) as archive:
+        for name, data in members:
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = compression
+            archive.writestr(info, data)
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
@@ -959,7 +959,7 @@ window.downloadQRCode = function(messageId, qrDataUrl) {
         // If called from modal without parameters, use currentQRData
         if (!messageId && !qrDataUrl && window.currentQRData) {
             const link = document.createElement('a');
-            link.href = `data:image/png;base64,${window.currentQRData}`;
+            link.href = window.qrImageSrc ? window.qrImageSrc(window.currentQRData) : `data:image/png;base64,${window.currentQRData}`;
             link.download = `secure-qr-${Date.now()}.png`;
             document.body.appendChild(link);
             link.click();
@@ -321,7 +321,7 @@ window.shareFileViaQR = async function(fileName) {
         const result = await shareFile(file.file, receiverId, null, encryptionLevel);
         
         // Generate and display QR code
-        generateQRCode(result.qr_code, {
+        generateQRCode(result.qr_url || result.qr_code, {
             encryption_level: result.encryption_level,
             encryption_name: result.encryption_name
         });
@@ -271,6 +271,19 @@ function showPasswordPromptCard(qrData) {
 }
 
 // QR Code Generation
+// Image source for QR data from the API: a qr_url path or a base64 PNG
+function qrImageSrc(qrData) {
+    if (qrData.startsWith('/api/')) {
+        return `${API_BASE_URL}${qrData.slice('/api'.length)}`;
+    }
+    if (/^https?:\/\//.test(qrData)) {
+        return qrData;
+    }
+    return `data:image/png;base64,${qrData}`;
+}
+
+window.qrImageSrc = qrImageSrc;
+
 function generateQRCode(qrData, encryptionInfo = null) {
     console.log('generateQRCode called with data length:', qrData ? qrData.length : 0);
     
@@ -287,10 +300,10 @@ function generateQRCode(qrData, encryptionInfo = null) {
     
     modalQrImage.innerHTML = '';
     
-    // If qrData is base64 image data
+    // qrData is the image URL returned by the share routes, or base64 image data
     if (typeof qrData === 'string' && qrData.length > 0) {
         const img = document.createElement('img');
-        img.src = `data:image/png;base64,${qrData}`;
+        img.src = qrImageSrc(qrData);
         img.alt = 'QR Code';
         img.style.maxWidth = '100%';
         img.style.height = 'auto';
@@ -318,7 +331,7 @@ function generateQRCode(qrData, encryptionInfo = null) {
 function downloadQRCode() {
     if (window.currentQRData) {
         const link = document.createElement('a');
-        link.href = `data:image/png;base64,${window.currentQRData}`;
+        link.href = qrImageSrc(window.currentQRData);
         link.download = `secure-qr-${Date.now()}.png`;
         link.click();
     }
@@ -675,9 +688,9 @@ async function handleScannedQR(qrData) {
         const decodedData = decodeSecureQRData(qrData);
         console.log('Decoded structure:', decodedData);
         
-        if (decodedData && decodedData.content_id) {
+        if (decodedData && (decodedData.content_id || decodedData.compact)) {
             console.log('✓ Valid HideAnything.QR code detected!');
-            console.log('Content ID:', decodedData.content_id);
+            console.log('Content ID:', decodedData.content_id || '(compact format)');
             
             showSuccess('QR Code detected! Decrypting content...');
             
@@ -780,6 +793,11 @@ function decodeSecureQRData(rawData) {
     try {
         let encoded = null;
         
+        // Compact formats (reference token, binary payload) are decoded by the backend
+        if (rawData.toUpperCase().startsWith('QRS://T/') || rawData.startsWith('QRS://B/')) {
+            return { compact: rawData };
+        }
+        
         // Check if it's our secure format (new generic scheme)
         if (rawData.startsWith('qrs://v?d=')) {
             encoded = rawData.replace('qrs://v?d=', '');
@@ -833,7 +851,7 @@ async function decodeQRImage(file) {
                         const qrData = decodeSecureQRData(code.data);
                         console.log('Decoded image QR data:', qrData);
                         
-                        if (qrData && qrData.content_id) {
+                        if (qrData && (qrData.content_id || qrData.compact)) {
                             // Pass the RAW code.data string to backend
                             const result = await decodeContent(code.data);
                             displayDecryptedContent(result);
@@ -1113,7 +1131,7 @@ document.addEventListener('DOMContentLoaded', () => {
             
             try {
                 const result = await shareText(text, receiverId, expiresIn, encryptionLevel, password, maxViews);
-                generateQRCode(result.qr_code);
+                generateQRCode(result.qr_url || result.qr_code);
                 
                 // Build success message with security info
                 let successMsg = `Text shared with ${result.encryption_name} encryption!`;
@@ -1153,7 +1171,7 @@ document.addEventListener('DOMContentLoaded', () => {
             
             try {
                 const result = await shareFile(fileInput.files[0], receiverId, expiresIn, encryptionLevel, password, maxViews);
-                generateQRCode(result.qr_code);
+                generateQRCode(result.qr_url || result.qr_code);
                 
                 // Build success message with security info
                 let successMsg = `File shared with ${result.encryption_name} encryption!`;
@@ -19,7 +19,7 @@ def test_encryption_levels():
     for level_name, config in levels.items():
         print(f"\n📊 Testing: {config['name']}")
         print(f"   AES Key Size: {config['aes_key_size']} bytes ({config['aes_key_size'] * 8} bits)")
-        print(f"   RSA Key Size: {config['rsa_key_size']} bits")
+        print(f"   Key Wrap: {config.get('key_wrap', 'rsa-oaep')} (RSA {config['rsa_key_size']} bits)")
         
         try:
             # Generate AES key
@@ -27,11 +27,11 @@ def test_encryption_levels():
             print(f"   ✅ AES key generated: {len(aes_key)} bytes")
             
             # Encrypt data
-            encrypted = em.encrypt_data(test_data, aes_key)
+            encrypted = em.encrypt_data(test_data, aes_key, cipher_suite=config.get('cipher', 'aes-gcm'))
             print(f"   ✅ Data encrypted: {len(encrypted)} chars")
             
             # Decrypt data
-            decrypted = em.decrypt_data(encrypted, aes_key, return_bytes=True)
+            decrypted = em.decrypt_data(encrypted, aes_key, return_bytes=True, cipher_suite=config.get('cipher'))
             print(f"   ✅ Data decrypted: {len(decrypted)} bytes")
             
             # Verify
@@ -44,31 +44,35 @@ def test_encryption_levels():
             print(f"   ❌ ERROR: {e}")
     
     print("\n" + "=" * 60)
-    print("TESTING RSA KEY GENERATION")
+    print("TESTING KEY GENERATION AND WRAPPING")
     print("=" * 60)
     
     for level_name, config in levels.items():
-        print(f"\n📊 Testing RSA-{config['rsa_key_size']} for {config['name']}")
+        key_wrap = config.get('key_wrap', 'rsa-oaep')
+        print(f"\n📊 Testing {key_wrap} (RSA {config['rsa_key_size']}) for {config['name']}")
         
         try:
-            # Generate RSA keypair
-            private_pem, public_pem = em.generate_keypair(config['rsa_key_size'])
-            print(f"   ✅ RSA keypair generated")
+            # Generate keypair
+            if key_wrap == 'x25519':
+                private_pem, public_pem = em.generate_ec_keypair()
+            else:
+                private_pem, public_pem = em.generate_keypair(config['rsa_key_size'])
+            print(f"   ✅ Keypair generated")
             print(f"   Private key length: {len(private_pem)} chars")
             print(f"   Public key length: {len(public_pem)} chars")
             
-            # Test encrypting AES key with RSA
+            # Test wrapping the AES key
             aes_key = em.generate_aes_key(config['aes_key_size'])
-            encrypted_aes = em.encrypt_aes_key(aes_key, public_pem)
-            print(f"   ✅ AES key encrypted with RSA: {len(encrypted_aes)} chars")
+            encrypted_aes = em.wrap_aes_key(aes_key, public_pem, key_wrap)
+            print(f"   ✅ AES key wrapped: {len(encrypted_aes)} chars")
             
-            # Decrypt AES key
-            decrypted_aes = em.decrypt_aes_key(encrypted_aes, private_pem)
+            # Unwrap AES key
+            decrypted_aes = em.unwrap_aes_key(encrypted_aes, private_pem, key_wrap)
             
             if decrypted_aes == aes_key:
-                print(f"   ✅ RSA ENCRYPTION PASSED - AES key recovered!")
+                print(f"   ✅ KEY WRAP PASSED - AES key recovered!")
             else:
-                print(f"   ❌ RSA ENCRYPTION FAILED - Key mismatch!")
+                print(f"   ❌ KEY WRAP FAILED - Key mismatch!")
                 
         except Exception as e:
             print(f"   ❌ ERROR: {e}")